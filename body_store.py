@@ -0,0 +1,350 @@
+"""Armazenamento dos corpos de resposta em segmentos append-only mapeados em memória.
+
+Com `BODY_STORE=1`, o corpo bruto de cada resposta é anexado ao fim de um
+arquivo de segmento (`segments/seg_000001.dat`, ao lado do banco principal)
+e a linha de `responses` guarda só `(body_segment, body_offset,
+body_length)`, deixando `body` NULL. A cópia normalizada do JSON vai para o
+store do mesmo jeito (`json_segment`, `json_offset`, `json_length`, em
+UTF-8). Assim o arquivo SQLite fica pequeno e a ingestão de corpos grandes
+vira uma escrita sequencial.
+
+As leituras usam `mmap` e devolvem `memoryview`s sobre o arquivo, sem
+copiar o corpo. Quando um segmento passa de `BODY_STORE_SEGMENT_MB` um novo
+é aberto. A tabela `body_segments` do banco principal guarda o tamanho de
+cada segmento e quantos bytes já pertencem a registros apagados; a
+compactação copia os corpos vivos dos segmentos com muito espaço morto para
+o segmento atual e aposenta o segmento antigo. O arquivo de um segmento
+aposentado só é apagado por uma compactação posterior, passados
+`BODY_STORE_RETIRE_SECONDS`: até lá, leitores (de qualquer processo) que
+ainda tenham a localização antiga continuam lendo os mesmos bytes. Um lock
+de arquivo (`segments/compact.lock`) garante uma compactação por vez entre
+processos.
+"""
+
+import argparse
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+import json_codec
+
+try:
+    import fcntl
+except ImportError:  # Windows: só o lock entre threads do processo
+    fcntl = None
+
+BODY_STORE = os.environ.get("BODY_STORE", "0") == "1"
+
+# Tamanho máximo de um segmento antes da rotação
+SEGMENT_SIZE = int(os.environ.get("BODY_STORE_SEGMENT_MB", 256)) * 2**20
+
+# Fração de bytes mortos a partir da qual um segmento é compactado
+COMPACT_RATIO = float(os.environ.get("BODY_STORE_COMPACT_RATIO", 0.5))
+
+# Tempo (s) que o arquivo de um segmento aposentado é mantido para leitores atrasados
+RETIRE_SECONDS = float(os.environ.get("BODY_STORE_RETIRE_SECONDS", 600))
+
+# Colunas de localização de cada valor guardado no store
+LOCATIONS = (("body_segment", "body_offset", "body_length"), ("json_segment", "json_offset", "json_length"))
+
+
+def store_dir(base_db: str) -> str:
+    """Diretório dos segmentos de um banco principal."""
+    return os.path.join(os.path.dirname(os.path.abspath(base_db)), "segments")
+
+
+def init_store(base_db: str) -> None:
+    """Cria a tabela de controle `body_segments` no banco principal."""
+    conn = sqlite3.connect(base_db)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS body_segments (
+            segment INTEGER PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            dead_bytes INTEGER NOT NULL DEFAULT 0,
+            retired_at REAL
+        );
+        """
+    )
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(body_segments)")}
+    if "retired_at" not in existing:
+        conn.execute("ALTER TABLE body_segments ADD COLUMN retired_at REAL")
+    conn.commit()
+    conn.close()
+
+
+class SegmentStore:
+    """Segmentos de um banco principal: escrita por append e leitura por mmap."""
+
+    def __init__(self, base_db: str, segment_size: int = None):
+        self.base_db = base_db
+        self.directory = store_dir(base_db)
+        self.segment_size = segment_size or SEGMENT_SIZE
+        self._maps = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        init_store(base_db)
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg_{segment:06d}.dat")
+
+    def append(self, data: bytes) -> tuple[int, int, int]:
+        """Anexa `data` ao segmento atual e retorna (segmento, offset, tamanho).
+
+        A transação `BEGIN IMMEDIATE` em `body_segments` serializa as escritas
+        entre threads e processos, então dois appends nunca recebem o mesmo
+        offset.
+        """
+        conn = sqlite3.connect(self.base_db, isolation_level=None, timeout=30)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT segment, size FROM body_segments ORDER BY segment DESC LIMIT 1").fetchone()
+            if row is None or (row[1] > 0 and row[1] + len(data) > self.segment_size):
+                segment = (row[0] + 1) if row else 1
+                offset = 0
+                conn.execute("INSERT INTO body_segments (segment, size) VALUES (?, 0)", (segment,))
+            else:
+                segment, offset = row
+            with open(self.segment_path(segment), "ab") as f:
+                f.truncate(offset)
+                f.write(data)
+            conn.execute("UPDATE body_segments SET size = ? WHERE segment = ?", (offset + len(data), segment))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return segment, offset, len(data)
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap:
+        with self._lock:
+            mm = self._maps.get(segment)
+            if mm is None or len(mm) < needed:
+                # O segmento atual cresce; remapeia quando o trecho pedido passa do fim
+                with open(self.segment_path(segment), "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mm
+            return mm
+
+    def view(self, segment: int, offset: int, length: int) -> memoryview:
+        """Retorna o corpo como `memoryview` sobre o mmap do segmento (sem cópia)."""
+        if length == 0:
+            return memoryview(b"")
+        return memoryview(self._map(segment, offset + length))[offset:offset + length]
+
+    def text(self, segment: int, offset: int, length: int) -> str:
+        """Texto UTF-8 guardado no store (a cópia do JSON)."""
+        return str(self.view(segment, offset, length), "utf-8")
+
+    def forget(self, segment: int) -> None:
+        """Descarta o mmap em cache de um segmento removido."""
+        with self._lock:
+            self._maps.pop(segment, None)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(base_db: str) -> SegmentStore:
+    """Retorna o `SegmentStore` (um por processo) de um banco principal."""
+    key = os.path.abspath(base_db)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SegmentStore(base_db)
+        return store
+
+
+def record_deleted(conn, ids: list[int]) -> None:
+    """Contabiliza como mortos os bytes (corpo e JSON) dos registros que vão ser apagados.
+
+    Deve rodar na mesma transação do DELETE, em uma conexão cujo
+    `responses` enxergue os registros (ver `partitions.scope`).
+    """
+    # Os ids vão como um único array JSON: nenhum limite de variáveis do SQLite
+    parts = " UNION ALL ".join(
+        f"SELECT {segment} AS segment, {length} AS length FROM responses "
+        f"WHERE id IN (SELECT value FROM json_each(?1)) AND {segment} IS NOT NULL"
+        for segment, _, length in LOCATIONS
+    )
+    dead = conn.execute(
+        f"SELECT segment, SUM(length) FROM ({parts}) GROUP BY segment", (json_codec.dumps(list(ids)),)
+    ).fetchall()
+    for segment, length in dead:
+        conn.execute("UPDATE main.body_segments SET dead_bytes = dead_bytes + ? WHERE segment = ?", (length, segment))
+
+
+def prepare_body(base_db: str, body: str | bytes | None) -> tuple:
+    """Valores (body, body_segment, body_offset, body_length) para o INSERT.
+
+    Com o store desligado (ou corpo None) o corpo continua na coluna `body`.
+    Corpos em bytes vão para o segmento como chegaram; texto é gravado em UTF-8.
+    """
+    if not BODY_STORE or body is None:
+        return body, None, None, None
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    segment, offset, length = get_store(base_db).append(data)
+    return None, segment, offset, length
+
+
+def prepare_json(base_db: str, json_text: str | None) -> tuple:
+    """Valores (json, json_segment, json_offset, json_length) para o INSERT.
+
+    Com o store ligado a cópia do JSON também sai da linha, em UTF-8.
+    """
+    return prepare_body(base_db, json_text)
+
+
+def _database_files(base_db: str) -> list[str]:
+    # Import tardio: partitions usa este módulo ao gravar
+    import partitions
+
+    files = [base_db]
+    if partitions.PARTITION_MODE:
+        files += [path for _, path in partitions.list_partitions(base_db, partitions.PARTITION_MODE)]
+    return files
+
+
+class _CompactionLock:
+    """Lock de arquivo que impede duas compactações ao mesmo tempo, mesmo em processos diferentes."""
+
+    def __init__(self, base_db: str):
+        self.path = os.path.join(store_dir(base_db), "compact.lock")
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        self._file = open(self.path, "a")
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self) -> None:
+        # Fechar o arquivo libera o flock
+        self._file.close()
+        self._file = None
+
+
+def _delete_retired(store: SegmentStore, meta) -> None:
+    """Apaga os arquivos dos segmentos aposentados há mais de `RETIRE_SECONDS`."""
+    expired = meta.execute(
+        "SELECT segment FROM body_segments WHERE retired_at IS NOT NULL AND retired_at <= ?",
+        (time.time() - RETIRE_SECONDS,),
+    ).fetchall()
+    for (segment,) in expired:
+        store.forget(segment)
+        try:
+            os.remove(store.segment_path(segment))
+        except FileNotFoundError:
+            pass
+        with meta:
+            meta.execute("DELETE FROM body_segments WHERE segment = ?", (segment,))
+
+
+def compact(base_db: str, ratio: float = COMPACT_RATIO, blocking: bool = True) -> list[int]:
+    """Reescreve os segmentos com espaço morto >= `ratio` e os aposenta.
+
+    O segmento atual (o último) nunca é compactado. Os arquivos de
+    segmentos aposentados em compactações anteriores, passado
+    `RETIRE_SECONDS`, são apagados aqui. Com `blocking=False`, retorna [] se
+    outra compactação (de qualquer processo) estiver em andamento. Retorna
+    os segmentos aposentados agora.
+    """
+    store = get_store(base_db)
+    lock = _CompactionLock(base_db)
+    if not lock.acquire(blocking):
+        return []
+    try:
+        meta = sqlite3.connect(base_db, timeout=30)
+        try:
+            _delete_retired(store, meta)
+            candidates = meta.execute(
+                "SELECT segment FROM body_segments WHERE segment < (SELECT MAX(segment) FROM body_segments) "
+                "AND retired_at IS NULL AND size > 0 AND dead_bytes >= size * ?",
+                (ratio,),
+            ).fetchall()
+        finally:
+            meta.close()
+
+        retired = []
+        for (segment,) in candidates:
+            for db_file in _database_files(base_db):
+                conn = sqlite3.connect(db_file, timeout=30)
+                for segment_col, offset_col, length_col in LOCATIONS:
+                    rows = conn.execute(
+                        f"SELECT id, {offset_col}, {length_col} FROM responses WHERE {segment_col} = ?", (segment,)
+                    ).fetchall()
+                    # Copia primeiro (append usa sua própria transação no banco principal)
+                    # e só depois aponta as linhas para o novo local
+                    moved = []
+                    for record_id, offset, length in rows:
+                        new_segment, new_offset, _ = store.append(store.view(segment, offset, length))
+                        moved.append((new_segment, new_offset, record_id))
+                    with conn:
+                        conn.executemany(
+                            f"UPDATE responses SET {segment_col} = ?, {offset_col} = ? WHERE id = ?", moved
+                        )
+                conn.close()
+            meta = sqlite3.connect(base_db, timeout=30)
+            meta.execute("UPDATE body_segments SET retired_at = ? WHERE segment = ?", (time.time(), segment))
+            meta.commit()
+            meta.close()
+            retired.append(segment)
+        return retired
+    finally:
+        lock.release()
+
+
+_compacting = threading.Lock()
+
+
+def schedule_compaction(base_db: str) -> None:
+    """Roda `compact` em segundo plano, se já não houver uma em andamento."""
+    if not _compacting.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            compact(base_db, blocking=False)
+        except (OSError, sqlite3.Error):
+            pass
+        finally:
+            _compacting.release()
+
+    threading.Thread(target=run, name="body-store-compaction", daemon=True).start()
+
+
+def main():
+    """Entrada principal: mostra os segmentos e, opcionalmente, compacta."""
+    p = argparse.ArgumentParser(description="Inspect and compact the body segment store")
+    p.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "responses.db"), help="Path to the main responses.db")
+    p.add_argument("--compact", action="store_true", help="Rewrite segments with too much dead space")
+    p.add_argument("--ratio", type=float, default=COMPACT_RATIO, help="Dead-space ratio that triggers compaction")
+    args = p.parse_args()
+
+    if args.compact:
+        for segment in compact(args.db, args.ratio):
+            print(f"Compacted segment {segment}")
+
+    init_store(args.db)
+    conn = sqlite3.connect(args.db)
+    query = "SELECT segment, size, dead_bytes, retired_at FROM body_segments ORDER BY segment"
+    for segment, size, dead, retired_at in conn.execute(query):
+        line = f"seg_{segment:06d} | {size:>12d} bytes | {dead:>12d} dead"
+        if retired_at is not None:
+            line += " | retired"
+        print(line)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
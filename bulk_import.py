@@ -0,0 +1,560 @@
+"""Importação em massa de capturas HAR e dumps NDJSON para `responses`.
+
+Os arquivos são lidos em streaming e as linhas entram por `executemany` em
+transações de `BATCH_SIZE` registros. Na CLI, durante a carga o índice por
+timestamp e o trigger de rollups ficam desligados; no final o índice é
+recriado e os rollups das linhas importadas somados de uma vez, o que sai
+bem mais barato que manter os dois linha a linha. O /import do web app roda sobre o banco
+em uso e mantém os dois ligados (`defer_indexes=False`), para não deixar
+coletas simultâneas sem rollup nem a listagem sem índice.
+
+Formatos aceitos:
+
+- NDJSON (`.ndjson`, `.jsonl`): um objeto por linha com `url` e,
+  opcionalmente, `status`, `timestamp` (ISO), `body` (ou `body_base64`
+  para corpos binários), `content_type`, `json` (objeto) e `elapsed_ms`;
+- HAR (`.har`): cada item de `log.entries` vira um registro, com URL da
+  requisição, status, `startedDateTime`, `response.content.text` (em bytes
+  quando vem em base64), `response.content.mimeType` e `time`.
+  Arquivos a partir de `HAR_LOAD_LIMIT` bytes são lidos pelo parser
+  incremental de `json_stream`, um item por vez.
+
+O andamento fica na tabela `imports` do banco principal, atualizada na
+mesma transação de cada lote. Importar de novo o mesmo arquivo (mesma
+impressão digital) retoma do último lote confirmado, sem duplicar linhas;
+no NDJSON a leitura recomeça direto na posição em bytes. Cada execução
+assume a importação com um UPDATE condicional e cada lote só é confirmado
+se o andamento não mudou, então duas execuções simultâneas (workers do web
+app ou CLI) nunca gravam as mesmas linhas.
+"""
+
+import argparse
+import base64
+import codecs
+import datetime
+import hashlib
+import os
+import sqlite3
+import time
+
+import body_store
+import content_types
+import json_codec
+import json_stream
+import live_events
+import partitions
+import rollups
+from colet_json_noautentic import init_sqlite, json_text_for
+
+# Registros por transação (e por chamada de executemany)
+BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 10_000))
+
+# HARs até este tamanho são carregados de uma vez pelo codec JSON, bem mais
+# rápido; os maiores passam pelo parser incremental para não estourar a memória
+HAR_LOAD_LIMIT = int(os.environ.get("HAR_LOAD_LIMIT", 256 * 1024 * 1024))
+
+# Segundos sem um lote confirmado até uma importação em andamento ser dada
+# como abandonada (processo que caiu) e poder ser retomada por outro
+IMPORT_STALE_SECONDS = int(os.environ.get("IMPORT_STALE_SECONDS", 600))
+
+# Estados de uma importação
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FORMATS = ("har", "ndjson")
+
+_EXTENSIONS = {".har": "har", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+_INDEX_NAME = "idx_responses_timestamp"
+
+# Campos de um registro, na ordem das tuplas aceitas por `BatchWriter.insert`
+RECORD_FIELDS = ("url", "status", "timestamp", "body", "json", "elapsed_ms", "content_type", "charset")
+
+_INSERT_COLUMNS = ("url, status, timestamp, body, json, body_segment, body_offset, body_length, elapsed_ms, "
+                  "content_type, charset, json_segment, json_offset, json_length")
+_PLACEHOLDERS = ", ".join("?" * 14)
+
+
+class ImportFormatError(ValueError):
+    """Arquivo em formato desconhecido ou que não pôde ser lido."""
+
+
+class ImportConflictError(RuntimeError):
+    """Outra execução assumiu a importação enquanto esta gravava um lote."""
+
+
+def init_imports_table(conn) -> None:
+    """Cria a tabela `imports`, que guarda o andamento de cada arquivo."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS imports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fingerprint TEXT NOT NULL UNIQUE,
+            source TEXT,
+            format TEXT NOT NULL,
+            state TEXT NOT NULL,
+            records INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            position INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER,
+            started_at TEXT,
+            updated_at TEXT,
+            finished_at TEXT,
+            message TEXT
+        );
+        """
+    )
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+def upload_dir(db_path: str) -> str:
+    """Diretório onde o /import guarda os arquivos recebidos (para poder retomar)."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "imports")
+
+
+# Tamanho dos blocos lidos ao calcular a impressão digital e ao salvar uploads
+_COPY_CHUNK = 1024 * 1024
+
+
+def fingerprint(path: str) -> str:
+    """Identifica o conteúdo do arquivo pelo SHA-256 do arquivo inteiro."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_COPY_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_with_fingerprint(stream, path: str) -> str:
+    """Grava `stream` (ex.: o upload do /import) em `path` e retorna sua impressão digital.
+
+    O hash é calculado enquanto os blocos são gravados, sem ler o arquivo
+    de novo.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "wb") as f:
+            while chunk := stream.read(_COPY_CHUNK):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        # Upload interrompido: não deixa o arquivo parcial para trás
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return digest.hexdigest()
+
+
+def detect_format(name: str, fmt: str = None) -> str:
+    """Resolve o formato pelo parâmetro explícito ou pela extensão do arquivo."""
+    fmt = fmt or _EXTENSIONS.get(os.path.splitext(name)[1].lower())
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Formato desconhecido para {name!r}; use um de {', '.join(FORMATS)}")
+    return fmt
+
+
+def get_import(db_path: str, import_id: int) -> dict | None:
+    """Retorna o andamento de uma importação, com o percentual lido do arquivo."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        init_imports_table(conn)
+        row = conn.execute("SELECT * FROM imports WHERE id = ?", (import_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    info = dict(row)
+    info["percent"] = round(100 * info["position"] / info["total_bytes"], 1) if info["total_bytes"] else None
+    return info
+
+
+def _utc_iso(value) -> str:
+    """Normaliza um timestamp ISO (com ou sem fuso) para o formato UTC da tabela."""
+    if not value:
+        return _now()
+    ts = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return ts.isoformat()
+
+
+def har_record(entry: dict) -> tuple:
+    """Converte um item de `log.entries` em um registro (ver `RECORD_FIELDS`)."""
+    response = entry.get("response") or {}
+    content = response.get("content") or {}
+    content_type, charset = content_types.parse_content_type(content.get("mimeType"))
+    body = content.get("text")
+    if body is not None and content.get("encoding") == "base64":
+        # Corpo binário (ou texto em outro charset): guarda os bytes originais
+        body = base64.b64decode(body)
+    elapsed = entry.get("time")
+    return (
+        entry["request"]["url"],
+        int(response.get("status") or 0),
+        _utc_iso(entry.get("startedDateTime")),
+        body,
+        json_text_for(body, content_type, charset),
+        float(elapsed) if elapsed is not None and elapsed >= 0 else None,
+        content_type,
+        charset,
+    )
+
+
+def ndjson_record(obj: dict) -> tuple:
+    """Converte um objeto de uma linha NDJSON em um registro (ver `RECORD_FIELDS`)."""
+    content_type, charset = content_types.parse_content_type(obj.get("content_type"))
+    body = obj.get("body")
+    if obj.get("body_base64") is not None:
+        body = base64.b64decode(obj["body_base64"])
+    elif body is not None and not isinstance(body, str):
+        body = json_codec.dumps(body)
+    if obj.get("json") is not None:
+        json_text = json_codec.dumps(obj["json"])
+    else:
+        json_text = json_text_for(body, content_type, charset)
+    elapsed = obj.get("elapsed_ms")
+    return (
+        obj["url"],
+        int(obj.get("status") or 0),
+        _utc_iso(obj.get("timestamp")),
+        body,
+        json_text,
+        float(elapsed) if elapsed is not None else None,
+        content_type,
+        charset,
+    )
+
+
+def read_ndjson(path: str, position: int = 0):
+    """Gera (registro ou None, posição após a linha) a partir da posição em bytes.
+
+    Linhas inválidas geram None, para serem contadas como puladas.
+    """
+    with open(path, "rb") as f:
+        f.seek(position)
+        for line in f:
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                yield ndjson_record(json_codec.loads(line)), position
+            except (ValueError, KeyError, TypeError):
+                yield None, position
+
+
+def read_har(path: str, skip: int = 0):
+    """Gera (registro ou None, bytes lidos) para cada item de `log.entries`.
+
+    Os `skip` primeiros itens (já importados) são descartados sem conversão.
+    """
+    size = os.path.getsize(path)
+    if size < HAR_LOAD_LIMIT:
+        with open(path, "rb") as f:
+            try:
+                entries = json_codec.loads(f.read().decode("utf-8-sig"))["log"]["entries"]
+            except (ValueError, KeyError, TypeError) as exc:
+                raise ImportFormatError(f"HAR inválido: {exc}") from exc
+        for index in range(skip, len(entries)):
+            # O arquivo inteiro já foi lido; o avanço é estimado pelos itens
+            yield _convert(har_record, entries[index]), size * (index + 1) // len(entries)
+        return
+
+    consumed = [0]
+
+    def chunks():
+        decoder = codecs.getincrementaldecoder("utf-8-sig")("replace")
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(json_stream.CHUNK_SIZE)
+                consumed[0] += len(data)
+                if not data:
+                    yield decoder.decode(b"", final=True)
+                    return
+                yield decoder.decode(data)
+
+    try:
+        for index, entry in enumerate(json_stream.items(json_stream.iter_events(chunks()), "log.entries.item")):
+            if index >= skip:
+                yield _convert(har_record, entry), consumed[0]
+    except json_stream.JSONStreamError as exc:
+        raise ImportFormatError(f"HAR inválido: {exc}") from exc
+
+
+def _convert(fn, item):
+    try:
+        return fn(item)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+class BatchWriter:
+    """Insere lotes no banco principal e, com particionamento, nas partições.
+
+    Usado pela importação e pelo writer do modo frota do coletor. Com
+    `publish=True`, cada linha gera seu evento `inserted` para o /events.
+
+    As partições são anexadas à mesma conexão, então cada lote (linhas e
+    andamento) é confirmado em uma única transação. Como o SQLite não anexa
+    bancos no meio de uma transação, um lote cobre no máximo `ATTACH_LIMIT`
+    partições: `reserve` avisa quando o lote atual precisa ser fechado antes.
+    """
+
+    def __init__(self, db_path: str, defer_indexes: bool = False, publish: bool = False):
+        self.db_path = db_path
+        self.defer_indexes = defer_indexes
+        self.publish = publish
+        self.mode = partitions.PARTITION_MODE
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA cache_size = -65536")
+        self.schemas = {}
+        self.pending = set()
+        self.touched = {db_path}
+        # Maior id de cada arquivo antes da carga: os rollups somam só o que vier depois
+        self.start_ids = {}
+        if defer_indexes:
+            self._defer("main", db_path)
+
+    def _defer(self, schema: str, path: str) -> None:
+        self.start_ids[path] = rollups.last_id(self.conn, schema)
+        self.conn.execute(f"DROP INDEX IF EXISTS {schema}.{_INDEX_NAME}")
+        self.conn.execute(f"DROP TRIGGER IF EXISTS {schema}.{rollups.TRIGGER_NAME}")
+        self.conn.commit()
+
+    def _key(self, timestamp: str) -> int:
+        return partitions.partition_key(datetime.datetime.fromisoformat(timestamp), self.mode)
+
+    def reserve(self, record: tuple) -> bool:
+        """Reserva a partição do registro no lote atual; False se o lote já está no limite."""
+        if not self.mode:
+            return True
+        key = self._key(record[2])
+        if key not in self.pending:
+            if len(self.pending) >= partitions.ATTACH_LIMIT:
+                return False
+            self.pending.add(key)
+        return True
+
+    def _attach(self) -> None:
+        # Desanexa o que o lote não usa e anexa o que falta, antes de abrir a transação
+        for key in [k for k in self.schemas if k not in self.pending]:
+            self.conn.execute(f"DETACH DATABASE {self.schemas.pop(key)}")
+        for key in self.pending - self.schemas.keys():
+            path = partitions.ensure_partition(self.db_path, key, self.mode)
+            schema = self.schemas[key] = f"import_{key}"
+            self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            if self.defer_indexes and path not in self.touched:
+                self._defer(schema, path)
+            self.touched.add(path)
+        self.pending = set()
+
+    def insert(self, records: list[tuple]) -> None:
+        """Grava os registros (ver `RECORD_FIELDS`) sem confirmar."""
+        if self.mode:
+            self._attach()
+        by_schema = {}
+        for url, status, timestamp, body, json_text, elapsed_ms, content_type, charset in records:
+            body, segment, offset, length = body_store.prepare_body(self.db_path, body)
+            json_text, json_segment, json_offset, json_length = body_store.prepare_json(self.db_path, json_text)
+            schema = self.schemas[self._key(timestamp)] if self.mode else "main"
+            by_schema.setdefault(schema, []).append(
+                (url, status, timestamp, body, json_text, segment, offset, length, elapsed_ms, content_type, charset,
+                 json_segment, json_offset, json_length))
+        for schema, rows in by_schema.items():
+            self.conn.executemany(
+                f"INSERT INTO {schema}.responses ({_INSERT_COLUMNS}) VALUES ({_PLACEHOLDERS})", rows)
+            if self.publish:
+                # Dentro da transação ninguém mais insere: os ids do lote são consecutivos
+                last = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                ids = range(last - len(rows) + 1, last + 1)
+                live_events.publish(self.conn, live_events.INSERTED,
+                                    [(record_id, row[0], row[1], row[2]) for record_id, row in zip(ids, rows)])
+
+    def finish(self) -> None:
+        """Recria índices e triggers e soma aos rollups as linhas gravadas sem o trigger."""
+        self.conn.close()
+        if not self.defer_indexes:
+            return
+        for path in sorted(self.start_ids):
+            init_sqlite(path)
+            conn = sqlite3.connect(path)
+            try:
+                rollups.add_rows(conn, self.start_ids[path])
+            finally:
+                conn.close()
+
+
+def register_import(db_path: str, path: str, fmt: str = None, source: str = None, key: str = None) -> int:
+    """Registra `path` na tabela `imports` (ou acha o registro anterior) e retorna o id.
+
+    `key` é a impressão digital já calculada (ver `save_with_fingerprint`).
+    """
+    fmt = detect_format(source or path, fmt)
+    init_sqlite(db_path)
+    key = key or fingerprint(path)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            init_imports_table(conn)
+            conn.execute(
+                "INSERT INTO imports (fingerprint, source, format, state, total_bytes, started_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO NOTHING",
+                (key, source or os.path.basename(path), fmt, PENDING, os.path.getsize(path), _now(), _now()),
+            )
+        return conn.execute("SELECT id FROM imports WHERE fingerprint = ?", (key,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def claim_import(db_path: str, import_id: int, stale: float = None) -> bool:
+    """Marca a importação como em andamento, se nenhuma outra execução a tiver.
+
+    A troca é atômica (um único UPDATE condicional), então entre workers do
+    web app e a CLI só uma execução ganha. Uma importação parada há mais de
+    `stale` segundos (padrão `IMPORT_STALE_SECONDS`) pode ser assumida.
+    """
+    stale = IMPORT_STALE_SECONDS if stale is None else stale
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=stale)).isoformat()
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            cur = conn.execute(
+                "UPDATE imports SET state = ?, message = NULL, updated_at = ? "
+                "WHERE id = ? AND (state IN (?, ?) OR (state = ? AND updated_at < ?))",
+                (RUNNING, _now(), import_id, PENDING, FAILED, RUNNING, cutoff),
+            )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def run_import(db_path: str, path: str, fmt: str = None, source: str = None, batch_size: int = None,
+               defer_indexes: bool = False, progress=None) -> dict:
+    """Importa (ou retoma a importação de) `path` e retorna o andamento final.
+
+    `defer_indexes=True` desliga índice e trigger de rollups durante a
+    carga; use só quando nada mais estiver gravando no banco (CLI).
+    `progress(info)` é chamado após cada lote confirmado com o mesmo dict
+    devolvido por `get_import`. Se outra execução já estiver importando o
+    mesmo arquivo, nada é gravado e o andamento dela é devolvido (state
+    continua "running").
+    """
+    batch_size = batch_size or BATCH_SIZE
+    import_id = register_import(db_path, path, fmt, source)
+    if not claim_import(db_path, import_id):
+        # Já concluída, ou em andamento em outro processo
+        return get_import(db_path, import_id)
+    # Lido depois de assumir: a posição é a do último lote confirmado por qualquer execução
+    info = get_import(db_path, import_id)
+    fmt, total = info["format"], info["total_bytes"]
+    records, skipped, position = info["records"], info["skipped"], info["position"]
+    committed = position
+
+    # NDJSON retoma pela posição em bytes; HAR, pela contagem de itens já vistos
+    if fmt == "ndjson":
+        reader = read_ndjson(path, position)
+    else:
+        reader = read_har(path, records + skipped)
+
+    writer = BatchWriter(db_path, defer_indexes=defer_indexes)
+    try:
+        batch = []
+        for record, next_position in reader:
+            if record is not None and not writer.reserve(record):
+                # O lote já usa o máximo de partições anexáveis: fecha antes deste registro
+                records += len(batch)
+                committed = _commit_batch(writer, import_id, batch, records, skipped, committed, position)
+                batch = []
+                writer.reserve(record)
+            position = next_position
+            if record is None:
+                skipped += 1
+            else:
+                batch.append(record)
+            if len(batch) >= batch_size:
+                records += len(batch)
+                committed = _commit_batch(writer, import_id, batch, records, skipped, committed, position)
+                batch = []
+                if progress:
+                    progress(get_import(db_path, import_id))
+        records += len(batch)
+        _commit_batch(writer, import_id, batch, records, skipped, committed, total)
+        with writer.conn:
+            writer.conn.execute("UPDATE imports SET state = ?, finished_at = ? WHERE id = ?", (DONE, _now(), import_id))
+            # Painéis ao vivo recarregam a tabela em vez de receber um evento por linha
+            live_events.publish(writer.conn, live_events.RESET, [(0, None, None, None)])
+    except ImportConflictError:
+        # A outra execução segue dona da importação: não marca falha
+        pass
+    except Exception as exc:
+        with writer.conn:
+            writer.conn.execute("UPDATE imports SET state = ?, message = ?, updated_at = ? WHERE id = ?",
+                                (FAILED, str(exc), _now(), import_id))
+        raise
+    finally:
+        writer.finish()
+        live_events.notify(db_path)
+    info = get_import(db_path, import_id)
+    if progress:
+        progress(info)
+    return info
+
+
+def _commit_batch(writer: BatchWriter, import_id: int, batch: list, records: int, skipped: int,
+                  committed: int, position: int) -> int:
+    """Grava o lote e avança o andamento de `committed` para `position`; retorna a nova posição.
+
+    Linhas e andamento vão na mesma transação: retomar nunca duplica um
+    lote. O andamento só avança se ainda estiver em `committed`; se outra
+    execução tiver confirmado um lote no meio tempo, a transação é desfeita
+    e `ImportConflictError` é levantada.
+    """
+    with writer.conn:
+        writer.insert(batch)
+        cur = writer.conn.execute(
+            "UPDATE imports SET records = ?, skipped = ?, position = ?, updated_at = ? "
+            "WHERE id = ? AND position = ? AND state = ?",
+            (records, skipped, position, _now(), import_id, committed, RUNNING),
+        )
+        if cur.rowcount != 1:
+            raise ImportConflictError(f"importação {import_id} assumida por outra execução")
+    return position
+
+
+def main():
+    """Entrada principal: importa arquivos HAR/NDJSON mostrando o andamento."""
+    p = argparse.ArgumentParser(description="Bulk import HAR captures or NDJSON dumps into responses.db")
+    p.add_argument("files", nargs="+", help="HAR (.har) or NDJSON (.ndjson/.jsonl) files")
+    p.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "responses.db"), help="Path to responses.db")
+    p.add_argument("--format", choices=FORMATS, help="Force the input format instead of using the extension")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Records per transaction")
+    p.add_argument("--keep-indexes", action="store_true",
+                   help="Keep the timestamp index and rollup trigger live during the load")
+    args = p.parse_args()
+
+    for path in args.files:
+        start = time.perf_counter()
+
+        def report(info):
+            rate = info["records"] / max(time.perf_counter() - start, 1e-9)
+            percent = f"{info['percent']:5.1f}%" if info["percent"] is not None else "  ?  "
+            print(f"\r{path}: {percent} | {info['records']} records | {info['skipped']} skipped | {rate:.0f} rec/s",
+                  end="", flush=True)
+
+        info = run_import(args.db, path, fmt=args.format, batch_size=args.batch_size,
+                          defer_indexes=not args.keep_indexes, progress=report)
+        if info["state"] == RUNNING:
+            print(f"[SKIP] {path}: already being imported by another process ({info['records']} records so far)")
+            continue
+        print(f"\n[OK] {path}: {info['records']} records in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,40 @@
 
 from __future__ import annotations
 
+import argparse
 import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
 import time
 import urllib.error
+import urllib.parse
 import urllib.request
 import sqlite3
 import datetime
+import zlib
 
-def fetch_url(url: str, timeout: int = 10) -> tuple[int, str]:
-	"""Busca uma URL via HTTP e retorna (status_code, corpo_texto)."""
+import body_store
+import content_types
+import dns_cache
+import json_codec
+import json_stream
+import live_events
+import partitions
+import rollups
+from fetch_policy import DEFAULT_POLICY
+
+
+def fetch_response(url: str, timeout: float | None = None) -> tuple[int, bytes, str | None, str | None]:
+	"""Busca uma URL via HTTP e retorna (status_code, corpo_bruto, content_type, charset).
+
+	O corpo vem como bytes, sem decodificar; `content_type` e `charset` saem
+	do header `Content-Type` (None quando ausentes). A chamada passa pelas
+	políticas por host de `fetch_policy`; com `timeout=None` usa o timeout
+	adaptativo do host.
+	"""
 	request = urllib.request.Request(
 		url,
 		headers={
@@ -19,10 +44,23 @@ def fetch_url(url: str, timeout: int = 10) -> tuple[int, str]:
 		},
 	)
 
-	with urllib.request.urlopen(request, timeout=timeout) as response:
-		status_code = response.status
-		body = response.read().decode("utf-8", errors="replace")
-		return status_code, body
+	def do_request(effective_timeout: float) -> tuple[int, bytes, str | None, str | None]:
+		with dns_cache.urlopen(request, timeout=effective_timeout) as response:
+			status_code = response.status
+			body = response.read()
+			content_type, charset = content_types.parse_content_type(response.headers.get("Content-Type"))
+			return status_code, body, content_type, charset
+
+	return DEFAULT_POLICY.call(url, do_request, timeout=timeout)
+
+
+def fetch_url(url: str, timeout: float | None = None) -> tuple[int, str]:
+	"""Busca uma URL via HTTP e retorna (status_code, corpo_texto).
+
+	O corpo é decodificado com o charset da resposta (UTF-8 se ausente).
+	"""
+	status, body, _, charset = fetch_response(url, timeout=timeout)
+	return status, content_types.decode(body, charset)
 
 
 def fetch_json(url: str) -> dict:
@@ -30,7 +68,27 @@ def fetch_json(url: str) -> dict:
 	status, body = fetch_url(url)
 	if status != 200:
 		raise RuntimeError(f"Resposta inesperada: {status}")
-	return json.loads(body)
+	return json_codec.loads(body)
+
+def json_text_for(body: str | bytes | None, content_type: str | None = None, charset: str | None = None) -> str | None:
+	"""Cópia serializada do corpo quando ele é um objeto ou array JSON, senão None.
+
+	Corpos de tipos não textuais (imagens, protobuf...) nem são olhados.
+	Bytes em UTF-8 vão direto para o codec, sem decodificação prévia.
+	Corpos a partir de `json_stream.STREAM_THRESHOLD` são validados e
+	reserializados em streaming, sem montar a árvore de objetos.
+	"""
+	if not body or not content_types.is_text(content_type) or not content_types.looks_like_json(body, charset):
+		return None
+	if not isinstance(body, str) and (len(body) >= json_stream.STREAM_THRESHOLD
+			or content_types.codec_name(charset) != content_types.DEFAULT_CHARSET):
+		body = content_types.decode(body, charset)
+	if len(body) >= json_stream.STREAM_THRESHOLD:
+		return json_stream.normalize(body)
+	try:
+		return json_codec.dumps(json_codec.loads(body))
+	except ValueError:
+		return None
 
 def init_sqlite(db_path: str = "responses.db") -> None:
 	"""Cria o arquivo de banco e a tabela necessária caso não existam.
@@ -48,60 +106,339 @@ def init_sqlite(db_path: str = "responses.db") -> None:
 			url TEXT NOT NULL,
 			status INTEGER,
 			timestamp TEXT NOT NULL,
-			body TEXT,
-			json TEXT
+			body BLOB,
+			json TEXT,
+			body_segment INTEGER,
+			body_offset INTEGER,
+			body_length INTEGER,
+			elapsed_ms REAL,
+			content_type TEXT,
+			charset TEXT,
+			json_segment INTEGER,
+			json_offset INTEGER,
+			json_length INTEGER
 		);
 		"""
 	)
+	# Bancos criados antes do store de segmentos, dos rollups e dos corpos
+	# em bytes não têm as colunas de localização do corpo e do JSON, de
+	# latência e de tipo de conteúdo (corpos antigos continuam TEXT na
+	# coluna `body`)
+	existing = {row[1] for row in cur.execute("PRAGMA table_info(responses)")}
+	for column, kind in (("body_segment", "INTEGER"), ("body_offset", "INTEGER"), ("body_length", "INTEGER"), ("elapsed_ms", "REAL"),
+			("content_type", "TEXT"), ("charset", "TEXT"),
+			("json_segment", "INTEGER"), ("json_offset", "INTEGER"), ("json_length", "INTEGER")):
+		if column not in existing:
+			cur.execute(f"ALTER TABLE responses ADD COLUMN {column} {kind}")
+	# Índice por timestamp: ordenação da listagem e filtros por idade
+	cur.execute("CREATE INDEX IF NOT EXISTS idx_responses_timestamp ON responses (timestamp)")
+	# Rollups por URL/status/intervalo, mantidos por trigger a cada insert
+	rollups.init_rollups(cur)
+	# Feed de inserções/remoções lido pelo /events do web app
+	live_events.init_events_table(cur)
 	conn.commit()
 	conn.close()
 
 
-def save_response_sqlite(url: str, status: int, body: str, json_obj: dict | None = None, db_path: str = "responses.db") -> None:
+def save_response_sqlite(url: str, status: int, body: str | bytes, json_obj: dict | None = None, db_path: str = "responses.db",
+		json_text: str | None = None, elapsed_ms: float | None = None, content_type: str | None = None,
+		charset: str | None = None) -> None:
 	"""Insere uma linha na tabela `responses` com os dados fornecidos.
 
-	- `json_obj` é serializado com `json.dumps` se não for None.
+	- `body` pode ser o corpo bruto (bytes, gravado como BLOB) ou texto.
+	- `json_obj` é serializado com `json_codec.dumps` se não for None.
+	- `json_text` é usado quando o JSON já vem serializado (ex.: por
+	  `json_stream.normalize`).
+	- `elapsed_ms` é a duração da requisição (rollups de latência).
+	- `content_type` e `charset` vêm do header da resposta e orientam a
+	  decodificação na hora de exibir.
 	- Usa timestamp UTC em formato ISO.
 	"""
 	# Serializa objeto JSON em string, se fornecido
-	json_text = None
 	if json_obj is not None:
-		json_text = json.dumps(json_obj, ensure_ascii=False)
+		json_text = json_codec.dumps(json_obj)
+
+	timestamp = datetime.datetime.utcnow().isoformat()
+
+	# Com particionamento ativo, a linha vai para o arquivo do período atual
+	if partitions.PARTITION_MODE:
+		partitions.save_response(db_path, partitions.PARTITION_MODE, url, status, timestamp, body, json_text,
+			elapsed_ms=elapsed_ms, content_type=content_type, charset=charset)
+		return
+
+	# Com o store de segmentos ativo, o corpo e a cópia do JSON vão para o
+	# segmento e a linha guarda só suas localizações
+	body, segment, offset, length = body_store.prepare_body(db_path, body)
+	json_text, json_segment, json_offset, json_length = body_store.prepare_json(db_path, json_text)
 
 	# Abre conexão, insere e fecha conexão imediatamente para simplicidade
 	conn = sqlite3.connect(db_path)
 	cur = conn.cursor()
 	cur.execute(
-		"INSERT INTO responses (url, status, timestamp, body, json) VALUES (?, ?, ?, ?, ?)",
-		(url, status, datetime.datetime.utcnow().isoformat(), body, json_text),
+		"INSERT INTO responses (url, status, timestamp, body, json, body_segment, body_offset, body_length, elapsed_ms, "
+		"content_type, charset, json_segment, json_offset, json_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+		(url, status, timestamp, body, json_text, segment, offset, length, elapsed_ms, content_type, charset,
+			json_segment, json_offset, json_length),
 	)
+	live_events.publish(conn, live_events.INSERTED, [(cur.lastrowid, url, status, timestamp)])
 	conn.commit()
 	conn.close()
 
 
+# --- Modo frota: vários processos coletando, um único processo gravando ---
+
+# Linhas aguardando o writer, por worker; com a fila cheia os workers esperam
+FLEET_QUEUE_DEPTH = 64
+
+# Linhas por transação do writer e espera máxima antes de gravar um lote incompleto
+FLEET_BATCH_SIZE = 500
+FLEET_FLUSH_INTERVAL = 1.0
+
+
+def shard_urls(urls: list[str], workers: int, by: str = "url") -> list[list[str]]:
+	"""Divide as URLs entre `workers` listas.
+
+	- `by="url"`: distribuição alternada, que equilibra a carga;
+	- `by="host"`: todas as URLs de um host no mesmo worker, para que o
+	  limite de taxa e o circuit breaker por host (que vivem em cada
+	  processo) continuem valendo para o host como um todo.
+	"""
+	shards = [[] for _ in range(workers)]
+	for i, url in enumerate(urls):
+		if by == "host":
+			host = urllib.parse.urlsplit(url).hostname or ""
+			index = zlib.crc32(host.encode("utf-8")) % workers
+		else:
+			index = i % workers
+		shards[index].append(url)
+	return shards
+
+
+def _fleet_worker(index: int, urls: list[str], rows, results, stop, timeout: float | None) -> None:
+	"""Processo de coleta: busca e parseia as URLs do shard e manda as linhas ao writer."""
+	# O processo pai trata o Ctrl+C e sinaliza `stop`; o worker termina a URL atual
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	stats = {"worker": index, "urls": len(urls), "saved": 0, "errors": 0, "bytes": 0,
+		"fetch_s": 0.0, "parse_s": 0.0}
+	try:
+		for url in urls:
+			if stop.is_set():
+				break
+			started = time.perf_counter()
+			fetched = None
+			try:
+				try:
+					status, body, content_type, charset = fetch_response(url, timeout=timeout)
+				except urllib.error.HTTPError as exc:
+					content_type, charset = content_types.parse_content_type(exc.headers.get("Content-Type"))
+					status, body = exc.code, exc.read()
+				fetched = time.perf_counter()
+				json_text = json_text_for(body, content_type, charset)
+			except Exception:
+				# URL malformada, erro de rede ou de parse: conta e segue para a próxima
+				stats["errors"] += 1
+				stats["fetch_s"] += (fetched or time.perf_counter()) - started
+				continue
+			stats["fetch_s"] += fetched - started
+			stats["parse_s"] += time.perf_counter() - fetched
+			stats["bytes"] += len(body)
+			timestamp = datetime.datetime.utcnow().isoformat()
+			rows.put((url, status, timestamp, body, json_text, (fetched - started) * 1000, content_type, charset))
+			stats["saved"] += 1
+	finally:
+		results.put(("worker", stats))
+
+
+def _fleet_writer(db_path: str, rows, results, batch_size: int, flush_interval: float) -> None:
+	"""Processo writer: o único que grava no SQLite, em lotes com `executemany`."""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	# Import tardio: bulk_import importa este módulo
+	from bulk_import import BatchWriter
+
+	writer = BatchWriter(db_path, defer_indexes=False, publish=True)
+	stats = {"rows": 0, "batches": 0, "write_s": 0.0}
+	batch = []
+
+	def flush():
+		if batch:
+			started = time.perf_counter()
+			with writer.conn:
+				writer.insert(batch)
+			stats["write_s"] += time.perf_counter() - started
+			stats["rows"] += len(batch)
+			stats["batches"] += 1
+			batch.clear()
+
+	deadline = time.monotonic() + flush_interval
+	try:
+		while True:
+			try:
+				row = rows.get(timeout=max(deadline - time.monotonic(), 0.01))
+			except queue.Empty:
+				row = ()
+			if row is None:
+				# Sentinela: todos os workers terminaram
+				break
+			if row:
+				if not writer.reserve(row):
+					flush()
+					writer.reserve(row)
+				batch.append(row)
+			if len(batch) >= batch_size or time.monotonic() >= deadline:
+				flush()
+				deadline = time.monotonic() + flush_interval
+		flush()
+	finally:
+		writer.finish()
+		results.put(("writer", stats))
+
+
+def run_fleet(urls: list[str], workers: int = None, db_path: str = "responses.db", shard_by: str = "url",
+		timeout: float | None = None, batch_size: int = FLEET_BATCH_SIZE,
+		flush_interval: float = FLEET_FLUSH_INTERVAL) -> dict:
+	"""Coleta `urls` com `workers` processos e um processo writer; retorna as estatísticas.
+
+	O fetch e o parse do JSON rodam nos workers, em paralelo de verdade
+	(cada processo tem seu GIL). As linhas seguem por uma fila limitada até
+	o writer, o único que grava no banco. Ctrl+C ou SIGTERM encerram com
+	calma: os workers terminam a URL atual, o writer grava o que já está na
+	fila e as estatísticas parciais são retornadas; um segundo sinal
+	interrompe os workers na hora.
+	"""
+	workers = max(1, min(workers or os.cpu_count() or 1, len(urls) or 1))
+	init_sqlite(db_path)
+	rows = multiprocessing.Queue(maxsize=workers * FLEET_QUEUE_DEPTH)
+	results = multiprocessing.Queue()
+	stop = multiprocessing.Event()
+
+	writer = multiprocessing.Process(target=_fleet_writer, name="colet-writer",
+		args=(db_path, rows, results, batch_size, flush_interval))
+	procs = [
+		multiprocessing.Process(target=_fleet_worker, name=f"colet-worker-{i}",
+			args=(i, shard, rows, results, stop, timeout))
+		for i, shard in enumerate(shard_urls(urls, workers, shard_by))
+	]
+
+	def request_stop(signum, frame):
+		if stop.is_set():
+			for proc in procs:
+				proc.terminate()
+		stop.set()
+
+	previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+	started = time.perf_counter()
+	stats = {}
+	try:
+		writer.start()
+		for proc in procs:
+			proc.start()
+		# As estatísticas são lidas antes do join: um processo só termina
+		# depois que o que ele pôs nas filas foi consumido
+		while len(stats) < len(procs) and (any(p.is_alive() for p in procs) or not results.empty()):
+			try:
+				kind, worker_stats = results.get(timeout=0.2)
+			except queue.Empty:
+				continue
+			stats[worker_stats.get("worker", kind)] = worker_stats
+		for proc in procs:
+			proc.join()
+		rows.put(None)
+		while "writer" not in stats and (writer.is_alive() or not results.empty()):
+			try:
+				kind, writer_stats = results.get(timeout=0.2)
+			except queue.Empty:
+				continue
+			stats[kind] = writer_stats
+		writer.join()
+	finally:
+		for sig, handler in previous.items():
+			signal.signal(sig, handler)
+	return {
+		"workers": [stats[i] for i in range(len(procs)) if i in stats],
+		"writer": stats.get("writer"),
+		"elapsed_s": time.perf_counter() - started,
+		"interrupted": stop.is_set(),
+	}
+
+
+def fleet_main(argv: list[str] = None) -> None:
+	"""Entrada do modo frota: lê as URLs de um arquivo (uma por linha) e coleta em paralelo."""
+	p = argparse.ArgumentParser(description="Collect a URL list with a multi-process fleet and a single SQLite writer")
+	p.add_argument("--urls", required=True, help="File with one URL per line ('-' reads stdin)")
+	p.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of collector processes")
+	p.add_argument("--db", default="responses.db", help="Path to responses.db")
+	p.add_argument("--shard-by", choices=["url", "host"], default="url",
+		help="Spread URLs evenly (url) or keep each host on one worker (host)")
+	p.add_argument("--timeout", type=float, help="Fixed request timeout in seconds (default: adaptive per host)")
+	p.add_argument("--batch-size", type=int, default=FLEET_BATCH_SIZE, help="Rows per writer transaction")
+	args = p.parse_args(argv)
+
+	source = sys.stdin if args.urls == "-" else open(args.urls, encoding="utf-8")
+	with source:
+		urls = [line.strip() for line in source if line.strip() and not line.startswith("#")]
+	result = run_fleet(urls, args.workers, args.db, args.shard_by, args.timeout, args.batch_size)
+
+	print(f"{'worker':>6} | {'urls':>6} | {'saved':>6} | {'errors':>6} | {'MB':>8} | {'fetch s':>8} | {'parse s':>8}")
+	for s in result["workers"]:
+		print(f"{s['worker']:>6} | {s['urls']:>6} | {s['saved']:>6} | {s['errors']:>6} | {s['bytes'] / 1e6:>8.2f} | "
+			f"{s['fetch_s']:>8.2f} | {s['parse_s']:>8.2f}")
+	writer = result["writer"] or {"rows": 0, "batches": 0, "write_s": 0.0}
+	rate = writer["rows"] / max(result["elapsed_s"], 1e-9)
+	print(f"writer: {writer['rows']} rows in {writer['batches']} batches ({writer['write_s']:.2f}s writing)")
+	print(f"{'Interrupted' if result['interrupted'] else 'Done'} in {result['elapsed_s']:.2f}s ({rate:.1f} rows/s)")
+
+
 if __name__ == "__main__":
+	if len(sys.argv) > 1:
+		# Com argumentos roda o modo frota, ex.: --urls urls.txt --workers 8
+		fleet_main()
+		sys.exit(0)
+
 	try:  # Executar uma única vez
 		# Define a URL alvo em uma variável para reutilização posterior
 		url = "https://ericdiaslemos.github.io/Apresentacao/"
 
 		# Faz a requisição usando a variável `url`
-		status, body = fetch_url(url)
+		started = time.perf_counter()
+		status, raw, content_type, charset = fetch_response(url)
+		elapsed_ms = (time.perf_counter() - started) * 1000
+		saved = {"elapsed_ms": elapsed_ms, "content_type": content_type, "charset": charset}
 		print(f"Status: {status}")
-		print(f"Resposta:\n{body}")
+		# Só corpos textuais são decodificados (para exibir); o banco recebe os bytes
+		body = content_types.decode(raw, charset) if content_types.is_text(content_type) else None
+		if body is None:
+			print(f"Resposta: {len(raw)} bytes ({content_type})")
+		else:
+			print(f"Resposta:\n{body}")
 
 		try:
-			data = json.loads(body)
-			print(f"\n✓ Resposta em JSON:")
-			print(json.dumps(data, indent=2, ensure_ascii=False))
-			# Se foi possível parsear para JSON, garante que o DB exista e
-			# salva a resposta completa e o JSON parseado no SQLite
-			init_sqlite()
-			save_response_sqlite(url, status, body, data)
+			if body is None:
+				raise json.JSONDecodeError("Corpo binário", "", 0)
+			if len(body) >= json_stream.STREAM_THRESHOLD:
+				# Corpo grande: valida, imprime e serializa em streaming,
+				# sem montar a árvore de objetos
+				json_text = json_stream.normalize(body)
+				if json_text is None:
+					raise json.JSONDecodeError("JSON inválido", body, 0)
+				print(f"\n✓ Resposta em JSON:")
+				for chunk in json_stream.dump_chunks(json_stream.iter_events(json_stream.text_chunks(body)), indent=2):
+					print(chunk, end="")
+				print()
+				init_sqlite()
+				save_response_sqlite(url, status, raw, None, json_text=json_text, **saved)
+			else:
+				data = json_codec.loads(body)
+				print(f"\n✓ Resposta em JSON:")
+				print(json_codec.dumps(data, indent=2))
+				# Se foi possível parsear para JSON, garante que o DB exista e
+				# salva a resposta completa e o JSON parseado no SQLite
+				init_sqlite()
+				save_response_sqlite(url, status, raw, data, **saved)
 		except json.JSONDecodeError:
 			# Se não for JSON válido, ainda assim inicializa o DB e salva
 			# a resposta bruta (campo json ficará NULL)
 			init_sqlite()
-			save_response_sqlite(url, status, body, None)
+			save_response_sqlite(url, status, raw, None, **saved)
 
 	except urllib.error.HTTPError as exc:
 		print(f"Erro HTTP: {exc.code} - {exc.reason}")
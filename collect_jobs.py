@@ -0,0 +1,437 @@
+"""Fila de coletas assíncronas persistida em SQLite.
+
+O `/collect` apenas enfileira um job e devolve seu id; um pool de workers
+(threads dentro do próprio web app ou um processo separado rodando este
+script) retira os jobs da fila, faz a requisição HTTP e salva a resposta.
+Assim a latência do site alvo não prende os workers do gunicorn.
+
+Um job em `running` tem um lease (`JOB_LEASE` segundos desde `started_at`):
+se o worker morrer ou não conseguir gravar o resultado, o job volta para a
+fila ao vencer o lease, até `JOB_MAX_ATTEMPTS` tentativas, e depois é
+marcado como falho. Jobs finalizados há mais de `JOB_RETENTION` segundos
+são apagados pelos workers.
+
+Credenciais de Basic auth de jobs enfileirados com `in_memory=True` (os
+workers internos do web app) nunca vão para o banco: ficam na memória do
+processo que enfileirou, indexadas pelo id do job, e só os workers desse
+processo pegam o job. A tabela guarda apenas um hash (`auth_key`) para
+agrupar coletas iguais. Para workers em outro processo (`python
+collect_jobs.py`) não há outro canal, e as credenciais ficam nas colunas
+`username`/`password` até o job terminar; nesse caso o arquivo do banco
+passa a ser legível só pelo dono (modo 0600).
+"""
+
+import argparse
+import datetime
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# Estados possíveis de um job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+AUTH_REQUIRED = "auth_required"
+
+FINAL_STATES = (DONE, FAILED, AUTH_REQUIRED)
+
+# Tempo máximo (s) de um job em `running` antes de voltar para a fila
+JOB_LEASE = float(os.environ.get("COLLECT_JOB_LEASE", 300))
+# Tentativas de um job antes de ser marcado como falho por lease vencido
+JOB_MAX_ATTEMPTS = int(os.environ.get("COLLECT_JOB_MAX_ATTEMPTS", 3))
+# Por quanto tempo (s) jobs finalizados ficam na tabela
+JOB_RETENTION = float(os.environ.get("COLLECT_JOB_RETENTION", 24 * 3600))
+
+
+# Credenciais dos jobs enfileirados em memória por este processo: (banco, id) -> (usuário, senha)
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+def process_owner() -> str:
+    """Identifica este processo como dono dos jobs cujas credenciais ficam em memória.
+
+    Calculado a cada chamada: workers do gunicorn são criados por fork e
+    cada um tem seu pid.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _ago(seconds: float) -> str:
+    return (datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)).isoformat()
+
+
+def init_jobs_table(db_path: str) -> None:
+    """Cria a tabela `collect_jobs` caso não exista."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS collect_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            username TEXT,
+            password TEXT,
+            state TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            http_status INTEGER,
+            record_id INTEGER,
+            message TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            auth_key TEXT,
+            owner TEXT
+        );
+        """
+    )
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(collect_jobs)")}
+    if "attempts" not in existing:
+        conn.execute("ALTER TABLE collect_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    if "auth_key" not in existing:
+        conn.execute("ALTER TABLE collect_jobs ADD COLUMN auth_key TEXT")
+        conn.execute("ALTER TABLE collect_jobs ADD COLUMN owner TEXT")
+        # Jobs antigos com credenciais não podem ser agrupados com coletas sem elas
+        conn.execute("UPDATE collect_jobs SET auth_key = 'legacy' WHERE username IS NOT NULL OR password IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_collect_jobs_state ON collect_jobs (state, id)")
+    conn.commit()
+    conn.close()
+
+
+def _restrict_permissions(db_path: str) -> None:
+    """Deixa o banco legível só pelo dono, já que ele vai guardar credenciais."""
+    try:
+        os.chmod(db_path, 0o600)
+    except OSError:
+        pass
+
+
+def enqueue_job(db_path: str, url: str, username: str = None, password: str = None,
+                coalesce: bool = False, in_memory: bool = False) -> int:
+    """Insere um job na fila e retorna seu id.
+
+    Com `coalesce=True`, se já houver um job pendente ou em execução para a
+    mesma URL e credenciais, retorna o id dele em vez de criar outro. Só
+    valem jobs enfileirados ou iniciados dentro do lease (`JOB_LEASE`): um
+    job abandonado não prende as próximas coletas da URL.
+
+    Com `in_memory=True`, as credenciais ficam só na memória deste processo
+    e o job só é pego pelos workers dele (ver `claim_job`).
+    """
+    username, password = username or None, password or None
+    auth_key = credentials_key(username, password) or None
+    owner = process_owner() if in_memory and auth_key else None
+    stored = (None, None) if owner else (username, password)
+    if auth_key and not owner:
+        _restrict_permissions(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if coalesce:
+            cutoff = _ago(JOB_LEASE)
+            row = conn.execute(
+                "SELECT id FROM collect_jobs WHERE url = ? AND auth_key IS ? "
+                "AND ((state = ? AND created_at >= ?) OR (state = ? AND started_at >= ?)) ORDER BY id LIMIT 1",
+                (url, auth_key, QUEUED, cutoff, RUNNING, cutoff),
+            ).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row[0]
+        cur = conn.execute(
+            "INSERT INTO collect_jobs (url, username, password, auth_key, owner, state, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, *stored, auth_key, owner, QUEUED, _now()),
+        )
+        if owner:
+            with _credentials_lock:
+                _credentials[(db_path, cur.lastrowid)] = (username, password)
+        conn.execute("COMMIT")
+        return cur.lastrowid
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _forget_credentials(db_path: str, job_ids) -> None:
+    with _credentials_lock:
+        for job_id in job_ids:
+            _credentials.pop((db_path, job_id), None)
+
+
+def _expire_running(conn, db_path: str, lease: float) -> None:
+    """Devolve à fila (ou falha) os jobs `running` com o lease vencido.
+
+    Também falha os jobs de outros processos que ficaram na fila além do
+    lease: as credenciais deles estavam na memória de um processo que não
+    os pegou, provavelmente porque foi encerrado.
+    """
+    cutoff = _ago(lease)
+    owner = process_owner()
+    expired = conn.execute(
+        "SELECT id FROM collect_jobs WHERE state = ? AND started_at < ? AND attempts >= ? AND owner = ?",
+        (RUNNING, cutoff, JOB_MAX_ATTEMPTS, owner),
+    ).fetchall()
+    conn.execute(
+        "UPDATE collect_jobs SET state = ?, finished_at = ?, message = ?, username = NULL, password = NULL "
+        "WHERE state = ? AND started_at < ? AND attempts >= ?",
+        (FAILED, _now(), "Erro: job não terminou dentro do lease", RUNNING, cutoff, JOB_MAX_ATTEMPTS),
+    )
+    conn.execute(
+        "UPDATE collect_jobs SET state = ?, started_at = NULL WHERE state = ? AND started_at < ?",
+        (QUEUED, RUNNING, cutoff),
+    )
+    conn.execute(
+        "UPDATE collect_jobs SET state = ?, finished_at = ?, message = ? "
+        "WHERE state = ? AND owner IS NOT NULL AND owner != ? AND created_at < ?",
+        (FAILED, _now(), "Erro: credenciais do job perdidas (processo encerrado)", QUEUED, owner, cutoff),
+    )
+    _forget_credentials(db_path, [row[0] for row in expired])
+
+
+def claim_job(db_path: str, lease: float = None) -> dict | None:
+    """Retira atomicamente o job mais antigo da fila e o marca como `running`.
+
+    Usa `BEGIN IMMEDIATE` para que dois workers (threads ou processos)
+    nunca peguem o mesmo job. Antes, jobs `running` há mais de `lease`
+    segundos (padrão `JOB_LEASE`) voltam para a fila ou são marcados como
+    falhos. Jobs com credenciais em memória só são pegos pelo processo que
+    os enfileirou.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _expire_running(conn, db_path, JOB_LEASE if lease is None else lease)
+        row = conn.execute(
+            "SELECT id, url, username, password, owner FROM collect_jobs "
+            "WHERE state = ? AND (owner IS NULL OR owner = ?) ORDER BY id LIMIT 1",
+            (QUEUED, process_owner()),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE collect_jobs SET state = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+            (RUNNING, _now(), row["id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    job = {key: row[key] for key in ("id", "url", "username", "password")}
+    if row["owner"] is not None:
+        with _credentials_lock:
+            job["username"], job["password"] = _credentials.get((db_path, row["id"]), (None, None))
+    return job
+
+
+def finish_job(db_path: str, job_id: int, state: str, http_status: int = None,
+               record_id: int = None, message: str = None) -> None:
+    """Grava o resultado do job e descarta as credenciais guardadas."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute(
+        "UPDATE collect_jobs SET state = ?, finished_at = ?, http_status = ?, record_id = ?, "
+        "message = ?, username = NULL, password = NULL WHERE id = ?",
+        (state, _now(), http_status, record_id, message, job_id),
+    )
+    conn.commit()
+    conn.close()
+    _forget_credentials(db_path, [job_id])
+
+
+def prune_jobs(db_path: str, retention: float = None) -> int:
+    """Apaga jobs finalizados há mais de `retention` segundos; retorna quantos."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    cur = conn.execute(
+        f"DELETE FROM collect_jobs WHERE state IN ({', '.join('?' * len(FINAL_STATES))}) AND finished_at < ?",
+        (*FINAL_STATES, _ago(JOB_RETENTION if retention is None else retention)),
+    )
+    conn.commit()
+    conn.close()
+    return cur.rowcount
+
+
+def get_job(db_path: str, job_id: int) -> dict | None:
+    """Retorna o estado público de um job (sem credenciais) ou None."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute(
+        "SELECT id, url, state, created_at, started_at, finished_at, http_status, record_id, message "
+        "FROM collect_jobs WHERE id = ?",
+        (job_id,),
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def process_next_job(db_path: str, handler) -> bool:
+    """Executa o próximo job da fila com `handler`; retorna False se a fila está vazia.
+
+    `handler(url, username, password)` deve retornar um dict com `state`,
+    `http_status`, `record_id` e `message`.
+    """
+    job = claim_job(db_path)
+    if job is None:
+        return False
+    try:
+        result = handler(job["url"], job["username"], job["password"])
+    except Exception as exc:
+        result = {"state": FAILED, "message": f"Erro: {exc}"}
+    finish_job(
+        db_path, job["id"], result.get("state", FAILED),
+        http_status=result.get("http_status"), record_id=result.get("record_id"),
+        message=result.get("message"),
+    )
+    return True
+
+
+def credentials_key(username: str = None, password: str = None) -> str:
+    """Resume as credenciais em um hash, para usar em chaves sem guardar a senha."""
+    if not username and not password:
+        return ""
+    return hashlib.sha256(f"{username or ''}\0{password or ''}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes com a mesma chave em uma única execução.
+
+    A primeira thread executa a função; as demais que chegarem enquanto ela
+    ainda está em andamento esperam e recebem o mesmo resultado (ou a mesma
+    exceção).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Executa `fn()` uma vez por chave em voo; retorna (resultado, compartilhado)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class JobWorkerPool:
+    """Pool de threads daemon que consome a fila de coletas."""
+
+    # Intervalo (s) entre limpezas de jobs antigos
+    prune_interval = 600
+
+    def __init__(self, db_path: str, handler, workers: int = 2, poll_interval: float = 0.5):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._prune_lock = threading.Lock()
+        self._pruned_at = None
+
+    def start(self) -> None:
+        self._prune()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"collect-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self) -> None:
+        """Acorda os workers logo após um enqueue, sem esperar o próximo poll."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _prune(self) -> None:
+        """Apaga jobs antigos, no máximo uma vez por `prune_interval` neste pool."""
+        with self._prune_lock:
+            now = time.monotonic()
+            if self._pruned_at is not None and now - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = now
+        try:
+            prune_jobs(self.db_path)
+        except sqlite3.Error:
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if process_next_job(self.db_path, self.handler):
+                    continue
+            except sqlite3.Error:
+                pass
+            self._prune()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+def main():
+    """Entrada principal: roda workers em um processo separado do web app."""
+    from web_app import DATABASE, run_collection
+
+    p = argparse.ArgumentParser(description="Run collection workers for the SQLite job queue")
+    p.add_argument("--db", default=os.environ.get("DATABASE", DATABASE), help="Path to responses.db")
+    p.add_argument("--workers", type=int, default=4, help="Number of worker threads")
+    p.add_argument("--poll", type=float, default=0.5, help="Queue poll interval in seconds")
+    p.add_argument("--min-freshness", type=float, default=float(os.environ.get("COLLECT_MIN_FRESHNESS", 0)),
+                   help="Reuse the latest stored record of a URL if younger than N seconds")
+    args = p.parse_args()
+
+    init_jobs_table(args.db)
+    pool = JobWorkerPool(
+        args.db,
+        lambda url, user, pwd: run_collection(url, user, pwd, db_path=args.db, min_freshness=args.min_freshness),
+        workers=args.workers, poll_interval=args.poll,
+    )
+    pool.start()
+    print(f"[OK] {args.workers} workers consumindo {args.db}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
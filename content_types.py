@@ -0,0 +1,87 @@
+"""Tipo de conteúdo dos corpos de resposta e decodificação sob demanda.
+
+Os coletores gravam o corpo exatamente como chegou (BLOB), junto com o
+`Content-Type` e o charset da resposta. Nada é decodificado na ingestão: só
+as telas de texto (/view, export HTML, view_responses.py) decodificam, e só
+corpos textuais. Imagens, protobuf, gzip e afins seguem como bytes até o
+download em /raw/<id>.
+
+Registros gravados antes desta mudança têm o corpo em TEXT e nenhum tipo;
+eles continuam sendo tratados como texto.
+"""
+
+import codecs
+
+# Charset usado quando a resposta não informa nenhum (também o padrão do JSON)
+DEFAULT_CHARSET = "utf-8"
+
+# Subtipos textuais fora de text/* (também valem como sufixo: application/problem+json)
+TEXT_SUBTYPES = frozenset({
+    "json", "xml", "javascript", "ecmascript", "x-javascript", "x-www-form-urlencoded",
+    "ndjson", "x-ndjson", "yaml", "x-yaml", "csv", "graphql", "xhtml",
+})
+
+# Bytes olhados no começo do corpo para decidir se ele pode ser JSON
+_SNIFF_SIZE = 64
+
+
+def parse_content_type(header: str | None) -> tuple[str | None, str | None]:
+    """Separa um header `Content-Type` em (tipo, charset), ambos em minúsculas."""
+    if not header:
+        return None, None
+    mime, _, params = header.partition(";")
+    charset = None
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            charset = value.strip().strip("\"'").lower() or None
+    return mime.strip().lower() or None, charset
+
+
+def is_text(content_type: str | None) -> bool:
+    """Se o corpo de um tipo deve ser decodificado para as telas de texto.
+
+    Sem tipo (registros antigos, respostas sem header) o corpo é tratado
+    como texto.
+    """
+    if not content_type:
+        return True
+    major, _, subtype = content_type.partition("/")
+    if major == "text":
+        return True
+    return subtype.rsplit("+", 1)[-1] in TEXT_SUBTYPES
+
+
+def codec_name(charset: str | None) -> str:
+    """Nome do codec Python para `charset`; charsets desconhecidos viram UTF-8."""
+    try:
+        return codecs.lookup(charset or DEFAULT_CHARSET).name
+    except LookupError:
+        return DEFAULT_CHARSET
+
+
+def decode(body, charset: str | None = None) -> str | None:
+    """Texto do corpo; `str` (registros antigos) passa direto."""
+    if body is None or isinstance(body, str):
+        return body
+    return str(body, codec_name(charset), "replace")
+
+
+def incremental_decoder(charset: str | None = None):
+    """Decodificador incremental para ler corpos grandes em pedaços."""
+    return codecs.getincrementaldecoder(codec_name(charset))("replace")
+
+
+def looks_like_json(body, charset: str | None = None) -> bool:
+    """Se o corpo começa com `{` ou `[`, decodificando só os primeiros bytes."""
+    head = body[:_SNIFF_SIZE]
+    if not isinstance(head, str):
+        head = incremental_decoder(charset).decode(bytes(head))
+    return head.lstrip("\ufeff \t\r\n")[:1] in ("{", "[")
+
+
+def media_type(content_type: str | None, charset: str | None) -> str:
+    """Valor de `Content-Type` para devolver um corpo como foi recebido."""
+    if not content_type:
+        return "application/octet-stream"
+    return f"{content_type}; charset={charset}" if charset else content_type
@@ -0,0 +1,200 @@
+"""Cache de resolução DNS em processo para o transporte HTTP dos coletores.
+
+O `urllib` faz um `getaddrinfo` novo a cada conexão. Este módulo guarda os
+endereços resolvidos por host (com TTL, limite de tamanho e cache negativo
+para nomes que não existem) e os entrega às conexões HTTP/HTTPS por meio de
+handlers do `urllib.request`. Hosts muito usados são renovados em segundo
+plano pouco antes de expirar, para que nenhuma requisição espere o resolver.
+Os coletores abrem as conexões por `urlopen` deste módulo, que usa um opener
+próprio em vez de substituir o opener global do `urllib`.
+
+O `getaddrinfo` da biblioteca padrão não informa o TTL dos registros, então
+o TTL é configurado (`DNS_CACHE_TTL`, em segundos).
+"""
+
+import http.client
+import os
+import socket
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ("infos", "error", "expires", "hits", "refreshing")
+
+    def __init__(self, infos, error, expires):
+        self.infos = infos
+        self.error = error
+        self.expires = expires
+        self.hits = 0
+        self.refreshing = False
+
+
+class DNSCache:
+    """Cache LRU de `getaddrinfo` com TTL, cache negativo e renovação antecipada."""
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, max_size: int = 1024,
+                 refresh_ahead: float = 0.2, hot_hits: int = 3, resolver=socket.getaddrinfo):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.refresh_ahead = refresh_ahead
+        self.hot_hits = hot_hits
+        self.resolver = resolver
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.refreshes = 0
+
+    def _lookup(self, host: str, port: int):
+        return self.resolver(host, port, 0, socket.SOCK_STREAM)
+
+    def _store(self, key, infos, error) -> None:
+        ttl = self.negative_ttl if error is not None else self.ttl
+        with self._lock:
+            self._entries[key] = _Entry(infos, error, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key) -> None:
+        try:
+            infos = self._lookup(*key)
+        except socket.gaierror:
+            # Mantém o valor atual até expirar; a próxima falta tenta de novo
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+            return
+        self._store(key, infos, None)
+        with self._lock:
+            self.refreshes += 1
+
+    def resolve(self, host: str, port: int):
+        """Retorna a lista de `getaddrinfo` para (host, port), usando o cache."""
+        key = (host.lower(), port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.expires:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                if entry.error is not None:
+                    self.negative_hits += 1
+                    raise socket.gaierror(*entry.error.args)
+                self.hits += 1
+                if (entry.hits >= self.hot_hits and not entry.refreshing
+                        and entry.expires - now < self.ttl * self.refresh_ahead):
+                    entry.refreshing = True
+                    threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                return entry.infos
+            self.misses += 1
+
+        try:
+            infos = self._lookup(*key)
+        except socket.gaierror as exc:
+            self._store(key, None, exc)
+            raise
+        self._store(key, infos, None)
+        return infos
+
+    def stats(self) -> dict:
+        """Contadores de acertos e faltas, para verificar o ganho do cache."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.negative_hits
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "refreshes": self.refreshes,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        """Esvazia o cache e zera os contadores."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.negative_hits = self.refreshes = 0
+
+
+DEFAULT_DNS_CACHE = DNSCache(
+    ttl=float(os.environ.get("DNS_CACHE_TTL", 300)),
+    negative_ttl=float(os.environ.get("DNS_CACHE_NEGATIVE_TTL", 30)),
+    max_size=int(os.environ.get("DNS_CACHE_SIZE", 1024)),
+)
+
+
+def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """Equivalente a `socket.create_connection`, resolvendo via `DEFAULT_DNS_CACHE`."""
+    host, port = address
+    error = None
+    for family, socktype, proto, _, sockaddr in DEFAULT_DNS_CACHE.resolve(host, port):
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as exc:
+            error = exc
+            if sock is not None:
+                sock.close()
+    if error is not None:
+        raise error
+    raise OSError(f"getaddrinfo returns an empty list for {host}")
+
+
+class CachedHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_connection
+
+
+class CachedHTTPSConnection(http.client.HTTPSConnection):
+    # O TLS continua usando `self.host` para SNI e verificação do certificado
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_connection
+
+
+class CachedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(CachedHTTPConnection, req)
+
+
+class CachedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        kwargs = {"context": self._context}
+        if hasattr(self, "_check_hostname"):
+            kwargs["check_hostname"] = self._check_hostname
+        return self.do_open(CachedHTTPSConnection, req, **kwargs)
+
+
+_opener = None
+_opener_lock = threading.Lock()
+
+
+def urlopen(request, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+    """Equivalente a `urllib.request.urlopen`, com um opener próprio que usa o cache de DNS.
+
+    O opener global do `urllib` não é tocado, então quem importa os
+    coletores como biblioteca continua com o transporte padrão. Com
+    `DNS_CACHE=0` no ambiente usa o `urllib.request.urlopen` comum.
+    """
+    global _opener
+    if os.environ.get("DNS_CACHE", "1") == "0":
+        return urllib.request.urlopen(request, timeout=timeout)
+    if _opener is None:
+        with _opener_lock:
+            if _opener is None:
+                _opener = urllib.request.build_opener(CachedHTTPHandler, CachedHTTPSHandler)
+    return _opener.open(request, timeout=timeout)
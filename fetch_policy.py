@@ -0,0 +1,253 @@
+"""Políticas por host para as requisições HTTP dos coletores.
+
+Cada host recebe:
+
+- um token bucket que limita a taxa de requisições;
+- um circuit breaker que passa a falhar na hora após erros consecutivos
+  e, depois de um tempo, deixa passar uma única requisição de teste
+  (half-open) para decidir se o host voltou;
+- um timeout adaptativo calculado a partir das latências observadas
+  (média móvel + 4 desvios, como o RTO do TCP).
+
+O `fetch_url` do `web_app.py` e o do `colet_json_noautentic.py` passam
+pela mesma instância `DEFAULT_POLICY`.
+"""
+
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(urllib.error.URLError):
+    """Host com circuit breaker aberto: a requisição nem é enviada."""
+
+
+class RateLimitedError(urllib.error.URLError):
+    """Sem tokens disponíveis para o host dentro do tempo de espera."""
+
+
+class TokenBucket:
+    """Token bucket simples: `rate` tokens por segundo, até `capacity` acumulados."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait: float) -> bool:
+        """Consome um token, esperando até `max_wait` segundos; False se não conseguir."""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Circuit breaker com estados closed -> open -> half_open -> closed."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Diz se uma requisição pode ser enviada agora."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """Devolve a vaga de teste do half-open quando a requisição não foi enviada."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Média e desvio móveis das latências de um host."""
+
+    def __init__(self, min_timeout: float, max_timeout: float, min_samples: int = 5):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.samples = 0
+        self.mean = 0.0
+        self.dev = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            if self.samples == 0:
+                self.mean, self.dev = seconds, seconds / 2
+            else:
+                self.dev = 0.75 * self.dev + 0.25 * abs(seconds - self.mean)
+                self.mean = 0.875 * self.mean + 0.125 * seconds
+            self.samples += 1
+
+    def timeout(self) -> float:
+        """Timeout sugerido; usa o máximo enquanto há poucas amostras."""
+        with self._lock:
+            if self.samples < self.min_samples:
+                return self.max_timeout
+            return max(self.min_timeout, min(self.max_timeout, self.mean + 4 * self.dev))
+
+
+class HostPolicy:
+    """Agrupa bucket, breaker e latência de um host."""
+
+    def __init__(self, policy: "FetchPolicy"):
+        self.bucket = TokenBucket(policy.rate, policy.burst)
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        self.latency = LatencyTracker(policy.min_timeout, policy.max_timeout)
+        self.requests = 0
+        self.rejected = 0
+
+
+class FetchPolicy:
+    """Motor de políticas por host usado pelas funções `fetch_url`."""
+
+    def __init__(self, rate: float = 10.0, burst: float = 20.0, max_wait: float = 5.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 min_timeout: float = 1.0, max_timeout: float = 10.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> HostPolicy:
+        """Retorna (criando se preciso) a política do host da URL."""
+        key = (urllib.parse.urlsplit(url).hostname or "").lower()
+        with self._lock:
+            policy = self._hosts.get(key)
+            if policy is None:
+                policy = self._hosts[key] = HostPolicy(self)
+            return policy
+
+    def call(self, url: str, fn, timeout: float | None = None):
+        """Executa `fn(timeout)` respeitando as políticas do host.
+
+        Exceções de rede (ou quaisquer outras) e respostas 5xx contam como
+        falha para o breaker; erros HTTP 4xx não, pois o host respondeu
+        normalmente. Se `timeout`
+        for None, usa o timeout adaptativo do host.
+        """
+        hp = self.host(url)
+        if not hp.breaker.allow():
+            hp.rejected += 1
+            raise CircuitOpenError(f"circuit breaker aberto para {urllib.parse.urlsplit(url).hostname}")
+        if not hp.bucket.acquire(self.max_wait):
+            hp.rejected += 1
+            hp.breaker.release_probe()
+            raise RateLimitedError(f"limite de taxa excedido para {urllib.parse.urlsplit(url).hostname}")
+
+        hp.requests += 1
+        effective_timeout = timeout if timeout is not None else hp.latency.timeout()
+        start = time.monotonic()
+        try:
+            result = fn(effective_timeout)
+        except urllib.error.HTTPError as exc:
+            hp.latency.observe(time.monotonic() - start)
+            if exc.code >= 500:
+                hp.breaker.record_failure()
+            else:
+                hp.breaker.record_success()
+            raise
+        except Exception:
+            # Rede, protocolo (BadStatusLine, IncompleteRead) ou URL inválida: sempre
+            # registra a falha, senão a vaga de teste do half-open nunca é devolvida
+            hp.breaker.record_failure()
+            raise
+
+        hp.latency.observe(time.monotonic() - start)
+        status = result[0] if isinstance(result, tuple) and result else None
+        if isinstance(status, int) and status >= 500:
+            hp.breaker.record_failure()
+        else:
+            hp.breaker.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        """Estado atual de cada host, para exibição ou métricas."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            name: {
+                "state": hp.breaker.state,
+                "consecutive_failures": hp.breaker.failures,
+                "timeout": round(hp.latency.timeout(), 3),
+                "latency_mean": round(hp.latency.mean, 3),
+                "samples": hp.latency.samples,
+                "tokens": round(hp.bucket.tokens, 2),
+                "requests": hp.requests,
+                "rejected": hp.rejected,
+            }
+            for name, hp in sorted(hosts.items())
+        }
+
+    def reset(self) -> None:
+        """Esquece o estado de todos os hosts."""
+        with self._lock:
+            self._hosts.clear()
+
+
+# Instância compartilhada pelo web app e pelo coletor de linha de comando
+DEFAULT_POLICY = FetchPolicy(
+    rate=float(os.environ.get("FETCH_RATE", 10)),
+    burst=float(os.environ.get("FETCH_BURST", 20)),
+    max_wait=float(os.environ.get("FETCH_MAX_WAIT", 5)),
+    failure_threshold=int(os.environ.get("FETCH_BREAKER_THRESHOLD", 5)),
+    reset_timeout=float(os.environ.get("FETCH_BREAKER_RESET", 30)),
+    min_timeout=float(os.environ.get("FETCH_MIN_TIMEOUT", 1)),
+    max_timeout=float(os.environ.get("FETCH_MAX_TIMEOUT", 10)),
+)
@@ -0,0 +1,204 @@
+"""Gera um banco `responses.db` sintético com milhões de linhas realistas.
+
+Útil para testar escalabilidade do `web_app.py` e do `view_responses.py`
+sem precisar coletar URLs reais uma a uma. As inserções usam
+`executemany` em transações grandes.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import time
+
+import rollups
+from colet_json_noautentic import init_sqlite
+
+# Caminho padrão do banco de dados: arquivo "responses.db" no mesmo diretório
+DEFAULT_DB = os.path.join(os.path.dirname(__file__), "responses.db")
+
+# Mistura padrão de status HTTP no formato "status:peso"
+DEFAULT_STATUS_MIX = "200:85,201:3,304:2,401:2,404:4,500:3,503:1"
+
+# Formatos de JSON disponíveis para o corpo das respostas
+JSON_SHAPES = ("object", "list", "nested", "text")
+
+# Mistura padrão dos formatos de JSON no formato "formato:peso"
+DEFAULT_SHAPE_MIX = "object:1,list:1,nested:1"
+
+HOSTS = (
+    "api.example.com",
+    "status.example.org",
+    "data.example.net",
+    "metrics.internal",
+    "billing.example.com",
+)
+
+
+def parse_status_mix(spec: str) -> tuple[list[int], list[int]]:
+    """Converte "200:90,404:10" em (status, pesos) para `random.choices`."""
+    statuses, weights = [], []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        status, _, weight = part.partition(":")
+        statuses.append(int(status))
+        weights.append(int(weight or 1))
+    if not statuses:
+        raise ValueError("status mix vazio")
+    return statuses, weights
+
+
+def parse_shape_mix(spec: str) -> tuple[list[str], list[int]]:
+    """Converte "object:3,list:1" em (formatos, pesos) para `random.choices`.
+
+    Só aceita formatos JSON de `JSON_SHAPES`; a fração de corpos em texto é
+    controlada à parte por `json_ratio`.
+    """
+    shapes, weights = [], []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        shape, _, weight = part.partition(":")
+        shape = shape.strip()
+        if shape not in JSON_SHAPES[:-1]:
+            raise ValueError(f"formato de JSON desconhecido: {shape!r} (use {', '.join(JSON_SHAPES[:-1])})")
+        shapes.append(shape)
+        weights.append(int(weight or 1))
+    if not shapes:
+        raise ValueError("mistura de formatos vazia")
+    return shapes, weights
+
+
+def make_urls(cardinality: int, rng: random.Random) -> list[str]:
+    """Cria `cardinality` URLs distintas espalhadas entre alguns hosts."""
+    urls = []
+    for i in range(cardinality):
+        host = HOSTS[i % len(HOSTS)]
+        urls.append(f"https://{host}/v1/resource/{i}?page={rng.randint(1, 20)}")
+    return urls
+
+
+def make_json(shape: str, size: int, rng: random.Random):
+    """Constrói um objeto JSON do formato pedido com ~`size` bytes."""
+    if shape == "object":
+        n = max(1, size // 24)
+        return {f"field_{i}": rng.randint(0, 10**6) for i in range(n)}
+    if shape == "list":
+        n = max(1, size // 40)
+        return [{"id": i, "value": rng.random()} for i in range(n)]
+    if shape == "nested":
+        n = max(1, size // 80)
+        return {
+            "meta": {"count": n, "source": rng.choice(HOSTS)},
+            "items": [{"id": i, "tags": ["a", "b"], "attrs": {"x": i}} for i in range(n)],
+        }
+    return None
+
+
+def generate_rows(count: int, urls: list[str], statuses: list[int], weights: list[int],
+                  body_mean: int, json_ratio: float, days: int, seed: int | None = None,
+                  shapes: list[str] = None, shape_weights: list[int] = None):
+    """Gera tuplas (url, status, timestamp, body, json) prontas para o INSERT.
+
+    O tamanho do corpo segue uma distribuição log-normal em torno de
+    `body_mean` bytes, como acontece com APIs reais (muitos corpos pequenos,
+    poucos muito grandes). Os corpos JSON seguem os formatos `shapes` com
+    os pesos `shape_weights` (padrão: `DEFAULT_SHAPE_MIX`).
+    """
+    if shapes is None:
+        shapes, shape_weights = parse_shape_mix(DEFAULT_SHAPE_MIX)
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    span = days * 86400
+    # Cache de corpos por (formato, tamanho aproximado) para não serializar
+    # milhões de objetos diferentes; o conteúdo é representativo, não único.
+    cache = {}
+    for _ in range(count):
+        url = rng.choice(urls)
+        status = rng.choices(statuses, weights)[0]
+        ts = (now - datetime.timedelta(seconds=rng.randint(0, span))).isoformat()
+        size = max(2, int(rng.lognormvariate(0, 1) * body_mean))
+        bucket = size.bit_length()
+        shape = rng.choices(shapes, shape_weights)[0] if rng.random() < json_ratio else "text"
+        key = (shape, bucket, status)
+        if key not in cache:
+            obj = make_json(shape, 1 << bucket, rng)
+            if obj is None:
+                body = "x" * (1 << bucket) if status < 400 else f"Error {status}"
+                cache[key] = (body, None)
+            else:
+                text = json.dumps(obj, ensure_ascii=False)
+                cache[key] = (text, text)
+        body, json_text = cache[key]
+        yield (url, status, ts, body, json_text)
+
+
+def populate(db_path: str, count: int, url_cardinality: int = 1000,
+             status_mix: str = DEFAULT_STATUS_MIX, body_mean: int = 512,
+             json_ratio: float = 0.8, days: int = 30, batch_size: int = 10000,
+             seed: int | None = None, shape_mix: str = DEFAULT_SHAPE_MIX) -> int:
+    """Insere `count` linhas sintéticas em `db_path` e retorna o total inserido."""
+    statuses, weights = parse_status_mix(status_mix)
+    shapes, shape_weights = parse_shape_mix(shape_mix)
+    init_sqlite(db_path)
+    rng = random.Random(seed)
+    urls = make_urls(url_cardinality, rng)
+
+    conn = sqlite3.connect(db_path)
+    # Ajustes apenas para a carga: WAL e sem fsync a cada lote
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    rows = generate_rows(count, urls, statuses, weights, body_mean, json_ratio, days, seed,
+                         shapes=shapes, shape_weights=shape_weights)
+    inserted = 0
+    try:
+        # Sem o trigger de rollups durante a carga; eles são recalculados no final
+        with rollups.suspended(conn):
+            while inserted < count:
+                batch = [row for _, row in zip(range(batch_size), rows)]
+                if not batch:
+                    break
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO responses (url, status, timestamp, body, json) VALUES (?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                inserted += len(batch)
+    finally:
+        conn.close()
+    return inserted
+
+
+def main():
+    """Entrada principal: gera um banco sintético conforme os argumentos."""
+    p = argparse.ArgumentParser(description="Generate a synthetic responses.db")
+    p.add_argument("--db", default=DEFAULT_DB, help="Path to responses.db")
+    p.add_argument("--rows", type=int, default=100000, help="How many rows to insert")
+    p.add_argument("--urls", type=int, default=1000, help="Distinct URL cardinality")
+    p.add_argument("--status-mix", default=DEFAULT_STATUS_MIX, help='Weighted statuses, e.g. "200:90,404:10"')
+    p.add_argument("--body-mean", type=int, default=512, help="Mean body size in bytes")
+    p.add_argument("--json-ratio", type=float, default=0.8, help="Fraction of rows with JSON bodies")
+    p.add_argument("--shapes", default=DEFAULT_SHAPE_MIX,
+                   help='Weighted JSON body shapes (object, list, nested), e.g. "object:3,list:1,nested:1"')
+    p.add_argument("--days", type=int, default=30, help="Spread timestamps over the last N days")
+    p.add_argument("--batch", type=int, default=10000, help="Rows per executemany transaction")
+    p.add_argument("--seed", type=int, help="Random seed for reproducible datasets")
+    args = p.parse_args()
+
+    start = time.perf_counter()
+    total = populate(
+        args.db, args.rows, url_cardinality=args.urls, status_mix=args.status_mix,
+        body_mean=args.body_mean, json_ratio=args.json_ratio, days=args.days,
+        batch_size=args.batch, seed=args.seed, shape_mix=args.shapes,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {total} rows into {args.db} in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Camada de codec JSON usada por coletores, web app e CLI.
+
+Todos os `loads`/`dumps` dos caminhos quentes passam por aqui. O backend é
+escolhido uma vez, na importação: `orjson` quando está instalado e o
+`json` da biblioteca padrão caso contrário. A variável `JSON_CODEC`
+(`auto`, `orjson` ou `stdlib`) força um backend.
+
+A saída é idêntica à do `json.dumps(..., ensure_ascii=False)`: texto
+Unicode sem escapes `\\uXXXX` e, com `indent=2`, a mesma formatação. Como o
+formato compacto do `orjson` não tem espaço após `,` e `:` (e esse texto é
+o que fica gravado na coluna `json`), a serialização sem indent continua no
+`json` da biblioteca padrão; o `orjson` acelera o parse e a formatação com
+`indent=2`. O que ele não suporta ou escreve diferente cai automaticamente
+no `json`: inteiros acima de 64 bits, chaves que não são str, NaN/Infinity
+(que o `orjson` escreveria como `null`) e floats que o `repr` escreve em
+notação científica (`1e+300`, `1e-05`, que o `orjson` escreveria como
+`1e300` e `0.00001`).
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+# Inteiros com 19+ dígitos podem sair do intervalo de 64 bits, que o orjson
+# converte para float em vez de int. A busca troca dígitos por "0" e o resto
+# por espaço com `bytes.translate`, bem mais barato que uma regex.
+_DIGIT_TABLE = bytes(0x30 if 0x30 <= i <= 0x39 else 0x20 for i in range(256))
+_LONG_DIGITS = b"0" * 19
+
+
+def _has_long_digits(text) -> bool:
+    data = text.encode("utf-8", "surrogatepass") if isinstance(text, str) else bytes(text)
+    return _LONG_DIGITS in data.translate(_DIGIT_TABLE)
+
+
+def _has_special_floats(obj) -> bool:
+    """Se `obj` tem floats que o `orjson` formataria diferente do `json`.
+
+    O `repr` (usado pelo `json`) passa para notação científica fora de
+    [1e-4, 1e16); NaN e Infinity também caem fora do intervalo.
+    """
+    stack = [obj]
+    pop = stack.pop
+    push = stack.extend
+    while stack:
+        value = pop()
+        kind = type(value)
+        if kind is dict:
+            push(value.values())
+        elif kind is list or kind is tuple:
+            push(value)
+        elif kind is float and value != 0 and not 1e-4 <= abs(value) < 1e16:
+            return True
+    return False
+
+
+class StdlibCodec:
+    """Codec baseado no módulo `json` da biblioteca padrão."""
+
+    name = "stdlib"
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def dumps(self, obj, indent: int = None) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+
+class OrjsonCodec:
+    """Codec baseado no `orjson`, com fallback para o `json` da biblioteca padrão."""
+
+    name = "orjson"
+
+    def __init__(self):
+        self._stdlib = StdlibCodec()
+
+    def loads(self, text):
+        if _has_long_digits(text):
+            return self._stdlib.loads(text)
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity e inteiros enormes são aceitos pelo `json`; se o
+            # texto for mesmo inválido, o erro levantado é o do `json`
+            return self._stdlib.loads(text)
+
+    def dumps(self, obj, indent: int = None) -> str:
+        if indent != 2 or _has_special_floats(obj):
+            return self._stdlib.dumps(obj, indent=indent)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+        except TypeError:
+            return self._stdlib.dumps(obj, indent=indent)
+
+
+CODECS = {"stdlib": StdlibCodec}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+
+
+def get_codec(name: str = "auto"):
+    """Retorna uma instância do codec pedido (`auto` escolhe o mais rápido disponível)."""
+    if name == "auto":
+        name = "orjson" if "orjson" in CODECS else "stdlib"
+    if name not in CODECS:
+        raise ValueError(f"Codec JSON indisponível: {name!r}")
+    return CODECS[name]()
+
+
+# Codec compartilhado pelos módulos da aplicação
+DEFAULT_CODEC = get_codec(os.environ.get("JSON_CODEC", "auto"))
+
+
+def loads(text):
+    """Desserializa `text` (str ou bytes) com o codec padrão."""
+    return DEFAULT_CODEC.loads(text)
+
+
+def dumps(obj, indent: int = None) -> str:
+    """Serializa `obj` como `json.dumps(obj, ensure_ascii=False, indent=indent)`."""
+    return DEFAULT_CODEC.dumps(obj, indent=indent)
+
+
+def benchmark(documents: list[str], codec, repeat: int = 3) -> dict:
+    """Mede o custo médio por registro de parse, serialização e formatação."""
+    objs = [codec.loads(text) for text in documents]
+    results = {}
+    for label, fn, items in (
+        ("loads", codec.loads, documents),
+        ("dumps", codec.dumps, objs),
+        ("dumps_indent", lambda obj: codec.dumps(obj, indent=2), objs),
+    ):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for item in items:
+                fn(item)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best / len(items) * 1e6
+    return results
+
+
+def _sample_documents(db_path: str | None, records: int, size: int, seed: int) -> list[str]:
+    if db_path:
+        import sqlite3
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT json FROM responses WHERE json IS NOT NULL ORDER BY id DESC LIMIT ?", (records,))
+        documents = [row[0] for row in rows]
+        conn.close()
+        if documents:
+            return documents
+    from generate_dataset import make_json
+
+    rng = random.Random(seed)
+    shapes = ["object", "list", "nested"]
+    return [json.dumps(make_json(shapes[i % 3], size, rng), ensure_ascii=False) for i in range(records)]
+
+
+def main():
+    """Entrada principal: compara o custo por registro de cada backend disponível."""
+    p = argparse.ArgumentParser(description="Benchmark JSON codecs on stored or synthetic records")
+    p.add_argument("--db", help="Read sample documents from the json column of this responses.db")
+    p.add_argument("--records", type=int, default=2000, help="Number of documents to sample")
+    p.add_argument("--size", type=int, default=2048, help="Approximate size of synthetic documents in bytes")
+    p.add_argument("--repeat", type=int, default=3, help="Best-of repetitions per measurement")
+    p.add_argument("--seed", type=int, default=1, help="Seed for synthetic documents")
+    args = p.parse_args()
+
+    documents = _sample_documents(args.db, args.records, args.size, args.seed)
+    mean_size = sum(len(d) for d in documents) / len(documents)
+    print(f"{len(documents)} documents, mean size {mean_size:.0f} chars, default codec: {DEFAULT_CODEC.name}")
+    print(f"{'codec':<8} | {'loads us/rec':>12} | {'dumps us/rec':>12} | {'indent=2 us/rec':>15}")
+    for name in CODECS:
+        r = benchmark(documents, get_codec(name), args.repeat)
+        print(f"{name:<8} | {r['loads']:>12.2f} | {r['dumps']:>12.2f} | {r['dumps_indent']:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
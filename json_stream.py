@@ -0,0 +1,487 @@
+"""Parser JSON incremental, orientado a eventos, para respostas muito grandes.
+
+`json.loads` precisa do texto inteiro e monta a árvore completa de objetos,
+o que custa várias vezes o tamanho do documento em memória. Aqui o texto
+entra em pedaços (`EventParser.feed`) e sai como uma sequência de eventos
+no formato do ijson: `(prefixo, evento, valor)`, com prefixos como
+`"data.item.id"`. Sobre esses eventos o módulo oferece:
+
+- `dump_chunks`: reserializa o documento em pedaços, com a mesma saída de
+  `json.dumps(..., ensure_ascii=False)` (com ou sem `indent`);
+- `summarize`: valida o documento e extrai tipo, chaves, tamanho e os
+  valores de caminhos configurados, montando só as subárvores pedidas;
+- `items`: entrega um a um os valores de um caminho (ex.: os itens de um
+  array enorme), montando só um item por vez;
+- `normalize`: atalho para validar e reserializar um texto de uma vez.
+
+A memória usada fica proporcional à profundidade do documento e ao
+tamanho do maior token, não ao tamanho do documento.
+"""
+
+import math
+import os
+import re
+from json.decoder import JSONDecodeError, scanstring
+from json.encoder import encode_basestring
+
+# Documentos a partir deste tamanho (em caracteres) usam o caminho em streaming
+STREAM_THRESHOLD = int(os.environ.get("JSON_STREAM_THRESHOLD", 1024 * 1024))
+
+# Tamanho dos pedaços lidos e produzidos pelas funções do módulo
+CHUNK_SIZE = 64 * 1024
+
+_WS = re.compile(r"[ \t\n\r]*")
+# Conteúdo de string até a aspa de fechamento, um `\\` pendente no fim ou o fim do texto
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_SIMPLE_STRING = re.compile(r'"([^"\\\x00-\x1f]*)"')
+_NUMBER_RUN = re.compile(r"[-+0-9.eE]+")
+_NUMBER_START = "-0123456789"
+_NUMBER_CHARS = "-+0123456789.eE"
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+
+# Literais aceitos por `json.loads` (incluindo as extensões NaN/Infinity)
+_LITERALS = (
+    ("true", "boolean", True),
+    ("false", "boolean", False),
+    ("null", "null", None),
+    ("NaN", "number", math.nan),
+    ("Infinity", "number", math.inf),
+    ("-Infinity", "number", -math.inf),
+)
+
+# Estados do parser
+_VALUE = 0          # espera um valor
+_ARRAY_FIRST = 1    # logo após '[': valor ou ']'
+_MAP_FIRST = 2      # logo após '{': chave ou '}'
+_KEY = 3            # após ',' em um objeto: chave
+_COLON = 4          # após a chave: ':'
+_AFTER_VALUE = 5    # após um valor: ',' ou fechamento
+_DONE = 6           # documento completo: só espaços
+
+VALUE_EVENTS = ("string", "number", "boolean", "null")
+
+
+class JSONStreamError(ValueError):
+    """Documento JSON inválido ou incompleto."""
+
+
+class LargeNumber(str):
+    """Inteiro com mais dígitos que o limite de conversão do Python, mantido como texto.
+
+    `int()` recusa textos acima de `sys.get_int_max_str_digits()` (4300 por
+    padrão); o evento traz os dígitos originais e a reserialização os
+    repete sem converter.
+    """
+
+
+def _number_value(number) -> int | float | LargeNumber:
+    text = number.group()
+    if number.group(1) or number.group(2):
+        return float(text)
+    try:
+        return int(text)
+    except ValueError:
+        return LargeNumber(text)
+
+
+class EventParser:
+    """Tokenizador JSON incremental que converte pedaços de texto em eventos."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._offset = 0
+        self._state = _VALUE
+        # Um item por container aberto: (tipo, prefixo do container)
+        self._stack = []
+        # Prefixo do próximo valor
+        self._prefix = ""
+        # String que ainda não terminou: pedaços recebidos desde a aspa de
+        # abertura (None fora de uma string longa) e se o último pedaço
+        # acabou no meio de um escape (`\\`)
+        self._pending = None
+        self._pending_escape = None
+
+    def feed(self, text: str) -> list[tuple]:
+        """Consome mais um pedaço do documento e retorna os eventos completos."""
+        if self._pending is not None:
+            # Só o pedaço novo é varrido atrás da aspa de fechamento; o texto
+            # da string é juntado uma única vez, quando ela termina
+            if not text:
+                return []
+            end = _STRING_BODY.match(text, 1 if self._pending_escape else 0).end()
+            self._pending.append(text)
+            if end == len(text) or text[end] != '"':
+                self._pending_escape = end < len(text)
+                return []
+            self._buf = "".join(self._pending)
+            self._pending = None
+            self._pending_escape = None
+        else:
+            self._buf = self._buf[self._pos:] + text
+            self._offset += self._pos
+        self._pos = 0
+        return self._feed_scan()
+
+    def _feed_scan(self) -> list[tuple]:
+        events = self._scan(final=False)
+        if self._pending_escape is not None:
+            # `_scan` parou em uma string sem fechamento: ela passa a ser
+            # acumulada em pedaços, sem reconstruir o buffer a cada `feed`
+            self._pending = [self._buf[self._pos:]]
+            self._offset += self._pos
+            self._buf = ""
+            self._pos = 0
+        return events
+
+    def close(self) -> list[tuple]:
+        """Sinaliza o fim do documento; falha se ele estiver incompleto."""
+        if self._pending is not None:
+            self._buf = "".join(self._pending)
+            self._pending = None
+            self._pending_escape = None
+        events = self._scan(final=True)
+        if self._state != _DONE:
+            raise JSONStreamError("Documento JSON incompleto")
+        return events
+
+    def _error(self, message: str, pos: int):
+        raise JSONStreamError(f"{message} (posição {self._offset + pos})")
+
+    def _scan(self, final: bool) -> list[tuple]:
+        # Laço quente: estado em variáveis locais, gravado de volta no finally
+        events = []
+        emit = events.append
+        buf = self._buf
+        size = len(buf)
+        pos = self._pos
+        state = self._state
+        stack = self._stack
+        prefix = self._prefix
+        skip_ws = _WS.match
+        try:
+            while True:
+                if pos >= size:
+                    break
+                c = buf[pos]
+                if c in " \t\n\r":
+                    pos = skip_ws(buf, pos).end()
+                    if pos >= size:
+                        break
+                    c = buf[pos]
+
+                if state == _AFTER_VALUE:
+                    kind, parent = stack[-1]
+                    if c == ",":
+                        pos += 1
+                        state = _KEY if kind == "map" else _VALUE
+                        continue
+                    if (c == "}" and kind == "map") or (c == "]" and kind == "array"):
+                        pos += 1
+                        stack.pop()
+                        prefix = parent
+                        emit((parent, "end_map" if kind == "map" else "end_array", None))
+                        state = _AFTER_VALUE if stack else _DONE
+                        continue
+                    self._error("Esperado ',' ou fechamento", pos)
+
+                if state == _COLON:
+                    if c != ":":
+                        self._error("Esperado ':'", pos)
+                    pos += 1
+                    state = _VALUE
+                    continue
+
+                if state == _MAP_FIRST or state == _KEY:
+                    parent = stack[-1][1]
+                    if c == "}" and state == _MAP_FIRST:
+                        pos += 1
+                        stack.pop()
+                        prefix = parent
+                        emit((parent, "end_map", None))
+                        state = _AFTER_VALUE if stack else _DONE
+                        continue
+                    if c != '"':
+                        self._error("Esperada chave entre aspas", pos)
+                    key, end = self._string(buf, pos, final)
+                    if end is None:
+                        break
+                    pos = end
+                    emit((parent, "map_key", key))
+                    prefix = f"{parent}.{key}" if parent else key
+                    state = _COLON
+                    continue
+
+                if state == _DONE:
+                    self._error("Dados extras após o documento", pos)
+
+                # _VALUE ou _ARRAY_FIRST
+                if c == "{":
+                    pos += 1
+                    emit((prefix, "start_map", None))
+                    stack.append(("map", prefix))
+                    state = _MAP_FIRST
+                    continue
+                if c == "[":
+                    pos += 1
+                    emit((prefix, "start_array", None))
+                    stack.append(("array", prefix))
+                    prefix = f"{prefix}.item" if prefix else "item"
+                    state = _ARRAY_FIRST
+                    continue
+                if c == "]" and state == _ARRAY_FIRST:
+                    pos += 1
+                    prefix = stack.pop()[1]
+                    emit((prefix, "end_array", None))
+                    state = _AFTER_VALUE if stack else _DONE
+                    continue
+
+                if c == '"':
+                    event = "string"
+                    value, end = self._string(buf, pos, final)
+                else:
+                    event, value, end = self._scalar(buf, pos, final)
+                if end is None:
+                    break
+                pos = end
+                emit((prefix, event, value))
+                state = _AFTER_VALUE if stack else _DONE
+        finally:
+            self._pos = pos
+            self._state = state
+            self._prefix = prefix
+        return events
+
+    def _string(self, buf: str, pos: int, final: bool) -> tuple:
+        """Lê a string em `pos`; (None, None) se ela ainda não terminou no buffer."""
+        simple = _SIMPLE_STRING.match(buf, pos)
+        if simple is not None:
+            return simple.group(1), simple.end()
+        end = _STRING_BODY.match(buf, pos + 1).end()
+        if end == len(buf) or buf[end] != '"':
+            if final:
+                self._error("String não terminada", pos)
+            self._pending_escape = end < len(buf)
+            return None, None
+        try:
+            return scanstring(buf, pos + 1)
+        except JSONDecodeError as exc:
+            self._error(exc.msg, exc.pos)
+
+    def _scalar(self, buf: str, pos: int, final: bool) -> tuple:
+        """Lê número ou literal em `pos`; (None, None, None) se o token pode continuar."""
+        c = buf[pos]
+        if c in _NUMBER_START:
+            number = _NUMBER.match(buf, pos)
+            end = number.end() if number is not None else pos
+            if end < len(buf) and buf[end] not in _NUMBER_CHARS and number is not None:
+                return "number", _number_value(number), end
+            run_end = _NUMBER_RUN.match(buf, pos).end()
+            if run_end >= len(buf) and not final:
+                return None, None, None
+            if number is not None and end == run_end:
+                return "number", _number_value(number), end
+            if not buf.startswith("-I", pos):
+                self._error("Número inválido", pos)
+
+        for text, event, value in _LITERALS:
+            if buf.startswith(text, pos):
+                return event, value, pos + len(text)
+        rest = buf[pos:]
+        if not final and any(text.startswith(rest) for text, _, _ in _LITERALS):
+            return None, None, None
+        self._error("Valor inválido", pos)
+
+
+def text_chunks(text: str, size: int = CHUNK_SIZE):
+    """Divide um texto já em memória em pedaços para o parser."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def iter_events(chunks):
+    """Gera os eventos de um documento recebido como iterável de pedaços de texto."""
+    parser = EventParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def _encode_number(value) -> str:
+    if isinstance(value, LargeNumber):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (math.inf, -math.inf):
+            return "Infinity" if value > 0 else "-Infinity"
+        return float.__repr__(value)
+    return int.__repr__(value)
+
+
+def _encode_scalar(event: str, value) -> str:
+    if event == "string":
+        return encode_basestring(value)
+    if event == "number":
+        return _encode_number(value)
+    if event == "boolean":
+        return "true" if value else "false"
+    return "null"
+
+
+def dump_chunks(events, indent: int = None, chunk_size: int = CHUNK_SIZE):
+    """Reserializa eventos em pedaços de texto.
+
+    A saída concatenada é igual a `json.dumps(obj, ensure_ascii=False,
+    indent=indent)` do documento, exceto por chaves duplicadas, que são
+    mantidas em vez de reduzidas à última.
+    """
+    out = []
+    size = 0
+    # Um item por container aberto: [tipo, membros já escritos]
+    stack = []
+    item_sep = ", " if indent is None else ","
+
+    def separator() -> str:
+        top = stack[-1]
+        sep = item_sep if top[1] else ""
+        top[1] += 1
+        if indent is None:
+            return sep
+        return sep + "\n" + " " * (indent * len(stack))
+
+    for _, event, value in events:
+        if event == "map_key":
+            piece = separator() + encode_basestring(value) + ": "
+        elif event in ("end_map", "end_array"):
+            _, members = stack.pop()
+            close = "}" if event == "end_map" else "]"
+            piece = "\n" + " " * (indent * len(stack)) + close if members and indent is not None else close
+        else:
+            piece = separator() if stack and stack[-1][0] == "array" else ""
+            if event == "start_map":
+                piece += "{"
+                stack.append(["map", 0])
+            elif event == "start_array":
+                piece += "["
+                stack.append(["array", 0])
+            else:
+                piece += _encode_scalar(event, value)
+        out.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(out)
+            out = []
+            size = 0
+    if out:
+        yield "".join(out)
+
+
+class _Builder:
+    """Monta em memória apenas a subárvore de um caminho extraído."""
+
+    def __init__(self):
+        self.stack = []
+        self.key = None
+        self.value = None
+
+    def event(self, event: str, value) -> bool:
+        """Aplica um evento; retorna True quando a subárvore está completa."""
+        if event == "map_key":
+            self.key = value
+            return False
+        if event in ("end_map", "end_array"):
+            done = self.stack.pop()
+            if not self.stack:
+                self.value = done
+                return True
+            return False
+        if event == "start_map":
+            item = {}
+        elif event == "start_array":
+            item = []
+        else:
+            item = value
+        if self.stack:
+            parent = self.stack[-1]
+            if isinstance(parent, list):
+                parent.append(item)
+            else:
+                parent[self.key] = item
+        if event in ("start_map", "start_array"):
+            self.stack.append(item)
+            return False
+        if not self.stack:
+            self.value = item
+            return True
+        return False
+
+
+def summarize(events, paths=(), max_keys: int = 5) -> dict:
+    """Valida o documento e resume sua estrutura sem montar a árvore inteira.
+
+    Retorna um dict com `type` ("object", "array", "string", "number",
+    "boolean" ou "null"), as primeiras `max_keys` chaves do objeto raiz em
+    `keys`, o tamanho do array raiz em `length`, o valor da raiz quando ela
+    é escalar em `value` e, em `values`, o primeiro valor encontrado em cada
+    um dos `paths` (no formato de prefixo do ijson, ex.: `"data.item.id"`).
+    Levanta `JSONStreamError` se o documento for inválido.
+    """
+    summary = {"type": None, "keys": [], "length": None, "value": None, "values": {}}
+    wanted = set(paths)
+    building = {}
+    for prefix, event, value in events:
+        if summary["type"] is None:
+            summary["type"] = {"start_map": "object", "start_array": "array"}.get(event, event)
+            if event == "start_array":
+                summary["length"] = 0
+            elif event in VALUE_EVENTS:
+                summary["value"] = value
+        if prefix == "":
+            if event == "map_key" and len(summary["keys"]) < max_keys and value not in summary["keys"]:
+                summary["keys"].append(value)
+        elif prefix == "item" and summary["type"] == "array" and event not in ("map_key", "end_map", "end_array"):
+            summary["length"] += 1
+
+        for path, builder in list(building.items()):
+            if builder.event(event, value):
+                summary["values"][path] = builder.value
+                del building[path]
+        if prefix in wanted and event not in ("map_key", "end_map", "end_array"):
+            wanted.discard(prefix)
+            builder = _Builder()
+            if builder.event(event, value):
+                summary["values"][prefix] = builder.value
+            else:
+                building[prefix] = builder
+    return summary
+
+
+def items(events, prefix: str):
+    """Gera, um a um, os valores completos encontrados em `prefix`.
+
+    Equivale ao `ijson.items`: com `prefix="log.entries.item"`, cada item do
+    array `log.entries` é montado e entregue assim que termina, sem manter
+    o documento inteiro em memória.
+    """
+    builder = None
+    for path, event, value in events:
+        if builder is None:
+            if path != prefix or event in ("map_key", "end_map", "end_array"):
+                continue
+            builder = _Builder()
+        if builder.event(event, value):
+            yield builder.value
+            builder = None
+
+
+def normalize(text: str, indent: int = None) -> str | None:
+    """Valida `text` em streaming e retorna sua reserialização, ou None se não for JSON.
+
+    Equivale a `json.dumps(json.loads(text), ensure_ascii=False,
+    indent=indent)`, sem montar os objetos intermediários.
+    """
+    try:
+        return "".join(dump_chunks(iter_events(text_chunks(text)), indent=indent))
+    except JSONStreamError:
+        return None
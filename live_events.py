@@ -0,0 +1,207 @@
+"""Feed de inserções e remoções em `responses` para o índice ao vivo.
+
+Cada insert ou delete grava um resumo do registro (id, url, status,
+timestamp) na tabela `response_events` do banco principal, na mesma
+transação quando possível. Cada processo do web app roda uma única thread
+(`EventHub`) que lê os eventos novos e os distribui para todas as conexões
+abertas em `/events`; assim o custo no banco é uma consulta por intervalo
+de polling, não importa quantos painéis estejam abertos. Como o feed fica
+no SQLite, eventos gravados por outros processos (workers de
+`collect_jobs.py`, o coletor de linha de comando, outros workers do
+gunicorn) também chegam.
+
+A tabela guarda só os `EVENT_RETENTION` eventos mais recentes; um cliente
+que reconecta de um ponto já descartado recebe um evento `reset` e recarrega
+a tabela inteira.
+"""
+
+import queue
+import sqlite3
+import threading
+
+# Quantidade de eventos mantidos na tabela para reconexões (Last-Event-ID)
+EVENT_RETENTION = 10_000
+
+# Intervalo entre leituras da tabela de eventos, em segundos
+POLL_INTERVAL = 0.5
+
+# Máximo de eventos lidos por consulta
+BATCH_SIZE = 500
+
+INSERTED = "inserted"
+DELETED = "deleted"
+RESET = "reset"
+
+
+def init_events_table(cur) -> None:
+    """Cria a tabela `response_events` (cursor ou conexão)."""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS response_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            url TEXT,
+            status INTEGER,
+            timestamp TEXT
+        );
+        """
+    )
+
+
+def publish(conn, kind: str, records) -> None:
+    """Grava eventos `kind` para `records` [(id, url, status, timestamp), ...].
+
+    Usa a conexão de quem chama, então o evento é confirmado junto com a
+    alteração; o commit fica a cargo de quem chama.
+    """
+    records = list(records)
+    if not records:
+        return
+    conn.executemany(
+        "INSERT INTO main.response_events (kind, record_id, url, status, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(kind, *record) for record in records],
+    )
+    conn.execute("DELETE FROM main.response_events WHERE seq <= ?", (last_seq(conn) - EVENT_RETENTION,))
+
+
+def last_seq(conn) -> int:
+    """Número do evento mais recente (0 se ainda não houve nenhum)."""
+    row = conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = 'response_events'").fetchone()
+    return row[0] if row else 0
+
+
+def events_since(conn, seq: int, limit: int = BATCH_SIZE) -> list[dict]:
+    """Eventos com número maior que `seq`, do mais antigo ao mais novo."""
+    rows = conn.execute(
+        "SELECT seq, kind, record_id, url, status, timestamp FROM main.response_events "
+        "WHERE seq > ? ORDER BY seq LIMIT ?",
+        (seq, limit),
+    )
+    return [
+        {"seq": r[0], "kind": r[1], "id": r[2], "url": r[3], "status": r[4], "timestamp": r[5]}
+        for r in rows
+    ]
+
+
+def oldest_seq(conn) -> int | None:
+    """Número do evento mais antigo ainda guardado."""
+    return conn.execute("SELECT MIN(seq) FROM main.response_events").fetchone()[0]
+
+
+class Subscription:
+    """Fila de eventos de uma conexão do `/events`."""
+
+    def __init__(self, after: int):
+        self.after = after
+        self.queue = queue.Queue()
+
+    def get(self, timeout: float) -> list[dict]:
+        """Espera até `timeout` segundos pelo próximo lote; [] se nada chegou."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+
+class EventHub:
+    """Lê o feed de um banco em uma thread e distribui os eventos aos inscritos.
+
+    A thread só consulta o banco enquanto houver inscritos; `notify` a
+    acorda na hora quando o próprio processo acabou de publicar.
+    """
+
+    def __init__(self, db_path: str, poll_interval: float = POLL_INTERVAL):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, after: int = None) -> Subscription:
+        """Inscreve uma conexão a partir do evento `after` (None = só os novos).
+
+        Se `after` já saiu da retenção, o primeiro lote é um evento `reset`.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            current = last_seq(conn)
+            oldest = oldest_seq(conn)
+        finally:
+            conn.close()
+        if after is None or after > current:
+            after = current
+        sub = Subscription(after)
+        if after < current and (oldest is None or after < oldest - 1):
+            sub.queue.put([{"seq": current, "kind": RESET}])
+            sub.after = current
+        with self._lock:
+            self._subscribers.add(sub)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="live-events", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def notify(self) -> None:
+        """Acorda a thread para ler os eventos recém-publicados."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            while True:
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                    if not subscribers:
+                        self._thread = None
+                        return
+                try:
+                    self._dispatch(conn, subscribers)
+                except sqlite3.Error:
+                    pass
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        finally:
+            conn.close()
+
+    def _dispatch(self, conn, subscribers) -> None:
+        # Uma só leitura a partir do inscrito mais atrasado, repartida entre
+        # todos; normalmente estão todos no mesmo ponto
+        start = min(sub.after for sub in subscribers)
+        events = events_since(conn, start)
+        while events:
+            for sub in subscribers:
+                batch = [event for event in events if event["seq"] > sub.after]
+                if batch:
+                    sub.queue.put(batch)
+                    sub.after = batch[-1]["seq"]
+            if len(events) < BATCH_SIZE:
+                break
+            events = events_since(conn, events[-1]["seq"])
+
+
+# Hubs deste processo, um por arquivo de banco
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_hub(db_path: str) -> EventHub:
+    """Retorna (criando se preciso) o hub de eventos de `db_path`."""
+    with _hubs_lock:
+        hub = _hubs.get(db_path)
+        if hub is None:
+            hub = _hubs[db_path] = EventHub(db_path)
+        return hub
+
+
+def notify(db_path: str) -> None:
+    """Avisa o hub local (se houver) que há eventos novos em `db_path`."""
+    hub = _hubs.get(db_path)
+    if hub is not None:
+        hub.notify()
@@ -0,0 +1,141 @@
+"""Driver de carga HTTP concorrente para uma instância local do `web_app.py`.
+
+Dispara requisições contra `/`, `/view/<id>`, `/export/<id>` e `/collect`
+a partir de várias threads e reporta vazão e latências p50/p95/p99 por
+rota, para dimensionar workers do gunicorn.
+"""
+
+import argparse
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Peso padrão de cada rota na mistura de requisições
+DEFAULT_MIX = "index:4,view:4,export:1,collect:1"
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Retorna o percentil `pct` (0-100) de uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def parse_mix(spec: str) -> tuple[list[str], list[int]]:
+    """Converte "index:4,view:1" em (rotas, pesos)."""
+    routes, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name:
+            routes.append(name)
+            weights.append(int(weight or 1))
+    return routes, weights
+
+
+def build_request(base: str, route: str, max_id: int, collect_url: str, rng: random.Random) -> urllib.request.Request:
+    """Monta a requisição para a rota sorteada."""
+    if route == "index":
+        return urllib.request.Request(f"{base}/")
+    if route == "view":
+        return urllib.request.Request(f"{base}/view/{rng.randint(1, max_id)}")
+    if route == "export":
+        return urllib.request.Request(f"{base}/export/{rng.randint(1, max_id)}")
+    if route == "collect":
+        data = urllib.parse.urlencode({"url": collect_url}).encode()
+        return urllib.request.Request(f"{base}/collect", data=data, method="POST")
+    raise ValueError(f"Rota desconhecida: {route}")
+
+
+def run_load(base: str, requests_total: int, concurrency: int, mix: str = DEFAULT_MIX,
+             max_id: int = 1000, collect_url: str = "http://127.0.0.1:9/", timeout: float = 30,
+             seed: int | None = None) -> dict:
+    """Executa a carga e retorna estatísticas por rota.
+
+    O resultado tem a forma `{"elapsed": s, "routes": {rota: {...}}}`, onde
+    cada rota traz contagem, erros, vazão e latências em milissegundos.
+    """
+    routes, weights = parse_mix(mix)
+    rng = random.Random(seed)
+    plan = rng.choices(routes, weights, k=requests_total)
+    latencies = {r: [] for r in routes}
+    errors = {r: 0 for r in routes}
+    lock = threading.Lock()
+
+    def worker(route: str, req_seed: int) -> None:
+        req = build_request(base, route, max_id, collect_url, random.Random(req_seed))
+        start = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            # 404 em ids inexistentes ainda é uma resposta servida
+            e.read()
+            ok = e.code < 500
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[route].append(elapsed)
+            if not ok:
+                errors[route] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for route in plan:
+            pool.submit(worker, route, rng.random())
+    total_elapsed = time.perf_counter() - start
+
+    report = {"elapsed": total_elapsed, "routes": {}}
+    for route in routes:
+        values = sorted(latencies[route])
+        report["routes"][route] = {
+            "count": len(values),
+            "errors": errors[route],
+            "rps": len(values) / total_elapsed if total_elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    """Imprime o relatório em formato de tabela."""
+    total = sum(r["count"] for r in report["routes"].values())
+    print(f"Total: {total} requests in {report['elapsed']:.2f}s ({total / max(report['elapsed'], 1e-9):.1f} req/s)\n")
+    print(f"{'route':8} | {'count':>7} | {'errors':>6} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for route, s in report["routes"].items():
+        print(f"{route:8} | {s['count']:7d} | {s['errors']:6d} | {s['rps']:8.1f} | "
+              f"{s['p50_ms']:8.1f} | {s['p95_ms']:8.1f} | {s['p99_ms']:8.1f}")
+
+
+def main():
+    """Entrada principal: executa a carga conforme os argumentos."""
+    p = argparse.ArgumentParser(description="Concurrent HTTP load driver for web_app")
+    p.add_argument("--base", default="http://127.0.0.1:8080", help="Base URL of the running web_app")
+    p.add_argument("--requests", type=int, default=1000, help="Total requests to send")
+    p.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    p.add_argument("--mix", default=DEFAULT_MIX, help='Weighted routes, e.g. "index:4,view:4,export:1,collect:1"')
+    p.add_argument("--max-id", type=int, default=1000, help="Highest record id for /view and /export")
+    p.add_argument("--collect-url", default="http://127.0.0.1:9/", help="Target URL posted to /collect")
+    p.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    p.add_argument("--seed", type=int, help="Random seed for a reproducible request plan")
+    args = p.parse_args()
+
+    report = run_load(
+        args.base.rstrip("/"), args.requests, args.concurrency, mix=args.mix,
+        max_id=args.max_id, collect_url=args.collect_url, timeout=args.timeout, seed=args.seed,
+    )
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
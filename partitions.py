@@ -0,0 +1,270 @@
+"""Armazenamento particionado por tempo (um arquivo SQLite por dia ou mês).
+
+Com `PARTITION_MODE=day` ou `PARTITION_MODE=month`, novas linhas vão para
+`partitions/responses_<período>.db`, ao lado do banco principal. O banco
+principal continua guardando a fila de jobs e as linhas antigas (anteriores
+ao particionamento).
+
+Os ids continuam globais: cada partição começa sua sequência em
+`chave * ID_STRIDE`, então o id de um registro indica em qual arquivo ele
+está e as consultas existentes (`WHERE id = ?`, `ORDER BY id`) funcionam sem
+tradução. Para ler, as partições relevantes são anexadas (ATTACH) à conexão
+e uma view temporária `responses` une todas com UNION ALL, escondendo a
+tabela do banco principal. Remover dados antigos é apagar um arquivo.
+"""
+
+import argparse
+import datetime
+import glob
+import os
+import re
+import sqlite3
+
+import body_store
+import json_codec
+import live_events
+
+# Modo vindo do ambiente: "" (desligado), "day" ou "month"
+PARTITION_MODE = os.environ.get("PARTITION_MODE", "")
+
+# Distância entre os ids de partições consecutivas
+ID_STRIDE = 10**9
+
+# Partições anexadas por vez (o SQLite permite 10 bancos anexados por padrão)
+ATTACH_LIMIT = 8
+
+# Marcador do banco principal dentro de um grupo de partições: ele guarda as
+# linhas anteriores ao particionamento e é tratado como a partição mais antiga
+MAIN = "main"
+
+# Colunas unidas na view federada, na ordem da tabela `responses`
+RESPONSE_COLUMNS = ("id", "url", "status", "timestamp", "body", "json", "body_segment", "body_offset", "body_length",
+                    "elapsed_ms", "content_type", "charset", "json_segment", "json_offset", "json_length")
+
+_EPOCH = datetime.date(1970, 1, 1)
+_LABEL_RE = re.compile(r"responses_(\d{4}-\d{2}(?:-\d{2})?)\.db$")
+
+
+def partition_dir(base_db: str) -> str:
+    """Diretório das partições de um banco principal."""
+    return os.path.join(os.path.dirname(os.path.abspath(base_db)), "partitions")
+
+
+def partition_key(ts: datetime.datetime, mode: str) -> int:
+    """Número da partição que contém o instante `ts`."""
+    if mode == "day":
+        return (ts.date() - _EPOCH).days
+    if mode == "month":
+        return ts.year * 12 + ts.month - 1
+    raise ValueError(f"Modo de partição inválido: {mode!r}")
+
+
+def partition_bounds(key: int, mode: str) -> tuple[str, str]:
+    """Intervalo [início, fim) de timestamps ISO coberto pela partição."""
+    if mode == "day":
+        start = _EPOCH + datetime.timedelta(days=key)
+        end = start + datetime.timedelta(days=1)
+    else:
+        start = datetime.date(key // 12, key % 12 + 1, 1)
+        end = datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def _label(key: int, mode: str) -> str:
+    start, _ = partition_bounds(key, mode)
+    return start if mode == "day" else start[:7]
+
+
+def _key_from_label(label: str, mode: str) -> int | None:
+    try:
+        if mode == "day" and len(label) == 10:
+            return partition_key(datetime.datetime.fromisoformat(label), mode)
+        if mode == "month" and len(label) == 7:
+            return partition_key(datetime.datetime.fromisoformat(label + "-01"), mode)
+    except ValueError:
+        pass
+    return None
+
+
+def partition_path(base_db: str, key: int, mode: str) -> str:
+    return os.path.join(partition_dir(base_db), f"responses_{_label(key, mode)}.db")
+
+
+def list_partitions(base_db: str, mode: str) -> list[tuple[int, str]]:
+    """Lista (chave, caminho) das partições existentes, da mais antiga à mais nova."""
+    found = []
+    for path in glob.glob(os.path.join(partition_dir(base_db), "responses_*.db")):
+        match = _LABEL_RE.search(os.path.basename(path))
+        key = _key_from_label(match.group(1), mode) if match else None
+        if key is not None:
+            found.append((key, path))
+    return sorted(found)
+
+
+def ensure_partition(base_db: str, key: int, mode: str) -> str:
+    """Cria a partição se preciso, com a sequência de ids começando em `key * ID_STRIDE`."""
+    path = partition_path(base_db, key, mode)
+    if not os.path.exists(path):
+        # Import tardio: colet_json_noautentic também importa este módulo
+        from colet_json_noautentic import init_sqlite
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        init_sqlite(path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT 'responses', ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'responses')",
+                (key * ID_STRIDE,),
+            )
+        conn.close()
+    return path
+
+
+def save_response(base_db: str, mode: str, url: str, status: int, timestamp: str,
+                  body: str | bytes, json_text: str | None, elapsed_ms: float | None = None,
+                  content_type: str | None = None, charset: str | None = None) -> int:
+    """Insere uma resposta na partição do seu timestamp e retorna o id global."""
+    key = partition_key(datetime.datetime.fromisoformat(timestamp), mode)
+    path = ensure_partition(base_db, key, mode)
+    # Os segmentos de corpo ficam ao lado do banco principal, não da partição
+    body, segment, offset, length = body_store.prepare_body(base_db, body)
+    json_text, json_segment, json_offset, json_length = body_store.prepare_json(base_db, json_text)
+    conn = sqlite3.connect(path)
+    cur = conn.execute(
+        "INSERT INTO responses (url, status, timestamp, body, json, body_segment, body_offset, body_length, elapsed_ms, "
+        "content_type, charset, json_segment, json_offset, json_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (url, status, timestamp, body, json_text, segment, offset, length, elapsed_ms, content_type, charset,
+         json_segment, json_offset, json_length),
+    )
+    conn.commit()
+    record_id = cur.lastrowid
+    conn.close()
+    # O feed de eventos fica no banco principal, que todos os leitores acompanham
+    conn = sqlite3.connect(base_db)
+    with conn:
+        live_events.publish(conn, live_events.INSERTED, [(record_id, url, status, timestamp)])
+    conn.close()
+    live_events.notify(base_db)
+    return record_id
+
+
+def partition_groups(base_db: str, mode: str, since: str = None, until: str = None,
+                     ids=None, newest_first: bool = False) -> list[list[str]]:
+    """Agrupa as partições relevantes em lotes anexáveis de uma vez.
+
+    Descarta partições fora de [since, until) e, se `ids` for informado,
+    as que não podem conter nenhum daqueles ids. O banco principal entra
+    como `MAIN` (a partição mais antiga), a menos que os ids o excluam.
+    Sempre retorna ao menos um grupo, possivelmente vazio.
+    """
+    selected = []
+    id_keys = {int(i) // ID_STRIDE for i in ids} if ids is not None else None
+    if id_keys is None or 0 in id_keys:
+        selected.append(MAIN)
+    for key, path in list_partitions(base_db, mode):
+        start, end = partition_bounds(key, mode)
+        if since and end <= since:
+            continue
+        if until and start >= until:
+            continue
+        if id_keys is not None and key not in id_keys:
+            continue
+        selected.append(path)
+    if newest_first:
+        selected.reverse()
+    groups = [selected[i:i + ATTACH_LIMIT] for i in range(0, len(selected), ATTACH_LIMIT)]
+    return groups or [[]]
+
+
+def _attached_partitions(conn) -> list[str]:
+    return [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("part_")]
+
+
+def _select_list(conn, schema: str) -> str:
+    # Partições criadas antes de uma coluna nova entram na view com NULL nela
+    existing = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(responses)")}
+    return ", ".join(c if c in existing else f"NULL AS {c}" for c in RESPONSE_COLUMNS)
+
+
+def scope(conn, paths: list[str]) -> None:
+    """Faz `responses` da conexão enxergar apenas as partições de `paths`.
+
+    Desanexa as partições do escopo anterior, anexa as novas e recria a view
+    temporária federada. A view é só leitura; para apagar use `delete_ids`.
+    A view `response_rollups` é recriada do mesmo jeito, a partir das
+    partições que já têm a tabela de rollups.
+    """
+    conn.execute("DROP VIEW IF EXISTS temp.responses")
+    conn.execute("DROP VIEW IF EXISTS temp.response_rollups")
+    for name in _attached_partitions(conn):
+        conn.execute(f"DETACH DATABASE {name}")
+    schemas = []
+    for i, path in enumerate(paths):
+        if path == MAIN:
+            schemas.append("main")
+            continue
+        conn.execute(f"ATTACH DATABASE ? AS part_{i}", (path,))
+        schemas.append(f"part_{i}")
+    cols = ", ".join(RESPONSE_COLUMNS)
+    union = " UNION ALL ".join(f"SELECT {_select_list(conn, s)} FROM {s}.responses" for s in schemas)
+    if not schemas:
+        # Nenhuma partição relevante: view vazia com as mesmas colunas
+        union = f"SELECT {cols} FROM main.responses WHERE 0"
+    conn.execute(f"CREATE TEMP VIEW responses AS {union}")
+
+    rollup_schemas = [
+        s for s in schemas
+        if conn.execute(f"SELECT 1 FROM {s}.sqlite_master WHERE type = 'table' AND name = 'response_rollups'").fetchone()
+    ]
+    union = " UNION ALL ".join(f"SELECT * FROM {s}.response_rollups" for s in rollup_schemas)
+    if not rollup_schemas:
+        union = "SELECT * FROM main.response_rollups WHERE 0"
+    conn.execute(f"CREATE TEMP VIEW response_rollups AS {union}")
+
+
+def delete_ids(conn, ids: list[int]) -> None:
+    """Apaga os ids do banco principal e de todas as partições anexadas.
+
+    Os ids são globais, então cada um existe em no máximo um dos arquivos.
+    O commit fica a cargo de quem chama.
+    """
+    id_list = json_codec.dumps(list(ids))
+    for schema in ["main"] + _attached_partitions(conn):
+        conn.execute(f"DELETE FROM {schema}.responses WHERE id IN (SELECT value FROM json_each(?))", (id_list,))
+
+
+def drop_partitions_older_than(base_db: str, mode: str, cutoff: datetime.datetime) -> list[str]:
+    """Apaga os arquivos de partição inteiramente anteriores a `cutoff`."""
+    removed = []
+    limit = cutoff.isoformat()
+    for key, path in list_partitions(base_db, mode):
+        _, end = partition_bounds(key, mode)
+        if end <= limit:
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            removed.append(path)
+    return removed
+
+
+def main():
+    """Entrada principal: lista partições ou aplica retenção."""
+    p = argparse.ArgumentParser(description="Manage time-partitioned responses storage")
+    p.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "responses.db"), help="Path to the main responses.db")
+    p.add_argument("--mode", default=PARTITION_MODE or "month", choices=["day", "month"], help="Partition granularity")
+    p.add_argument("--drop-older-than", type=float, metavar="DAYS", help="Delete partitions entirely older than N days")
+    args = p.parse_args()
+
+    if args.drop_older_than is not None:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=args.drop_older_than)
+        for path in drop_partitions_older_than(args.db, args.mode, cutoff):
+            print(f"Removed {path}")
+
+    for key, path in list_partitions(args.db, args.mode):
+        start, end = partition_bounds(key, args.mode)
+        print(f"{start} .. {end} | {os.path.getsize(path):>12d} bytes | {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Instrumentação opcional de requests: tempos por fase, consultas lentas e cProfile.
+
+- `ProfiledConnection` é uma conexão SQLite que mede o tempo de cada
+  consulta (execute + fetch) e soma no total do request. Um trace callback
+  guarda o SQL expandido (com os valores) do último statement; consultas
+  acima do limite são registradas com o `EXPLAIN QUERY PLAN`, no logger
+  `colet.slow_queries` e em `SlowQueryLog` (as mais recentes, em memória).
+- `server_timing` monta o header `Server-Timing` a partir das fases
+  medidas (`db`, `json`, `render`, `total`), que o DevTools do navegador
+  mostra na aba de rede.
+- `start_profile` / `dump_profile` envolvem um único request com cProfile
+  e gravam o `.pstats` para análise com `python -m pstats`.
+
+Tudo fica desligado por padrão; sem instrumentação a conexão é a comum.
+"""
+
+import collections
+import cProfile
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("colet.slow_queries")
+
+# Consultas lentas mantidas em memória para o /admin/slow-queries
+SLOW_QUERY_HISTORY = 100
+
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class SlowQueryLog:
+    """As consultas lentas mais recentes deste processo."""
+
+    def __init__(self, size: int = SLOW_QUERY_HISTORY):
+        self._entries = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, entry: dict) -> None:
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning("consulta lenta (%.1f ms): %s | plano: %s", entry["ms"], entry["sql"], " / ".join(entry["plan"]))
+
+    def entries(self) -> list[dict]:
+        """Do mais recente para o mais antigo."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SLOW_QUERIES = SlowQueryLog()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor que soma no `ProfiledConnection` o tempo gasto em execute e fetch."""
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self._profile = conn
+        self._sql = None
+        self._params = ()
+        self._elapsed = 0.0
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._sql, self._params = sql, parameters
+        self._profile.queries += 1
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._sql, self._params = sql, None
+        self._profile.queries += 1
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self) -> None:
+        """Fecha a medição do statement atual (exaurido, substituído ou no fim do request)."""
+        if self._sql is None:
+            return
+        self._profile.record(self._sql, self._params, self._elapsed)
+        self._sql = None
+        self._elapsed = 0.0
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Conexão que mede as consultas de um request (use com `sqlite3.connect(factory=...)`).
+
+    `slow_ms` é o limite do log de consultas lentas (0 desliga o log, mas
+    os tempos continuam somados para o Server-Timing).
+    """
+
+    slow_ms = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seconds = 0.0
+        self.queries = 0
+        self.last_traced = None
+        self._cursors = []
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, statement: str) -> None:
+        # Chamado pelo SQLite no início de cada statement, com os valores já expandidos
+        self.last_traced = statement
+
+    def cursor(self, factory=ProfiledCursor):
+        cur = super().cursor(factory)
+        if isinstance(cur, ProfiledCursor):
+            self._cursors.append(cur)
+        return cur
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def record(self, sql: str, params, seconds: float) -> None:
+        self.seconds += seconds
+        if self.slow_ms <= 0 or seconds * 1000 < self.slow_ms:
+            return
+        SLOW_QUERIES.add({
+            "ms": round(seconds * 1000, 3),
+            "sql": " ".join(sql.split()),
+            "expanded": self.last_traced,
+            "plan": self.explain(sql, params),
+            "at": datetime.datetime.utcnow().isoformat(),
+        })
+
+    def explain(self, sql: str, params) -> list[str]:
+        """Linhas `detail` do `EXPLAIN QUERY PLAN` de `sql` (sem executá-lo)."""
+        if params is None:
+            return ["(executemany)"]
+        try:
+            # Cursor comum: o EXPLAIN não entra nas medições nem no trace
+            self.set_trace_callback(None)
+            rows = sqlite3.Cursor(self).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as exc:
+            return [f"(sem plano: {exc})"]
+        finally:
+            self.set_trace_callback(self._trace)
+        return [row[3] for row in rows]
+
+    def finish(self) -> None:
+        """Fecha as medições pendentes (cursores não exauridos)."""
+        for cur in self._cursors:
+            cur._finish()
+        self._cursors = []
+
+
+def server_timing(phases: dict) -> str:
+    """Valor do header `Server-Timing` para {fase: (segundos, descrição ou None)}."""
+    parts = []
+    for name, (seconds, desc) in phases.items():
+        part = f"{name};dur={seconds * 1000:.2f}"
+        if desc:
+            part += f';desc="{desc}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def start_profile() -> cProfile.Profile:
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def dump_profile(profile: cProfile.Profile, directory: str, label: str) -> str:
+    """Para o profiler e grava `<data>-<label>.pstats` em `directory`; retorna o nome do arquivo."""
+    profile.disable()
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}-{_SAFE_NAME_RE.sub('_', label)[:80]}.pstats"
+    profile.dump_stats(os.path.join(directory, name))
+    return name
@@ -0,0 +1,261 @@
+"""Tabelas de rollup por URL, status e intervalo de tempo.
+
+Cada insert em `responses` dispara um trigger que soma a linha em
+`response_rollups`, uma vez para cada granularidade (minuto, hora e dia),
+na mesma transação do insert. O `/stats` e o `/api/stats` leem só essas
+tabelas, então o custo de uma consulta depende do intervalo pedido e do
+número de URLs, não do tamanho de `responses`.
+
+Os rollups contam as coletas: apagar registros não os altera. Cargas
+feitas sem o trigger (ver `suspended`) somam no final só as linhas novas
+(`add_rows`), preservando a contagem das já apagadas. Para reconciliar com
+as linhas existentes (descartando o histórico das apagadas), use `rebuild`
+(`python rollups.py --rebuild`).
+"""
+
+import argparse
+import contextlib
+import datetime
+import os
+import sqlite3
+
+import partitions
+
+# Granularidade -> tamanho do prefixo do timestamp ISO que identifica o bucket
+GRANULARITIES = {"minute": 16, "hour": 13, "day": 10}
+
+# Status considerados erro (0 representa resposta sem status)
+ERROR_CONDITION = "(status >= 400 OR status = 0)"
+
+TRIGGER_NAME = "responses_rollup_insert"
+
+_BODY_BYTES = "COALESCE({p}body_length, length(CAST({p}body AS BLOB)), 0)"
+
+
+def _trigger_sql() -> str:
+    upserts = "".join(
+        f"""
+            INSERT INTO response_rollups
+                (granularity, bucket, url, status, count, body_bytes, elapsed_ms_sum, elapsed_count)
+            VALUES ('{name}', substr(NEW.timestamp, 1, {size}), NEW.url, COALESCE(NEW.status, 0), 1,
+                    {_BODY_BYTES.format(p="NEW.")}, COALESCE(NEW.elapsed_ms, 0), NEW.elapsed_ms IS NOT NULL)
+            ON CONFLICT (granularity, bucket, url, status) DO UPDATE SET
+                count = count + 1,
+                body_bytes = body_bytes + excluded.body_bytes,
+                elapsed_ms_sum = elapsed_ms_sum + excluded.elapsed_ms_sum,
+                elapsed_count = elapsed_count + excluded.elapsed_count;"""
+        for name, size in GRANULARITIES.items()
+    )
+    return f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_NAME} AFTER INSERT ON responses BEGIN{upserts}\n        END"
+
+
+def init_rollups(cur) -> None:
+    """Cria a tabela de rollups e o trigger de insert (cursor ou conexão)."""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS response_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            body_bytes INTEGER NOT NULL DEFAULT 0,
+            elapsed_ms_sum REAL NOT NULL DEFAULT 0,
+            elapsed_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket, url, status)
+        ) WITHOUT ROWID;
+        """
+    )
+    cur.execute(_trigger_sql())
+
+
+def rebuild(conn) -> None:
+    """Recalcula todos os rollups a partir das linhas atuais de `responses`."""
+    with conn:
+        conn.execute("DELETE FROM main.response_rollups")
+        for name, size in GRANULARITIES.items():
+            conn.execute(
+                f"""
+                INSERT INTO main.response_rollups
+                    (granularity, bucket, url, status, count, body_bytes, elapsed_ms_sum, elapsed_count)
+                SELECT ?, substr(timestamp, 1, {size}), url, COALESCE(status, 0), COUNT(*),
+                       SUM({_BODY_BYTES.format(p="")}), SUM(COALESCE(elapsed_ms, 0)), COUNT(elapsed_ms)
+                FROM main.responses
+                GROUP BY 2, 3, 4
+                """,
+                (name,),
+            )
+
+
+def last_id(conn, schema: str = "main") -> int:
+    """Maior id de `responses` em `schema` (0 se vazia): marca o início de uma carga."""
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.responses").fetchone()[0]
+
+
+def add_rows(conn, after_id: int) -> None:
+    """Soma aos rollups as linhas de `responses` com id maior que `after_id`.
+
+    Usado depois de cargas sem o trigger: as linhas novas entram como o
+    trigger as teria somado, sem recalcular (e sem perder) o histórico.
+    """
+    with conn:
+        for name, size in GRANULARITIES.items():
+            conn.execute(
+                f"""
+                INSERT INTO main.response_rollups
+                    (granularity, bucket, url, status, count, body_bytes, elapsed_ms_sum, elapsed_count)
+                SELECT ?, substr(timestamp, 1, {size}), url, COALESCE(status, 0), COUNT(*),
+                       SUM({_BODY_BYTES.format(p="")}), SUM(COALESCE(elapsed_ms, 0)), COUNT(elapsed_ms)
+                FROM main.responses
+                WHERE id > ?
+                GROUP BY 2, 3, 4
+                ON CONFLICT (granularity, bucket, url, status) DO UPDATE SET
+                    count = count + excluded.count,
+                    body_bytes = body_bytes + excluded.body_bytes,
+                    elapsed_ms_sum = elapsed_ms_sum + excluded.elapsed_ms_sum,
+                    elapsed_count = elapsed_count + excluded.elapsed_count
+                """,
+                (name, after_id),
+            )
+
+
+@contextlib.contextmanager
+def suspended(conn):
+    """Desliga o trigger durante uma carga em massa e soma as linhas novas no final.
+
+    Um único `GROUP BY` no final sai bem mais barato que três upserts por
+    linha inserida.
+    """
+    after_id = last_id(conn)
+    conn.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME}")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        init_rollups(conn)
+        conn.commit()
+        add_rows(conn, after_id)
+
+
+def prune(conn, granularity: str, older_than: datetime.datetime) -> int:
+    """Apaga os buckets de `granularity` anteriores a `older_than`; retorna quantos."""
+    bucket = older_than.isoformat()[:GRANULARITIES[granularity]]
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM main.response_rollups WHERE granularity = ? AND bucket < ?", (granularity, bucket)
+        )
+    return cur.rowcount
+
+
+def bucket_bounds(granularity: str, since: datetime.datetime, until: datetime.datetime = None) -> tuple:
+    """Converte instantes nos buckets [since, until) da granularidade."""
+    size = GRANULARITIES[granularity]
+    return since.isoformat()[:size], until.isoformat()[:size] if until else None
+
+
+def _merge(target: dict, key, values) -> None:
+    current = target.get(key)
+    target[key] = values if current is None else [a + b for a, b in zip(current, values)]
+
+
+def _metrics(sums) -> dict:
+    count, errors, body_bytes, elapsed_sum, elapsed_count = sums
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "avg_body_bytes": round(body_bytes / count) if count else 0,
+        "avg_elapsed_ms": round(elapsed_sum / elapsed_count, 1) if elapsed_count else None,
+    }
+
+
+def stats(connections, granularity: str, since: str, until: str = None, url: str = None, top: int = 20) -> dict:
+    """Agrega os rollups do intervalo de buckets [since, until).
+
+    `connections` é um iterável de conexões cujo `response_rollups` já
+    aponta para os dados certos (o banco, ou cada grupo de partições); os
+    totais de cada uma são somados. Retorna a série por bucket, as `top`
+    URLs com mais coletas e a distribuição por status.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidade inválida: {granularity!r}")
+    where = "granularity = ? AND bucket >= ?"
+    values = [granularity, since]
+    if until:
+        where += " AND bucket < ?"
+        values.append(until)
+    if url:
+        where += " AND url = ?"
+        values.append(url)
+    sums = (
+        f"SUM(count), SUM(CASE WHEN {ERROR_CONDITION} THEN count ELSE 0 END), "
+        "SUM(body_bytes), SUM(elapsed_ms_sum), SUM(elapsed_count)"
+    )
+
+    series, urls, statuses = {}, {}, {}
+    for conn in connections:
+        for row in conn.execute(f"SELECT bucket, {sums} FROM response_rollups WHERE {where} GROUP BY bucket", values):
+            _merge(series, row[0], list(row[1:]))
+        for row in conn.execute(f"SELECT url, {sums} FROM response_rollups WHERE {where} GROUP BY url", values):
+            _merge(urls, row[0], list(row[1:]))
+        for row in conn.execute(f"SELECT status, SUM(count) FROM response_rollups WHERE {where} GROUP BY status", values):
+            _merge(statuses, row[0], [row[1]])
+
+    totals = [0, 0, 0, 0, 0]
+    for bucket_sums in series.values():
+        totals = [a + b for a, b in zip(totals, bucket_sums)]
+    top_urls = sorted(urls.items(), key=lambda item: (-item[1][0], item[0]))[:top]
+    return {
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "totals": _metrics(totals),
+        "series": [{"bucket": key, **_metrics(series[key])} for key in sorted(series)],
+        "urls": [{"url": key, **_metrics(value)} for key, value in top_urls],
+        "statuses": [{"status": key, "count": statuses[key][0]} for key in sorted(statuses)],
+    }
+
+
+def _database_files(db_path: str) -> list[str]:
+    files = [db_path]
+    if partitions.PARTITION_MODE:
+        files += [path for _, path in partitions.list_partitions(db_path, partitions.PARTITION_MODE)]
+    return files
+
+
+def main():
+    """Entrada principal: reconstrói, poda ou mostra os rollups de um banco."""
+    p = argparse.ArgumentParser(description="Maintain and query the response rollup tables")
+    p.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "responses.db"), help="Path to responses.db")
+    p.add_argument("--rebuild", action="store_true", help="Recompute rollups from the current responses rows")
+    p.add_argument("--prune-minutes-older-than", type=float, metavar="DAYS",
+                   help="Delete minute buckets older than N days")
+    p.add_argument("--granularity", default="hour", choices=list(GRANULARITIES), help="Granularity to show")
+    p.add_argument("--hours", type=float, default=24, help="Window to show, in hours")
+    args = p.parse_args()
+
+    files = _database_files(args.db)
+    for path in files:
+        conn = sqlite3.connect(path)
+        init_rollups(conn)
+        conn.commit()
+        if args.rebuild:
+            rebuild(conn)
+        if args.prune_minutes_older_than is not None:
+            cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=args.prune_minutes_older_than)
+            print(f"{path}: pruned {prune(conn, 'minute', cutoff)} minute buckets")
+        conn.close()
+
+    since, _ = bucket_bounds(args.granularity, datetime.datetime.utcnow() - datetime.timedelta(hours=args.hours))
+    connections = [sqlite3.connect(path) for path in files]
+    result = stats(connections, args.granularity, since)
+    for conn in connections:
+        conn.close()
+    totals = result["totals"]
+    print(f"Since {since}: {totals['count']} responses, error rate {totals['error_rate']:.2%}")
+    for entry in result["urls"]:
+        print(f"{entry['count']:>8d} | {entry['error_rate']:>7.2%} | {entry['url']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,3 +56,12 @@ def temp_in_memory_db():
     conn.commit()
     yield conn
     conn.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_fetch_policy():
+    """Zera o estado por host das políticas de fetch entre os testes."""
+    from fetch_policy import DEFAULT_POLICY
+    DEFAULT_POLICY.reset()
+    yield
+    DEFAULT_POLICY.reset()
@@ -0,0 +1,175 @@
+"""Testes para o store de corpos em segmentos append-only (body_store)."""
+
+import csv
+import os
+import sqlite3
+
+import pytest
+import body_store
+from colet_json_noautentic import init_sqlite
+
+
+@pytest.fixture
+def base_db(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    init_sqlite(db_path)
+    return db_path
+
+
+@pytest.fixture
+def store_on(monkeypatch):
+    monkeypatch.setattr(body_store, "BODY_STORE", True)
+    monkeypatch.setattr(body_store, "_stores", {})
+
+
+def test_append_and_view_without_copy(base_db):
+    """Testa que o append devolve a localização e o view lê os mesmos bytes."""
+    store = body_store.SegmentStore(base_db)
+    a = store.append(b"primeiro")
+    b = store.append("segundo ção".encode("utf-8"))
+
+    assert a == (1, 0, 8)
+    assert b[:2] == (1, 8)
+    view = store.view(*b)
+    assert isinstance(view, memoryview)
+    assert bytes(view).decode("utf-8") == "segundo ção"
+    assert bytes(store.view(*a)) == b"primeiro"
+
+
+def test_append_rotates_segments(base_db):
+    """Testa que um novo segmento é aberto quando o atual passa do limite."""
+    store = body_store.SegmentStore(base_db, segment_size=10)
+    first = store.append(b"123456")
+    second = store.append(b"789012")
+    big = store.append(b"x" * 50)
+
+    assert (first[0], second[0], big[0]) == (1, 2, 3)
+    assert sorted(os.listdir(body_store.store_dir(base_db))) == ["seg_000001.dat", "seg_000002.dat", "seg_000003.dat"]
+
+
+def test_prepare_body_keeps_inline_when_disabled(base_db):
+    """Testa que, com o store desligado, o corpo continua na coluna body."""
+    assert body_store.prepare_body(base_db, "abc") == ("abc", None, None, None)
+
+
+def test_deleted_bytes_are_compacted(base_db, store_on, monkeypatch):
+    """Testa que apagar registros acumula bytes mortos e a compactação os descarta."""
+    import web_app
+
+    monkeypatch.setattr(body_store, "SEGMENT_SIZE", 40)
+    ids = [web_app.save_response_sqlite("http://example.com", 200, f"corpo {i:02d} " + "." * 8, db_path=base_db) for i in range(4)]
+
+    conn = sqlite3.connect(base_db)
+    assert conn.execute("SELECT COUNT(*) FROM responses WHERE body IS NULL").fetchone()[0] == 4
+    with conn:
+        body_store.record_deleted(conn, ids[:1])
+        conn.execute("DELETE FROM responses WHERE id = ?", (ids[0],))
+    conn.close()
+
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["DATABASE"] = base_db
+    with web_app.app.test_client() as client:
+        etag = client.get(f"/raw/{ids[1]}").headers["ETag"]
+        assert body_store.compact(base_db) == [1]
+        # A compactação muda a localização do corpo, mas não o ETag
+        assert client.get(f"/raw/{ids[1]}").headers["ETag"] == etag
+    # O arquivo aposentado fica para leitores que ainda tenham a localização antiga
+    assert os.path.exists(body_store.get_store(base_db).segment_path(1))
+    monkeypatch.setattr(body_store, "RETIRE_SECONDS", 0)
+    assert body_store.compact(base_db) == []
+    assert not os.path.exists(body_store.get_store(base_db).segment_path(1))
+
+    conn = sqlite3.connect(base_db)
+    conn.row_factory = sqlite3.Row
+    store = body_store.get_store(base_db)
+    bodies = [
+        bytes(store.view(r["body_segment"], r["body_offset"], r["body_length"])).decode("utf-8")
+        for r in conn.execute("SELECT * FROM responses ORDER BY id")
+    ]
+    conn.close()
+    assert bodies == [f"corpo {i:02d} ........" for i in range(1, 4)]
+
+
+def test_view_and_export_read_bodies_from_segments(base_db, store_on, tmp_path):
+    """Testa que /view e /export leem o corpo do store de segmentos."""
+    import web_app
+
+    body = "<p>início</p>" + "x" * 200_000
+    record_id = web_app.save_response_sqlite("http://example.com", 200, body, db_path=base_db)
+
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["DATABASE"] = base_db
+    with web_app.app.test_client() as client:
+        view = client.get(f"/view/{record_id}")
+        export = client.get(f"/export/{record_id}")
+
+    assert view.status_code == 200
+    assert "&lt;p&gt;início&lt;/p&gt;".encode("utf-8") in view.data
+    assert export.status_code == 200
+    assert export.headers["ETag"]
+    assert export.data.decode("utf-8").count("x") >= 200_000
+
+
+def test_raw_streams_binary_bodies_from_segments(base_db, store_on):
+    """Testa que o /raw devolve intactos os bytes de um corpo binário do store."""
+    import web_app
+
+    payload = bytes(range(256)) * 1000
+    record_id = web_app.save_response_sqlite("http://example.com/blob", 200, payload, db_path=base_db,
+                                             content_type="application/octet-stream")
+
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["DATABASE"] = base_db
+    with web_app.app.test_client() as client:
+        raw = client.get(f"/raw/{record_id}")
+        export = client.get(f"/export/{record_id}")
+
+    assert raw.data == payload
+    assert raw.headers["Content-Length"] == str(len(payload))
+    assert "conteúdo binário application/octet-stream, 256000 bytes" in export.data.decode("utf-8")
+
+
+def test_json_copy_goes_to_segments(base_db, store_on, tmp_path, monkeypatch, capsys):
+    """Testa que a cópia do JSON sai da linha e é lida do store pelo web app e pelo view_responses."""
+    import sys
+    import web_app
+    import view_responses
+
+    record_id = web_app.save_response_sqlite("http://example.com/api", 200, b'{"n": [1, 2]}', db_path=base_db,
+                                             json_text='{"n": [1, 2]}', content_type="application/json")
+    conn = sqlite3.connect(base_db)
+    assert conn.execute("SELECT body, json, json_length FROM responses").fetchone() == (None, None, 13)
+    conn.close()
+
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["DATABASE"] = base_db
+    with web_app.app.test_client() as client:
+        view = client.get(f"/view/{record_id}")
+        api = client.get("/api/responses?fields=id,json")
+    assert "&#34;n&#34;: [" in view.data.decode("utf-8")
+    assert api.get_json()["items"] == [{"id": record_id, "json": {"n": [1, 2]}}]
+
+    csv_path = str(tmp_path / "out.csv")
+    monkeypatch.setattr(sys, "argv", ["view_responses.py", "--db", base_db, "--export", csv_path])
+    view_responses.main()
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        exported = list(csv.DictReader(f))
+    assert (exported[0]["body"], exported[0]["json"]) == ('{"n": [1, 2]}', '{"n": [1, 2]}')
+    assert "JSON keys: ['n']" in capsys.readouterr().out
+
+
+def test_compaction_is_exclusive_across_processes(base_db, store_on):
+    """Testa que, com o lock de arquivo tomado, uma compactação não bloqueante não roda."""
+    store = body_store.get_store(base_db)
+    for data in (b"a" * 10, b"b" * 10):
+        store.append(data)
+    store.segment_size = 10
+    store.append(b"c")
+
+    held = body_store._CompactionLock(base_db)
+    assert held.acquire()
+    try:
+        assert body_store.compact(base_db, ratio=0, blocking=False) == []
+    finally:
+        held.release()
+    assert body_store.compact(base_db, ratio=0, blocking=False) == [1]
@@ -0,0 +1,287 @@
+"""Testes para a importação em massa de HAR e NDJSON (bulk_import)."""
+
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+import bulk_import
+import partitions
+from colet_json_noautentic import init_sqlite
+
+
+@pytest.fixture
+def base_db(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    init_sqlite(db_path)
+    return db_path
+
+
+def _write_ndjson(path, count, bad_every=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            if bad_every and i % bad_every == bad_every - 1:
+                f.write("{isto não é json\n")
+                continue
+            f.write(json.dumps({
+                "url": f"http://example.com/{i}",
+                "status": 200 if i % 4 else 500,
+                "timestamp": f"2026-10-{1 + i % 9:02d}T12:00:00Z",
+                "body": json.dumps({"n": i}),
+                "elapsed_ms": 5,
+            }) + "\n")
+    return str(path)
+
+
+def _write_har(path, count):
+    entries = [
+        {
+            "startedDateTime": f"2026-10-0{1 + i % 3}T10:00:00.000-03:00",
+            "time": 12.5,
+            "request": {"method": "GET", "url": f"http://example.com/har/{i}"},
+            "response": {"status": 200, "content": {"mimeType": "text/plain", "text": f"corpo {i}"}},
+        }
+        for i in range(count)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"log": {"version": "1.2", "entries": entries}}, f)
+    return str(path)
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT url, status, timestamp, body, json, elapsed_ms FROM responses ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def test_ndjson_import_batches_and_skips_bad_lines(base_db, tmp_path):
+    """Testa a importação de NDJSON em lotes, com linhas inválidas contadas à parte."""
+    path = _write_ndjson(tmp_path / "dump.ndjson", 25, bad_every=10)
+    seen = []
+
+    info = bulk_import.run_import(base_db, path, batch_size=4, defer_indexes=True,
+                                  progress=lambda i: seen.append(i["records"]))
+
+    assert (info["state"], info["records"], info["skipped"], info["percent"]) == ("done", 23, 2, 100.0)
+    assert seen[:3] == [4, 8, 12]
+    rows = _rows(base_db)
+    assert len(rows) == 23
+    assert rows[0] == ("http://example.com/0", 500, "2026-10-01T12:00:00", '{"n": 0}', '{"n": 0}', 5.0)
+
+    conn = sqlite3.connect(base_db)
+    objects = conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')").fetchall()
+    rollup_total = conn.execute("SELECT SUM(count) FROM response_rollups WHERE granularity = 'day'").fetchone()[0]
+    conn.close()
+    assert ("index", "idx_responses_timestamp") in objects
+    assert ("trigger", "responses_rollup_insert") in objects
+    assert rollup_total == 23
+
+
+def test_default_import_keeps_index_and_trigger_live(base_db, tmp_path):
+    """Testa que, sem adiar índices (o /import do web app), índice e trigger ficam ligados na carga."""
+    path = _write_ndjson(tmp_path / "dump.ndjson", 12)
+    seen = []
+
+    def check(info):
+        conn = sqlite3.connect(base_db)
+        seen.append({name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")})
+        conn.close()
+
+    bulk_import.run_import(base_db, path, batch_size=4, progress=check)
+
+    assert seen and all({"idx_responses_timestamp", "responses_rollup_insert"} <= names for names in seen)
+
+
+def test_deferred_import_adds_rollups_without_rebuilding(base_db, tmp_path):
+    """Testa que a carga com trigger desligado soma as linhas importadas aos rollups já existentes."""
+    conn = sqlite3.connect(base_db)
+    with conn:
+        conn.execute("INSERT INTO responses (url, status, timestamp, body) VALUES ('http://example.com/0', 500, "
+                     "'2026-10-01T08:00:00', 'x')")
+        conn.execute("DELETE FROM responses")
+    conn.close()
+
+    bulk_import.run_import(base_db, _write_ndjson(tmp_path / "dump.ndjson", 9), batch_size=4, defer_indexes=True)
+
+    conn = sqlite3.connect(base_db)
+    counts = dict(conn.execute("SELECT bucket, SUM(count) FROM response_rollups WHERE granularity = 'day' GROUP BY bucket"))
+    conn.close()
+    # O registro apagado antes da carga continua contado
+    assert counts["2026-10-01"] == 2
+    assert sum(counts.values()) == 10
+
+
+def test_interrupted_import_resumes_without_duplicates(base_db, tmp_path):
+    """Testa que uma importação interrompida retoma do último lote confirmado."""
+    path = _write_ndjson(tmp_path / "dump.ndjson", 30)
+
+    def crash(info):
+        if info["records"] >= 10:
+            raise RuntimeError("queda simulada")
+
+    with pytest.raises(RuntimeError):
+        bulk_import.run_import(base_db, path, batch_size=5, progress=crash)
+    assert len(_rows(base_db)) == 10
+
+    info = bulk_import.run_import(base_db, path, batch_size=5)
+    assert (info["state"], info["records"]) == ("done", 30)
+    assert [r[0] for r in _rows(base_db)] == [f"http://example.com/{i}" for i in range(30)]
+
+    # Reimportar um arquivo já concluído não insere nada
+    assert bulk_import.run_import(base_db, path)["records"] == 30
+    assert len(_rows(base_db)) == 30
+
+
+def test_concurrent_runs_of_the_same_import_do_not_duplicate_rows(base_db, tmp_path):
+    """Testa que uma segunda execução simultânea não grava nada e só relata o andamento."""
+    path = _write_ndjson(tmp_path / "dump.ndjson", 30)
+    seen = []
+
+    def second_run(info):
+        if not seen:
+            seen.append(bulk_import.run_import(base_db, path, batch_size=5))
+
+    info = bulk_import.run_import(base_db, path, batch_size=5, progress=second_run)
+
+    assert (seen[0]["state"], seen[0]["records"]) == ("running", 5)
+    assert (info["state"], info["records"]) == ("done", 30)
+    assert len(_rows(base_db)) == 30
+
+
+def test_stale_run_losing_its_claim_stops_without_duplicates(base_db, tmp_path):
+    """Testa que a execução dada como abandonada para no próximo lote, sem marcar falha."""
+    path = _write_ndjson(tmp_path / "dump.ndjson", 30)
+    taken = []
+
+    def takeover(info):
+        if not taken:
+            # Sem lote há mais que o prazo de abandono: outro processo pode assumir
+            conn = sqlite3.connect(base_db)
+            with conn:
+                conn.execute("UPDATE imports SET updated_at = '2000-01-01T00:00:00' WHERE id = ?", (info["id"],))
+            conn.close()
+            taken.append(bulk_import.run_import(base_db, path, batch_size=7))
+
+    info = bulk_import.run_import(base_db, path, batch_size=5, progress=takeover)
+
+    assert (taken[0]["state"], taken[0]["records"]) == ("done", 30)
+    assert (info["state"], info["records"]) == ("done", 30)
+    assert [r[0] for r in _rows(base_db)] == [f"http://example.com/{i}" for i in range(30)]
+
+
+def test_fingerprint_covers_the_whole_file(tmp_path):
+    """Testa que arquivos iguais no começo e no fim, mas diferentes no meio, não se confundem."""
+    head, tail = b"a" * (2 * 1024 * 1024), b"z" * (128 * 1024)
+    first, second = tmp_path / "a.ndjson", tmp_path / "b.ndjson"
+    first.write_bytes(head + b"1" * 100 + tail)
+    second.write_bytes(head + b"2" * 100 + tail)
+
+    assert bulk_import.fingerprint(str(first)) != bulk_import.fingerprint(str(second))
+    with open(first, "rb") as src:
+        key = bulk_import.save_with_fingerprint(src, str(tmp_path / "copy.part"))
+    assert key == bulk_import.fingerprint(str(first))
+    assert (tmp_path / "copy.part").read_bytes() == first.read_bytes()
+
+
+def test_interrupted_upload_leaves_no_partial_file(tmp_path):
+    """Testa que um upload que falha no meio não deixa o arquivo .part."""
+    class Broken:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self, size):
+            self.reads += 1
+            if self.reads > 1:
+                raise OSError("conexão caiu")
+            return b"x" * size
+
+    with pytest.raises(OSError):
+        bulk_import.save_with_fingerprint(Broken(), str(tmp_path / "upload.part"))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_har_streaming_matches_in_memory_parse(tmp_path, monkeypatch):
+    """Testa que o HAR lido em streaming gera as mesmas linhas que o carregado inteiro."""
+    path = _write_har(tmp_path / "capture.har", 12)
+    results = []
+    for limit in (10**9, 0):
+        db_path = str(tmp_path / f"har_{limit}.db")
+        monkeypatch.setattr(bulk_import, "HAR_LOAD_LIMIT", limit)
+        info = bulk_import.run_import(db_path, path, batch_size=5)
+        assert (info["state"], info["records"]) == ("done", 12)
+        results.append(_rows(db_path))
+
+    assert results[0] == results[1]
+    assert results[0][0] == ("http://example.com/har/0", 200, "2026-10-01T13:00:00", "corpo 0", None, 12.5)
+
+
+def test_import_routes_rows_to_partitions(base_db, tmp_path, monkeypatch):
+    """Testa que, com particionamento, cada linha vai para a partição do seu timestamp."""
+    monkeypatch.setattr(partitions, "PARTITION_MODE", "day")
+    path = _write_ndjson(tmp_path / "dump.ndjson", 18)
+
+    info = bulk_import.run_import(base_db, path, batch_size=7)
+
+    assert info["records"] == 18
+    found = partitions.list_partitions(base_db, "day")
+    assert len(found) == 9
+    for key, part in found:
+        conn = sqlite3.connect(part)
+        ids = [r[0] for r in conn.execute("SELECT id FROM responses")]
+        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        conn.close()
+        assert len(ids) == 2 and all(i // partitions.ID_STRIDE == key for i in ids)
+        assert triggers == [("responses_rollup_insert",)]
+
+
+def test_import_endpoint_runs_in_background(tmp_path):
+    """Testa o /import e a consulta de andamento em /import/<id>."""
+    import web_app
+
+    db_path = str(tmp_path / "responses.db")
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["DATABASE"] = db_path
+    path = _write_ndjson(tmp_path / "dump.ndjson", 8)
+    with web_app.app.test_client() as client:
+        with open(path, "rb") as f:
+            response = client.post("/import", data={"file": (f, "dump.ndjson")})
+        assert response.status_code == 202
+        status_url = response.get_json()["status_url"]
+
+        deadline = time.time() + 5
+        info = client.get(status_url).get_json()
+        while not info["finished"] and time.time() < deadline:
+            time.sleep(0.05)
+            info = client.get(status_url).get_json()
+
+        assert info["success"] is True
+        assert info["records"] == 8
+        # Concluída, a cópia guardada para retomada é apagada
+        assert os.listdir(bulk_import.upload_dir(db_path)) == []
+        assert client.post("/import", data={"file": (open(path, "rb"), "dump.csv")}).status_code == 400
+    assert len(_rows(db_path)) == 8
+
+
+def test_har_base64_bodies_keep_raw_bytes(base_db, tmp_path):
+    """Testa que corpos base64 do HAR entram como bytes, com o tipo e o charset do mimeType."""
+    import base64
+
+    png = b"\x89PNG\r\n\x1a\n\x00\xff"
+    entries = [
+        {"startedDateTime": "2026-10-01T10:00:00Z", "time": 1, "request": {"url": "http://example.com/logo.png"},
+         "response": {"status": 200, "content": {"mimeType": "image/png", "encoding": "base64",
+                                                 "text": base64.b64encode(png).decode()}}},
+        {"startedDateTime": "2026-10-01T10:00:01Z", "time": 1, "request": {"url": "http://example.com/api"},
+         "response": {"status": 200, "content": {"mimeType": "application/json; charset=UTF-8", "text": '{"a": 1}'}}},
+    ]
+    path = tmp_path / "binary.har"
+    path.write_text(json.dumps({"log": {"entries": entries}}), encoding="utf-8")
+
+    bulk_import.run_import(base_db, str(path))
+
+    conn = sqlite3.connect(base_db)
+    rows = conn.execute("SELECT body, json, content_type, charset FROM responses ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [(png, None, "image/png", None), ('{"a": 1}', '{"a": 1}', "application/json", "utf-8")]
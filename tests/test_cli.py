@@ -84,3 +84,13 @@ def test_summarize_json_unicode():
     """Testa resumo com caracteres UTF-8."""
     result = summarize_json('{"mensagem":"Olá, mundo!","emoji":"🚀"}')
     assert "JSON keys" in result
+
+
+@pytest.mark.parametrize("text", ['{"a":1,"b":[1,2]}', "[1,[2,3],{}]", '"texto"', "42", "not json"])
+def test_summarize_json_stream_matches_default(monkeypatch, text):
+    """Testa que o resumo em streaming (JSON grande) é igual ao resumo padrão."""
+    import json_stream
+
+    expected = summarize_json(text)
+    monkeypatch.setattr(json_stream, "STREAM_THRESHOLD", 0)
+    assert summarize_json(text) == expected
@@ -0,0 +1,81 @@
+"""Testes para o gerador de dados sintéticos e o driver de carga."""
+
+import sqlite3
+from unittest.mock import patch, MagicMock
+
+import pytest
+from generate_dataset import parse_shape_mix, parse_status_mix, populate
+from load_test import percentile, run_load
+
+
+def test_parse_status_mix():
+    """Testa conversão da mistura de status em listas de pesos."""
+    statuses, weights = parse_status_mix("200:90, 404:10")
+    assert statuses == [200, 404]
+    assert weights == [90, 10]
+
+
+def test_parse_status_mix_empty():
+    """Testa que uma mistura vazia é rejeitada."""
+    with pytest.raises(ValueError):
+        parse_status_mix("")
+
+
+def test_parse_shape_mix():
+    """Testa conversão da mistura de formatos de JSON e a rejeição de formatos desconhecidos."""
+    assert parse_shape_mix("object:3, list:1,nested") == (["object", "list", "nested"], [3, 1, 1])
+    with pytest.raises(ValueError):
+        parse_shape_mix("object:1,xml:2")
+    with pytest.raises(ValueError):
+        parse_shape_mix("")
+
+
+def test_populate_uses_only_requested_shapes(tmp_path):
+    """Testa que os corpos JSON seguem só os formatos pedidos em shape_mix."""
+    db_file = str(tmp_path / "shapes.db")
+
+    populate(db_file, 300, url_cardinality=3, json_ratio=1.0, shape_mix="list:1", seed=2)
+
+    conn = sqlite3.connect(db_file)
+    starts = {r[0] for r in conn.execute("SELECT substr(json, 1, 1) FROM responses")}
+    conn.close()
+    assert starts == {"["}
+
+
+def test_populate_inserts_rows(tmp_path):
+    """Testa que populate insere a quantidade pedida respeitando a cardinalidade."""
+    db_file = str(tmp_path / "synthetic.db")
+
+    total = populate(db_file, 2500, url_cardinality=7, status_mix="200:1,500:1", batch_size=1000, seed=1)
+
+    conn = sqlite3.connect(db_file)
+    count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    urls = conn.execute("SELECT COUNT(DISTINCT url) FROM responses").fetchone()[0]
+    statuses = {r[0] for r in conn.execute("SELECT DISTINCT status FROM responses")}
+    conn.close()
+
+    assert total == count == 2500
+    assert urls <= 7
+    assert statuses <= {200, 500}
+
+
+def test_percentile():
+    """Testa cálculo de percentis com interpolação."""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == pytest.approx(50.5)
+    assert percentile(values, 99) == pytest.approx(99.01)
+    assert percentile([], 95) == 0.0
+
+
+@patch("urllib.request.urlopen")
+def test_run_load_reports_routes(mock_urlopen):
+    """Testa que o driver contabiliza requisições por rota."""
+    mock_response = MagicMock()
+    mock_response.read.return_value = b"ok"
+    mock_urlopen.return_value.__enter__.return_value = mock_response
+
+    report = run_load("http://localhost:8080", 40, 4, mix="index:1,view:1", seed=3)
+
+    assert sum(r["count"] for r in report["routes"].values()) == 40
+    assert all(r["errors"] == 0 for r in report["routes"].values())
+    assert report["routes"]["index"]["p99_ms"] >= report["routes"]["index"]["p50_ms"]
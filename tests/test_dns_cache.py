@@ -0,0 +1,93 @@
+"""Testes para o cache de DNS em processo (dns_cache)."""
+
+import socket
+import time
+
+import pytest
+from dns_cache import DNSCache
+
+ADDR = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", 80))]
+
+
+class FakeResolver:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def __call__(self, host, port, family, socktype):
+        self.calls.append(host)
+        if host in self.fail:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return ADDR
+
+
+def test_resolve_caches_positive_results():
+    """Testa que a segunda resolução do mesmo host vem do cache."""
+    resolver = FakeResolver()
+    cache = DNSCache(resolver=resolver)
+
+    assert cache.resolve("API.example.com", 80) == ADDR
+    assert cache.resolve("api.example.com", 80) == ADDR
+
+    assert resolver.calls == ["api.example.com"]
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_resolve_negative_caching():
+    """Testa que nomes inexistentes também são cacheados, por menos tempo."""
+    resolver = FakeResolver(fail={"nope.example.com"})
+    cache = DNSCache(negative_ttl=60, resolver=resolver)
+
+    for _ in range(3):
+        with pytest.raises(socket.gaierror):
+            cache.resolve("nope.example.com", 80)
+
+    assert resolver.calls == ["nope.example.com"]
+    assert cache.stats()["negative_hits"] == 2
+
+
+def test_resolve_respects_ttl_and_size():
+    """Testa expiração por TTL e o limite de entradas (LRU)."""
+    resolver = FakeResolver()
+    cache = DNSCache(ttl=0, max_size=2, resolver=resolver)
+    cache.resolve("a.example.com", 80)
+    cache.resolve("a.example.com", 80)
+    assert resolver.calls == ["a.example.com", "a.example.com"]
+
+    cache = DNSCache(ttl=60, max_size=2, resolver=resolver)
+    for host in ("a", "b", "c"):
+        cache.resolve(f"{host}.example.com", 80)
+    assert cache.stats()["size"] == 2
+
+
+def test_hot_hosts_refresh_in_background():
+    """Testa a renovação antecipada de hosts muito usados."""
+    resolver = FakeResolver()
+    cache = DNSCache(ttl=0.2, refresh_ahead=1.0, hot_hits=2, resolver=resolver)
+    for _ in range(3):
+        cache.resolve("hot.example.com", 80)
+
+    deadline = time.time() + 2
+    while cache.stats()["refreshes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert cache.stats()["refreshes"] == 1
+    assert resolver.calls == ["hot.example.com", "hot.example.com"]
+
+
+def test_urlopen_keeps_the_global_opener():
+    """Testa que importar os coletores e buscar URLs não troca o opener global do urllib."""
+    import urllib.request
+    from unittest.mock import patch
+    import dns_cache
+    import web_app  # noqa: F401
+    import colet_json_noautentic  # noqa: F401
+
+    with patch("urllib.request.OpenerDirector.open") as mock_open:
+        dns_cache.urlopen("http://example.com", timeout=1)
+    global_handlers = getattr(urllib.request._opener, "handlers", [])
+    assert not any(isinstance(h, dns_cache.CachedHTTPHandler) for h in global_handlers)
+    assert any(isinstance(h, dns_cache.CachedHTTPHandler) for h in dns_cache._opener.handlers)
+    mock_open.assert_called_once()
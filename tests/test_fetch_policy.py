@@ -0,0 +1,120 @@
+"""Testes para as políticas por host (fetch_policy)."""
+
+import socket
+import urllib.error
+from unittest.mock import patch
+
+import pytest
+from fetch_policy import (
+    FetchPolicy, TokenBucket, CircuitOpenError, RateLimitedError, CLOSED, OPEN, HALF_OPEN,
+)
+
+
+def _fail(timeout):
+    raise socket.timeout("timed out")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    """Testa que o breaker abre e passa a falhar sem chamar a função."""
+    policy = FetchPolicy(rate=0, failure_threshold=3)
+    for _ in range(3):
+        with pytest.raises(OSError):
+            policy.call("http://down.example.com/a", _fail)
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        policy.call("http://down.example.com/b", lambda t: calls.append(t))
+    assert calls == []
+    assert policy.snapshot()["down.example.com"]["state"] == OPEN
+    # Outros hosts não são afetados
+    assert policy.call("http://up.example.com", lambda t: (200, "ok")) == (200, "ok")
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    """Testa a requisição de teste do half-open fechando o breaker."""
+    policy = FetchPolicy(rate=0, failure_threshold=1, reset_timeout=0.0)
+    with pytest.raises(OSError):
+        policy.call("http://flaky.example.com", _fail)
+    hp = policy.host("http://flaky.example.com")
+    assert hp.breaker.state == OPEN
+
+    assert hp.breaker.allow() is True
+    assert hp.breaker.state == HALF_OPEN
+    assert hp.breaker.allow() is False
+    hp.breaker.release_probe()
+
+    assert policy.call("http://flaky.example.com", lambda t: (200, "ok")) == (200, "ok")
+    assert hp.breaker.state == CLOSED
+
+
+def test_half_open_probe_raising_other_exception_does_not_wedge_breaker():
+    """Testa que um probe que levanta exceção fora de URLError/OSError libera o half-open."""
+    import http.client
+    policy = FetchPolicy(rate=0, failure_threshold=1, reset_timeout=0.0)
+    with pytest.raises(OSError):
+        policy.call("http://wedge.example.com", _fail)
+
+    def bad_status(timeout):
+        raise http.client.BadStatusLine("lixo")
+
+    with pytest.raises(http.client.BadStatusLine):
+        policy.call("http://wedge.example.com", bad_status)
+    hp = policy.host("http://wedge.example.com")
+    assert hp.breaker.state == OPEN
+
+    # Após o reset_timeout um novo probe passa e fecha o breaker
+    assert policy.call("http://wedge.example.com", lambda t: (200, "ok")) == (200, "ok")
+    assert hp.breaker.state == CLOSED
+
+
+def test_server_errors_count_as_failures_but_client_errors_do_not():
+    """Testa a classificação de 5xx e 4xx para o breaker."""
+    policy = FetchPolicy(rate=0, failure_threshold=2)
+    policy.call("http://api.example.com", lambda t: (404, "nf"))
+    policy.call("http://api.example.com", lambda t: (503, "down"))
+    assert policy.host("http://api.example.com").breaker.state == CLOSED
+    policy.call("http://api.example.com", lambda t: (500, "err"))
+    assert policy.host("http://api.example.com").breaker.state == OPEN
+
+
+def test_token_bucket_rejects_when_exhausted():
+    """Testa que o bucket limita a taxa e o call levanta RateLimitedError."""
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert bucket.acquire(0) is False
+
+    policy = FetchPolicy(rate=1, burst=1, max_wait=0)
+    policy.call("http://slow.example.com", lambda t: (200, ""))
+    with pytest.raises(RateLimitedError):
+        policy.call("http://slow.example.com", lambda t: (200, ""))
+
+
+def test_adaptive_timeout_follows_latency():
+    """Testa que o timeout cai para perto da latência observada."""
+    policy = FetchPolicy(rate=0, min_timeout=0.5, max_timeout=10)
+    hp = policy.host("http://fast.example.com")
+    assert hp.latency.timeout() == 10
+    for _ in range(10):
+        hp.latency.observe(0.05)
+    assert hp.latency.timeout() == 0.5
+
+    seen = []
+    policy.call("http://fast.example.com", lambda t: seen.append(t) or (200, ""))
+    assert seen == [0.5]
+
+
+@patch("dns_cache.urlopen")
+def test_fetch_url_uses_default_policy(mock_urlopen):
+    """Testa que o fetch_url do coletor passa pelo breaker compartilhado."""
+    from colet_json_noautentic import fetch_url
+    from fetch_policy import DEFAULT_POLICY
+
+    mock_urlopen.side_effect = urllib.error.URLError("refused")
+    for _ in range(DEFAULT_POLICY.failure_threshold):
+        with pytest.raises(urllib.error.URLError):
+            fetch_url("http://dead.example.com")
+
+    mock_urlopen.reset_mock()
+    with pytest.raises(CircuitOpenError):
+        fetch_url("http://dead.example.com")
+    mock_urlopen.assert_not_called()
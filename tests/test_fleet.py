@@ -0,0 +1,72 @@
+"""Testes para o modo frota do coletor (vários workers, um writer)."""
+
+import http.server
+import sqlite3
+import threading
+import urllib.parse
+
+import pytest
+from colet_json_noautentic import run_fleet, shard_urls
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        n = int(self.path.strip("/"))
+        status = 404 if n % 5 == 4 else 200
+        body = f'{{"n": {n}}}'.encode() if n % 2 == 0 else b"texto"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_shard_urls_by_url_and_by_host():
+    """Testa a divisão alternada e a divisão que mantém cada host em um só worker."""
+    urls = [f"http://h{i % 3}.example.com/{i}" for i in range(12)]
+
+    assert [len(s) for s in shard_urls(urls, 4)] == [3, 3, 3, 3]
+    by_host = shard_urls(urls, 4, by="host")
+    assert sorted(u for s in by_host for u in s) == sorted(urls)
+    hosts = [{urllib.parse.urlsplit(u).hostname for u in s} for s in by_host]
+    for i, a in enumerate(hosts):
+        for b in hosts[i + 1:]:
+            assert not a & b
+
+
+def test_run_fleet_saves_every_response_through_one_writer(server, tmp_path):
+    """Testa que todas as respostas (inclusive 404) chegam ao banco com eventos e estatísticas."""
+    db_path = str(tmp_path / "responses.db")
+    urls = [f"{server}/{i}" for i in range(20)] + ["http://127.0.0.1:1/recusado", "url-sem-esquema"]
+
+    result = run_fleet(urls, workers=3, db_path=db_path, timeout=2, batch_size=4, flush_interval=0.1)
+
+    assert not result["interrupted"]
+    assert len(result["workers"]) == 3
+    assert sum(s["saved"] for s in result["workers"]) == 20
+    assert sum(s["errors"] for s in result["workers"]) == 2
+    assert result["writer"]["rows"] == 20
+
+    conn = sqlite3.connect(db_path)
+    rows = {r[0]: r[1:] for r in conn.execute("SELECT url, status, json FROM responses")}
+    events = conn.execute("SELECT COUNT(*) FROM response_events WHERE kind = 'inserted'").fetchone()[0]
+    event_ids = {r[0] for r in conn.execute("SELECT record_id FROM response_events")}
+    ids = {r[0] for r in conn.execute("SELECT id FROM responses")}
+    conn.close()
+    assert len(rows) == 20
+    assert rows[f"{server}/0"] == (200, '{"n": 0}')
+    assert rows[f"{server}/1"] == (200, None)
+    assert rows[f"{server}/4"][0] == 404
+    assert events == 20 and event_ids == ids
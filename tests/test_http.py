@@ -2,14 +2,15 @@
 
 from unittest.mock import patch, MagicMock
 import pytest
-from colet_json_noautentic import fetch_url
+from colet_json_noautentic import fetch_response, fetch_url, json_text_for
 
 
-@patch("urllib.request.urlopen")
+@patch("dns_cache.urlopen")
 def test_fetch_url_success(mock_urlopen):
     """Testa busca bem-sucedida de URL."""
     mock_response = MagicMock()
     mock_response.status = 200
+    mock_response.headers = {}
     mock_response.read.return_value = b'{"ok": true}'
     mock_urlopen.return_value.__enter__.return_value = mock_response
 
@@ -20,11 +21,12 @@ def test_fetch_url_success(mock_urlopen):
     mock_urlopen.assert_called_once()
 
 
-@patch("urllib.request.urlopen")
+@patch("dns_cache.urlopen")
 def test_fetch_url_404(mock_urlopen):
     """Testa resposta 404."""
     mock_response = MagicMock()
     mock_response.status = 404
+    mock_response.headers = {}
     mock_response.read.return_value = b"Not Found"
     mock_urlopen.return_value.__enter__.return_value = mock_response
 
@@ -34,7 +36,7 @@ def test_fetch_url_404(mock_urlopen):
     assert body == "Not Found"
 
 
-@patch("urllib.request.urlopen")
+@patch("dns_cache.urlopen")
 def test_fetch_url_timeout(mock_urlopen):
     """Testa timeout na requisição."""
     import urllib.error
@@ -44,11 +46,12 @@ def test_fetch_url_timeout(mock_urlopen):
         fetch_url("http://fake-url.example.com", timeout=1)
 
 
-@patch("urllib.request.urlopen")
+@patch("dns_cache.urlopen")
 def test_fetch_url_headers(mock_urlopen):
     """Valida headers na requisição."""
     mock_response = MagicMock()
     mock_response.status = 200
+    mock_response.headers = {}
     mock_response.read.return_value = b"OK"
     mock_urlopen.return_value.__enter__.return_value = mock_response
 
@@ -67,11 +70,12 @@ def test_fetch_url_headers(mock_urlopen):
     assert ua_value == "PythonAutomator/1.0"
 
 
-@patch("urllib.request.urlopen")
+@patch("dns_cache.urlopen")
 def test_fetch_url_encoding(mock_urlopen):
     """Testa decodificação de UTF-8."""
     mock_response = MagicMock()
     mock_response.status = 200
+    mock_response.headers = {}
     # Simula conteúdo UTF-8 com acentos
     mock_response.read.return_value = "Resposta com acentuação: café".encode("utf-8")
     mock_urlopen.return_value.__enter__.return_value = mock_response
@@ -80,3 +84,32 @@ def test_fetch_url_encoding(mock_urlopen):
 
     assert status == 200
     assert "café" in body
+
+
+@patch("dns_cache.urlopen")
+def test_fetch_url_uses_response_charset(mock_urlopen):
+    """Testa que o texto é decodificado com o charset do Content-Type."""
+    mock_response = MagicMock()
+    mock_response.status = 200
+    mock_response.headers = {"Content-Type": "text/plain; charset=ISO-8859-1"}
+    mock_response.read.return_value = "café".encode("latin-1")
+    mock_urlopen.return_value.__enter__.return_value = mock_response
+
+    assert fetch_url("http://example.com") == (200, "café")
+
+
+@patch("dns_cache.urlopen")
+def test_fetch_response_keeps_raw_bytes(mock_urlopen):
+    """Testa que o corpo bruto e o tipo chegam intactos, sem decodificação."""
+    payload = b"\x89PNG\r\n\x1a\n\x00\xff"
+    mock_response = MagicMock()
+    mock_response.status = 200
+    mock_response.headers = {"Content-Type": "image/png"}
+    mock_response.read.return_value = payload
+    mock_urlopen.return_value.__enter__.return_value = mock_response
+
+    status, body, content_type, charset = fetch_response("http://example.com/logo.png")
+
+    assert (status, body, content_type, charset) == (200, payload, "image/png", None)
+    assert json_text_for(b'{"a": 1}', "image/png") is None
+    assert json_text_for('{"a": 1}'.encode("utf-16"), "application/json", "utf-16") == '{"a": 1}'
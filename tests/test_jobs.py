@@ -0,0 +1,212 @@
+"""Testes para a fila de coletas assíncronas (collect_jobs)."""
+
+import sqlite3
+import pytest
+from collect_jobs import (
+    init_jobs_table, enqueue_job, claim_job, finish_job, get_job, process_next_job, prune_jobs,
+    JobWorkerPool, DONE, FAILED, QUEUED, RUNNING, JOB_MAX_ATTEMPTS,
+)
+
+
+@pytest.fixture
+def jobs_db(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    init_jobs_table(db_path)
+    return db_path
+
+
+def test_enqueue_and_claim_in_order(jobs_db):
+    """Testa que os jobs saem da fila na ordem de chegada, uma única vez."""
+    first = enqueue_job(jobs_db, "http://a.example.com")
+    second = enqueue_job(jobs_db, "http://b.example.com")
+
+    assert claim_job(jobs_db)["id"] == first
+    assert claim_job(jobs_db)["id"] == second
+    assert claim_job(jobs_db) is None
+    assert get_job(jobs_db, first)["state"] == RUNNING
+
+
+def test_process_next_job_records_result_and_drops_credentials(jobs_db):
+    """Testa que o resultado é salvo e as credenciais são apagadas."""
+    job_id = enqueue_job(jobs_db, "http://a.example.com", "user", "secret")
+    seen = []
+
+    def handler(url, username, password):
+        seen.append((url, username, password))
+        return {"state": DONE, "http_status": 200, "record_id": 7, "message": "ok"}
+
+    assert process_next_job(jobs_db, handler) is True
+    assert process_next_job(jobs_db, handler) is False
+
+    job = get_job(jobs_db, job_id)
+    assert seen == [("http://a.example.com", "user", "secret")]
+    assert job["state"] == DONE
+    assert job["record_id"] == 7
+    conn = sqlite3.connect(jobs_db)
+    assert conn.execute("SELECT username, password FROM collect_jobs").fetchone() == (None, None)
+    conn.close()
+
+
+def test_process_next_job_handler_exception(jobs_db):
+    """Testa que uma exceção no handler marca o job como falho."""
+    job_id = enqueue_job(jobs_db, "http://a.example.com")
+
+    def handler(url, username, password):
+        raise RuntimeError("boom")
+
+    process_next_job(jobs_db, handler)
+    job = get_job(jobs_db, job_id)
+    assert job["state"] == FAILED
+    assert "boom" in job["message"]
+
+
+def test_worker_pool_drains_queue(jobs_db):
+    """Testa que o pool de threads consome todos os jobs enfileirados."""
+    ids = [enqueue_job(jobs_db, f"http://example.com/{i}") for i in range(10)]
+    pool = JobWorkerPool(jobs_db, lambda u, n, p: {"state": DONE}, workers=3, poll_interval=0.05)
+    pool.start()
+    try:
+        import time
+        deadline = time.time() + 5
+        while time.time() < deadline and any(get_job(jobs_db, i)["state"] != DONE for i in ids):
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    assert all(get_job(jobs_db, i)["state"] == DONE for i in ids)
+
+
+def test_expired_lease_requeues_then_fails_and_drops_credentials(jobs_db):
+    """Testa que um job abandonado em `running` volta à fila e, esgotadas as tentativas, falha."""
+    job_id = enqueue_job(jobs_db, "http://a.example.com", "user", "secret")
+    assert claim_job(jobs_db)["id"] == job_id
+    # Lease ainda válido: o job continua com o primeiro worker
+    assert claim_job(jobs_db) is None
+
+    for _ in range(JOB_MAX_ATTEMPTS - 1):
+        job = claim_job(jobs_db, lease=0)
+        assert job["id"] == job_id and job["password"] == "secret"
+    assert claim_job(jobs_db, lease=0) is None
+
+    job = get_job(jobs_db, job_id)
+    assert job["state"] == FAILED and "lease" in job["message"]
+    conn = sqlite3.connect(jobs_db)
+    assert conn.execute("SELECT username, password FROM collect_jobs").fetchone() == (None, None)
+    conn.close()
+
+
+def test_prune_jobs_removes_only_old_finished_jobs(jobs_db):
+    """Testa que a limpeza apaga só jobs finalizados fora da retenção."""
+    old = enqueue_job(jobs_db, "http://a.example.com")
+    recent = enqueue_job(jobs_db, "http://b.example.com")
+    pending = enqueue_job(jobs_db, "http://c.example.com")
+    for job_id in (old, recent):
+        finish_job(jobs_db, job_id, DONE)
+    conn = sqlite3.connect(jobs_db)
+    conn.execute("UPDATE collect_jobs SET finished_at = '2000-01-01T00:00:00' WHERE id = ?", (old,))
+    conn.commit()
+    conn.close()
+
+    assert prune_jobs(jobs_db, retention=3600) == 1
+    assert get_job(jobs_db, old) is None
+    assert get_job(jobs_db, recent)["state"] == DONE
+    assert get_job(jobs_db, pending)["state"] == QUEUED
+
+
+def test_enqueue_coalesces_pending_jobs(jobs_db):
+    """Testa que jobs pendentes da mesma URL e credenciais são reaproveitados."""
+    first = enqueue_job(jobs_db, "http://a.example.com", coalesce=True)
+    assert enqueue_job(jobs_db, "http://a.example.com", coalesce=True) == first
+    assert enqueue_job(jobs_db, "http://a.example.com", "u", "p", coalesce=True) != first
+    assert enqueue_job(jobs_db, "http://a.example.com") != first
+
+
+def test_enqueue_does_not_coalesce_with_stale_jobs(jobs_db):
+    """Testa que jobs fora do lease (ex.: worker morto) não são reaproveitados."""
+    running = enqueue_job(jobs_db, "http://a.example.com", coalesce=True)
+    claim_job(jobs_db)
+    queued = enqueue_job(jobs_db, "http://b.example.com", coalesce=True)
+    conn = sqlite3.connect(jobs_db)
+    conn.execute("UPDATE collect_jobs SET created_at = '2000-01-01T00:00:00', started_at = "
+                 "CASE WHEN id = ? THEN '2000-01-01T00:00:00' END", (running,))
+    conn.commit()
+    conn.close()
+
+    assert enqueue_job(jobs_db, "http://a.example.com", coalesce=True) != running
+    assert enqueue_job(jobs_db, "http://b.example.com", coalesce=True) != queued
+
+
+def test_single_flight_shares_one_execution():
+    """Testa que chamadas concorrentes com a mesma chave executam a função uma vez."""
+    import threading
+    from collect_jobs import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+    results = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"record_id": 1}
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    import time
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r[0] == {"record_id": 1} for r in results)
+    assert sorted(r[1] for r in results) == [False, True, True, True, True]
+
+
+def test_in_memory_credentials_never_reach_the_database(jobs_db, monkeypatch):
+    """Testa que credenciais em memória ficam fora do banco e só o processo dono pega o job."""
+    import collect_jobs
+    job_id = enqueue_job(jobs_db, "http://a.example.com", "user", "secret", in_memory=True)
+    conn = sqlite3.connect(jobs_db)
+    assert conn.execute("SELECT username, password, auth_key IS NOT NULL FROM collect_jobs").fetchone() == (None, None, 1)
+    conn.close()
+
+    # Outro worker do gunicorn não tem as credenciais e não pega o job
+    monkeypatch.setattr(collect_jobs, "process_owner", lambda: "outro-host:1")
+    assert claim_job(jobs_db) is None
+    monkeypatch.undo()
+
+    seen = []
+    process_next_job(jobs_db, lambda u, n, p: seen.append((n, p)) or {"state": DONE})
+    assert seen == [("user", "secret")]
+    assert get_job(jobs_db, job_id)["state"] == DONE
+    assert collect_jobs._credentials == {}
+
+
+def test_queued_job_of_a_dead_process_fails_after_the_lease(jobs_db, monkeypatch):
+    """Testa que o job cujas credenciais estavam em outro processo falha após o lease."""
+    import collect_jobs
+    monkeypatch.setattr(collect_jobs, "process_owner", lambda: "morto:1")
+    job_id = enqueue_job(jobs_db, "http://a.example.com", "user", "secret", in_memory=True)
+    monkeypatch.undo()
+    collect_jobs._credentials.clear()
+
+    assert claim_job(jobs_db) is None
+    assert get_job(jobs_db, job_id)["state"] == QUEUED
+    assert claim_job(jobs_db, lease=0) is None
+    job = get_job(jobs_db, job_id)
+    assert job["state"] == FAILED and "credenciais" in job["message"]
+
+
+def test_persisted_credentials_restrict_database_permissions(jobs_db):
+    """Testa que, sem workers internos, o banco com credenciais fica legível só pelo dono."""
+    import os
+    import stat
+    os.chmod(jobs_db, 0o644)
+    enqueue_job(jobs_db, "http://a.example.com")
+    assert stat.S_IMODE(os.stat(jobs_db).st_mode) == 0o644
+
+    enqueue_job(jobs_db, "http://a.example.com", "user", "secret")
+    assert stat.S_IMODE(os.stat(jobs_db).st_mode) == 0o600
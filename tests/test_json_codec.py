@@ -0,0 +1,61 @@
+"""Testes para a camada de codec JSON (json_codec)."""
+
+import json
+
+import pytest
+import json_codec
+
+
+DOC = {"id": 7, "name": "ação", "tags": [], "attrs": {}, "items": [{"x": 1.5, "ok": True, "none": None}]}
+
+BACKENDS = list(json_codec.CODECS)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+@pytest.mark.parametrize("indent", [None, 2, 4])
+def test_dumps_matches_stdlib_output(name, indent):
+    """Testa que todos os backends produzem o mesmo texto que json.dumps(ensure_ascii=False)."""
+    codec = json_codec.get_codec(name)
+    assert codec.dumps(DOC, indent=indent) == json.dumps(DOC, ensure_ascii=False, indent=indent)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), -float("inf"), 1e300, 1e16, 1.5e-7, 1e-5,
+                                   1e15, 0.0001, -0.0, 5e-324])
+def test_dumps_indent_keeps_stdlib_floats(name, value):
+    """Testa que NaN/Infinity e floats em notação científica saem como no json.dumps."""
+    codec = json_codec.get_codec(name)
+    doc = {"a": [1, {"v": value}], 1: "chave int"}
+    assert codec.dumps(doc, indent=2) == json.dumps(doc, ensure_ascii=False, indent=2)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_loads_roundtrip_and_errors(name):
+    """Testa o parse, inteiros grandes e o tipo de erro para texto inválido."""
+    codec = json_codec.get_codec(name)
+    assert codec.loads(json.dumps(DOC)) == DOC
+    assert codec.loads(str(2**70)) == 2**70
+    assert codec.loads(b"[1, 2]") == [1, 2]
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads("<html></html>")
+
+
+def test_orjson_falls_back_for_unsupported_values():
+    """Testa que o backend orjson recorre ao json para o que não suporta."""
+    pytest.importorskip("orjson")
+    codec = json_codec.get_codec("orjson")
+    assert codec.dumps({"big": 2**70}, indent=2) == json.dumps({"big": 2**70}, indent=2)
+    assert codec.loads('[NaN]')[0] != codec.loads('[NaN]')[0]
+
+
+def test_get_codec_rejects_unknown_backend():
+    """Testa que um backend inexistente gera ValueError."""
+    with pytest.raises(ValueError):
+        json_codec.get_codec("simdjson")
+
+
+def test_benchmark_reports_cost_per_record():
+    """Testa que o benchmark devolve o custo por registro de cada operação."""
+    result = json_codec.benchmark([json.dumps(DOC)] * 5, json_codec.get_codec("stdlib"), repeat=1)
+    assert set(result) == {"loads", "dumps", "dumps_indent"}
+    assert all(value > 0 for value in result.values())
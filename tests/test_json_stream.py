@@ -0,0 +1,107 @@
+"""Testes para o parser JSON incremental (json_stream)."""
+
+import json
+import time
+
+import pytest
+import json_stream
+
+
+DOC = {
+    "data": [{"id": 1, "name": "ação", "tags": []}, {"id": 2, "name": "x\"y", "extra": {}}],
+    "total": 2,
+    "ratio": 0.5,
+    "ok": True,
+    "missing": None,
+}
+
+
+def _events(text, size):
+    return list(json_stream.iter_events(json_stream.text_chunks(text, size)))
+
+
+@pytest.mark.parametrize("size", [1, 3, 64 * 1024])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_dump_chunks_matches_json_dumps(size, indent):
+    """Testa que a reserialização em pedaços é igual ao json.dumps, qualquer que seja o corte."""
+    text = json.dumps(DOC, indent=4)
+    expected = json.dumps(DOC, ensure_ascii=False, indent=indent)
+    assert "".join(json_stream.dump_chunks(_events(text, size), indent=indent, chunk_size=7)) == expected
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 4096])
+def test_long_string_split_inside_escapes(size):
+    """Testa strings longas com escapes cortados em qualquer ponto entre pedaços."""
+    value = 'a\\"b\n\u00e7\\' * 300
+    text = json.dumps({"k" * 50: value})
+    assert _events(text, size)[2] == ("k" * 50, "string", value)
+
+
+def test_multi_megabyte_string_is_linear():
+    """Testa que um único token string de vários MB não deixa o parser quadrático."""
+    value = "QUJD" * (2 * 1024 * 1024)
+    text = json.dumps({"blob": value, "n": 1})
+    started = time.perf_counter()
+    events = _events(text, 64 * 1024)
+    elapsed = time.perf_counter() - started
+    assert events[2] == ("blob", "string", value)
+    # Reconstruir o buffer a cada pedaço levava dezenas de segundos aqui
+    assert elapsed < 5
+
+
+def test_events_use_ijson_prefixes():
+    """Testa os eventos e prefixos gerados para objetos e arrays aninhados."""
+    assert _events('{"a": [1, {"b": "c"}]}', 2) == [
+        ("", "start_map", None),
+        ("", "map_key", "a"),
+        ("a", "start_array", None),
+        ("a.item", "number", 1),
+        ("a.item", "start_map", None),
+        ("a.item", "map_key", "b"),
+        ("a.item.b", "string", "c"),
+        ("a.item", "end_map", None),
+        ("a", "end_array", None),
+        ("", "end_map", None),
+    ]
+
+
+@pytest.mark.parametrize("text", ["", "[1,]", '{"a" 1}', "01", "[1] 2", '"abc', "tru", '{"a": 1]'])
+def test_invalid_documents_raise(text):
+    """Testa que documentos inválidos ou incompletos são rejeitados."""
+    with pytest.raises(json_stream.JSONStreamError):
+        _events(text, 1)
+
+
+def test_summarize_extracts_paths_without_full_tree():
+    """Testa o resumo e a extração de caminhos (escalares e subárvores)."""
+    summary = json_stream.summarize(
+        json_stream.iter_events([json.dumps(DOC)]), paths=["total", "data.item.name", "data.item"]
+    )
+    assert summary["type"] == "object"
+    assert summary["keys"] == ["data", "total", "ratio", "ok", "missing"]
+    assert summary["values"] == {"total": 2, "data.item.name": "ação", "data.item": DOC["data"][0]}
+
+
+def test_summarize_array_length_and_scalar_root():
+    """Testa o tamanho do array raiz e o valor de uma raiz escalar."""
+    assert json_stream.summarize(json_stream.iter_events(["[[1, 2], {}, 3]"]))["length"] == 3
+    assert json_stream.summarize(json_stream.iter_events(["-1.5e3"]))["value"] == -1500.0
+
+
+def test_normalize_returns_none_for_invalid_text():
+    """Testa que normalize devolve o JSON compacto ou None."""
+    assert json_stream.normalize('{"a" : [1 ,2]}') == '{"a": [1, 2]}'
+    assert json_stream.normalize("not json") is None
+
+
+@pytest.mark.parametrize("size", [7, 4096])
+def test_integers_beyond_python_digit_limit_keep_their_digits(size):
+    """Testa que inteiros acima do limite de dígitos do int() saem intactos, sem erro."""
+    digits = "9" * 5000
+    text = '{"big": [-' + digits + ", 1]}"
+
+    events = _events(text, size)
+
+    assert events[3][1:] == ("number", "-" + digits) and isinstance(events[3][2], json_stream.LargeNumber)
+    assert json_stream.normalize(text) == text
+    assert json_stream.normalize(text, indent=2) == '{\n  "big": [\n    -' + digits + ",\n    1\n  ]\n}"
@@ -0,0 +1,68 @@
+"""Testes para o feed de eventos do índice ao vivo (live_events)."""
+
+import sqlite3
+
+import pytest
+import live_events
+from colet_json_noautentic import init_sqlite, save_response_sqlite
+
+
+@pytest.fixture
+def base_db(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    init_sqlite(db_path)
+    return db_path
+
+
+def test_inserts_publish_summaries(base_db):
+    """Testa que cada insert grava um evento com o resumo do registro."""
+    save_response_sqlite("http://a", 200, "x", db_path=base_db)
+    save_response_sqlite("http://b", 404, "y", db_path=base_db)
+
+    conn = sqlite3.connect(base_db)
+    events = live_events.events_since(conn, 0)
+    assert live_events.last_seq(conn) == 2
+    conn.close()
+    assert [(e["kind"], e["id"], e["url"], e["status"]) for e in events] == [
+        ("inserted", 1, "http://a", 200), ("inserted", 2, "http://b", 404),
+    ]
+
+
+def test_retention_keeps_latest_events(base_db, monkeypatch):
+    """Testa que só os eventos mais recentes ficam guardados."""
+    monkeypatch.setattr(live_events, "EVENT_RETENTION", 3)
+    conn = sqlite3.connect(base_db)
+    with conn:
+        live_events.publish(conn, live_events.DELETED, [(i, "http://a", 200, "t") for i in range(10)])
+    assert live_events.oldest_seq(conn) == 8
+    assert live_events.last_seq(conn) == 10
+    conn.close()
+
+
+def test_hub_fans_out_to_subscribers(base_db):
+    """Testa que todos os inscritos recebem os eventos lidos pela thread do hub."""
+    hub = live_events.EventHub(base_db, poll_interval=0.05)
+    first, second = hub.subscribe(), hub.subscribe()
+    save_response_sqlite("http://a", 200, "x", db_path=base_db)
+    hub.notify()
+
+    for sub in (first, second):
+        batch = sub.get(timeout=2)
+        assert [(e["kind"], e["url"]) for e in batch] == [("inserted", "http://a")]
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+
+
+def test_subscribe_from_discarded_point_gets_reset(base_db, monkeypatch):
+    """Testa que retomar de um evento já descartado começa com um reset."""
+    monkeypatch.setattr(live_events, "EVENT_RETENTION", 2)
+    for i in range(5):
+        save_response_sqlite(f"http://h{i}", 200, "x", db_path=base_db)
+    hub = live_events.EventHub(base_db, poll_interval=0.05)
+
+    stale = hub.subscribe(after=1)
+    assert stale.get(timeout=1) == [{"seq": 5, "kind": "reset"}]
+    recent = hub.subscribe(after=3)
+    assert [e["id"] for e in recent.get(timeout=2)] == [4, 5]
+    hub.unsubscribe(stale)
+    hub.unsubscribe(recent)
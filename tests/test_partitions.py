@@ -0,0 +1,90 @@
+"""Testes para o armazenamento particionado por tempo (partitions)."""
+
+import datetime
+import os
+import sqlite3
+
+import pytest
+import partitions
+from colet_json_noautentic import init_sqlite
+
+
+@pytest.fixture
+def base_db(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    init_sqlite(db_path)
+    return db_path
+
+
+def _save(base_db, mode, ts, url="http://example.com"):
+    return partitions.save_response(base_db, mode, url, 200, ts, "body", None)
+
+
+def test_save_response_routes_by_time_with_global_ids(base_db):
+    """Testa que cada período ganha seu arquivo e ids que apontam para ele."""
+    a = _save(base_db, "month", "2026-09-30T23:59:59")
+    b = _save(base_db, "month", "2026-10-01T00:00:00")
+    c = _save(base_db, "month", "2026-10-02T12:00:00")
+
+    keys = [key for key, _ in partitions.list_partitions(base_db, "month")]
+    assert keys == [a // partitions.ID_STRIDE, b // partitions.ID_STRIDE]
+    assert c == b + 1
+    assert os.path.basename(partitions.partition_path(base_db, keys[1], "month")) == "responses_2026-10.db"
+
+
+def test_partition_groups_prune_by_time_and_ids(base_db):
+    """Testa a poda de partições por intervalo de tempo e por ids."""
+    ids = [_save(base_db, "day", f"2026-10-{d:02d}T10:00:00") for d in (1, 2, 3)]
+
+    groups = partitions.partition_groups(base_db, "day", since="2026-10-02T00:00:00")
+    assert groups == [[partitions.MAIN] + [p for _, p in partitions.list_partitions(base_db, "day")[1:]]]
+
+    by_id = partitions.partition_groups(base_db, "day", ids=[ids[2]])
+    assert by_id == [[partitions.list_partitions(base_db, "day")[2][1]]]
+
+    newest = partitions.partition_groups(base_db, "day", newest_first=True)
+    assert newest[0][-1] == partitions.MAIN
+
+
+def test_scope_federates_reads_and_deletes(base_db):
+    """Testa a view federada sobre o banco principal e as partições anexadas."""
+    conn = sqlite3.connect(base_db)
+    conn.execute("INSERT INTO responses (url, status, timestamp) VALUES ('legacy', 200, '2020-01-01T00:00:00')")
+    conn.commit()
+    new_id = _save(base_db, "month", "2026-10-05T00:00:00")
+
+    partitions.scope(conn, partitions.partition_groups(base_db, "month")[0])
+    assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 2
+
+    partitions.delete_ids(conn, [new_id])
+    conn.commit()
+    assert [r[0] for r in conn.execute("SELECT url FROM responses")] == ["legacy"]
+    conn.close()
+
+
+def test_drop_partitions_older_than(base_db):
+    """Testa que a retenção apaga apenas arquivos inteiramente antigos."""
+    _save(base_db, "day", "2026-10-01T10:00:00")
+    _save(base_db, "day", "2026-10-03T10:00:00")
+
+    removed = partitions.drop_partitions_older_than(base_db, "day", datetime.datetime(2026, 10, 3, 5))
+
+    assert [os.path.basename(p) for p in removed] == ["responses_2026-10-01.db"]
+    assert len(partitions.list_partitions(base_db, "day")) == 1
+
+
+def test_web_app_reads_partitioned_storage(base_db, monkeypatch):
+    """Testa index, view e delete do web app com particionamento ativo."""
+    from web_app import app, save_response_sqlite
+    monkeypatch.setattr(partitions, "PARTITION_MODE", "day")
+    app.config['TESTING'] = True
+    app.config['DATABASE'] = base_db
+
+    record_id = save_response_sqlite("http://example.com/part", 200, "hello", db_path=base_db)
+    assert record_id > partitions.ID_STRIDE
+
+    with app.test_client() as client:
+        assert b"example.com/part" in client.get("/").data
+        assert client.get(f"/view/{record_id}").status_code == 200
+        assert client.post(f"/delete/{record_id}").status_code == 200
+        assert client.get(f"/view/{record_id}").status_code == 404
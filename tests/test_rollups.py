@@ -0,0 +1,136 @@
+"""Testes para as tabelas de rollup mantidas por trigger (rollups)."""
+
+import datetime
+import sqlite3
+
+import pytest
+import partitions
+import rollups
+from colet_json_noautentic import init_sqlite
+
+
+@pytest.fixture
+def base_db(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    init_sqlite(db_path)
+    return db_path
+
+
+def _insert(conn, ts, url="http://example.com", status=200, body="abcd", elapsed_ms=None):
+    conn.execute(
+        "INSERT INTO responses (url, status, timestamp, body, json, elapsed_ms) VALUES (?, ?, ?, ?, NULL, ?)",
+        (url, status, ts, body, elapsed_ms),
+    )
+
+
+def _rollups(conn):
+    return conn.execute("SELECT * FROM response_rollups ORDER BY granularity, bucket, url, status").fetchall()
+
+
+def test_trigger_updates_every_granularity(base_db):
+    """Testa que cada insert soma a linha nos buckets de minuto, hora e dia."""
+    conn = sqlite3.connect(base_db)
+    with conn:
+        _insert(conn, "2026-10-19T10:15:01", elapsed_ms=10)
+        _insert(conn, "2026-10-19T10:15:40", elapsed_ms=30)
+        _insert(conn, "2026-10-19T11:00:00", status=500, body="x")
+
+    rows = {(r[0], r[1], r[3]): r[4:] for r in _rollups(conn)}
+    conn.close()
+    assert rows[("minute", "2026-10-19T10:15", 200)] == (2, 8, 40.0, 2)
+    assert rows[("hour", "2026-10-19T10", 200)] == (2, 8, 40.0, 2)
+    assert rows[("hour", "2026-10-19T11", 500)] == (1, 1, 0.0, 0)
+    assert rows[("day", "2026-10-19", 200)] == (2, 8, 40.0, 2)
+    assert rows[("day", "2026-10-19", 500)] == (1, 1, 0.0, 0)
+
+
+def test_suspended_rebuild_matches_trigger(base_db, tmp_path):
+    """Testa que a carga com trigger desligado termina com os mesmos rollups."""
+    other = str(tmp_path / "other.db")
+    init_sqlite(other)
+    results = []
+    for path, suspend in ((base_db, False), (other, True)):
+        conn = sqlite3.connect(path)
+        if suspend:
+            with rollups.suspended(conn):
+                with conn:
+                    for i in range(30):
+                        _insert(conn, f"2026-10-19T{i % 3:02d}:{i:02d}:00", url=f"http://h{i % 4}", status=200 + i % 2 * 300)
+        else:
+            with conn:
+                for i in range(30):
+                    _insert(conn, f"2026-10-19T{i % 3:02d}:{i:02d}:00", url=f"http://h{i % 4}", status=200 + i % 2 * 300)
+        results.append(_rollups(conn))
+        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        conn.close()
+        assert triggers == [(rollups.TRIGGER_NAME,)]
+    assert results[0] == results[1]
+
+
+def test_suspended_load_keeps_counts_of_deleted_rows(base_db):
+    """Testa que a carga sem trigger soma só as linhas novas, sem apagar o histórico."""
+    conn = sqlite3.connect(base_db)
+    with conn:
+        _insert(conn, "2026-10-19T10:00:00")
+        _insert(conn, "2026-10-19T10:05:00")
+        conn.execute("DELETE FROM responses")
+    with rollups.suspended(conn):
+        with conn:
+            _insert(conn, "2026-10-19T10:10:00")
+            _insert(conn, "2026-10-19T12:00:00", status=500)
+
+    rows = {(r[0], r[1], r[3]): r[4] for r in _rollups(conn)}
+    conn.close()
+    assert rows[("hour", "2026-10-19T10", 200)] == 3
+    assert rows[("hour", "2026-10-19T12", 500)] == 1
+
+
+def test_stats_reports_error_rate_and_latency(base_db):
+    """Testa a série, as URLs e os status agregados a partir dos rollups."""
+    conn = sqlite3.connect(base_db)
+    with conn:
+        _insert(conn, "2026-10-19T10:00:00", url="http://a", elapsed_ms=100)
+        _insert(conn, "2026-10-19T10:30:00", url="http://a", status=404, elapsed_ms=300)
+        _insert(conn, "2026-10-19T11:00:00", url="http://b", status=0)
+        _insert(conn, "2026-10-18T23:00:00", url="http://old")
+
+    result = rollups.stats([conn], "hour", "2026-10-19T00")
+    conn.close()
+    assert result["totals"] == {
+        "count": 3, "errors": 2, "error_rate": 0.6667, "avg_body_bytes": 4, "avg_elapsed_ms": 200.0,
+    }
+    assert [(s["bucket"], s["count"], s["errors"]) for s in result["series"]] == [
+        ("2026-10-19T10", 2, 1), ("2026-10-19T11", 1, 1),
+    ]
+    assert [u["url"] for u in result["urls"]] == ["http://a", "http://b"]
+    assert result["statuses"] == [{"status": 0, "count": 1}, {"status": 200, "count": 1}, {"status": 404, "count": 1}]
+
+
+def test_prune_removes_old_buckets(base_db):
+    """Testa que a poda apaga só os buckets antigos da granularidade pedida."""
+    conn = sqlite3.connect(base_db)
+    with conn:
+        _insert(conn, "2026-10-01T10:00:00")
+        _insert(conn, "2026-10-19T10:00:00")
+
+    removed = rollups.prune(conn, "minute", datetime.datetime(2026, 10, 10))
+    buckets = conn.execute("SELECT granularity, bucket FROM response_rollups ORDER BY 1, 2").fetchall()
+    conn.close()
+    assert removed == 1
+    assert ("minute", "2026-10-01T10:00") not in buckets
+    assert ("day", "2026-10-01") in buckets
+
+
+def test_stats_merges_partitions(base_db):
+    """Testa que partições têm seus próprios rollups, somados na consulta."""
+    partitions.save_response(base_db, "month", "http://a", 200, "2026-09-30T10:00:00", "body", None, elapsed_ms=5)
+    partitions.save_response(base_db, "month", "http://a", 500, "2026-10-01T10:00:00", "body", None, elapsed_ms=15)
+
+    conn = sqlite3.connect(base_db)
+    paths = partitions.partition_groups(base_db, "month")[0]
+    partitions.scope(conn, paths)
+    result = rollups.stats([conn], "day", "2026-09-01")
+    conn.close()
+    assert result["totals"]["count"] == 2
+    assert result["totals"]["errors"] == 1
+    assert result["totals"]["avg_elapsed_ms"] == 10.0
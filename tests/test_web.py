@@ -161,3 +161,451 @@ def test_request_timeout_handling(client, temp_db):
     # Request normal deve funcionar
     response = client.get("/")
     assert response.status_code in (200, 404, 500)
+
+
+def _insert_and_get_id(temp_db):
+    save_response_sqlite(
+        url="http://example.com/cache",
+        status=200,
+        body='{"a": 1}',
+        json_obj={"a": 1},
+        db_path=temp_db
+    )
+    conn = sqlite3.connect(temp_db)
+    record_id = conn.execute("SELECT MAX(id) FROM responses").fetchone()[0]
+    conn.close()
+    return record_id
+
+
+@pytest.mark.parametrize("route", ["view", "export"])
+def test_record_routes_send_etag_and_304(client, temp_db, route):
+    """Testa ETag, Cache-Control imutável e 304 com If-None-Match."""
+    record_id = _insert_and_get_id(temp_db)
+
+    first = client.get(f"/{route}/{record_id}")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert "immutable" in first.headers["Cache-Control"]
+    assert etag.startswith(f'"{record_id}-')
+
+    second = client.get(f"/{route}/{record_id}", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+
+
+def test_page_cache_invalidated_on_delete(client, temp_db):
+    """Testa que o cache de páginas é descartado quando o registro é apagado."""
+    from web_app import clear_page_cache
+    app.config['PAGE_CACHE_SIZE'] = 8
+    try:
+        record_id = _insert_and_get_id(temp_db)
+        assert client.get(f"/view/{record_id}").status_code == 200
+        assert client.get(f"/view/{record_id}").status_code == 200
+
+        client.post(f"/delete/{record_id}")
+        assert client.get(f"/view/{record_id}").status_code == 404
+    finally:
+        app.config['PAGE_CACHE_SIZE'] = 0
+        clear_page_cache()
+
+
+def test_page_cache_skips_rows_deleted_by_another_worker(client, temp_db):
+    """Testa que uma página cacheada não é servida se outro processo apagou o registro."""
+    from web_app import clear_page_cache
+    app.config['PAGE_CACHE_SIZE'] = 8
+    try:
+        record_id = _insert_and_get_id(temp_db)
+        assert client.get(f"/view/{record_id}").status_code == 200
+
+        # Apagado direto no banco, sem passar pelo page_cache_invalidate deste processo
+        conn = sqlite3.connect(temp_db)
+        with conn:
+            conn.execute("DELETE FROM responses WHERE id = ?", (record_id,))
+        conn.close()
+        assert client.get(f"/view/{record_id}").status_code == 404
+    finally:
+        app.config['PAGE_CACHE_SIZE'] = 0
+        clear_page_cache()
+
+
+def test_export_escapes_html(client, temp_db):
+    """Testa que a exportação individual escapa o corpo via template."""
+    save_response_sqlite(url="http://example.com/x", status=500, body="<script>x</script>", db_path=temp_db)
+
+    response = client.get("/export/1")
+    assert response.status_code == 200
+    assert b"&lt;script&gt;" in response.data
+    assert b"status-error" in response.data
+    assert "attachment" in response.headers["Content-Disposition"]
+
+
+def test_export_archive_streams_zip(client, temp_db):
+    """Testa que /export/archive gera um ZIP com HTMLs e manifesto NDJSON."""
+    import io
+    import json
+    import zipfile
+    for i in range(3):
+        save_response_sqlite(url=f"http://example.com/{i}", status=200 if i else 404, body=f"body {i}", db_path=temp_db)
+
+    response = client.get("/export/archive?ids=1,3")
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == ["manifest.ndjson", "response_1.html", "response_3.html"]
+    manifest = [json.loads(line) for line in archive.read("manifest.ndjson").decode().splitlines()]
+    assert [m["id"] for m in manifest] == [1, 3]
+    assert b"body 2" in archive.read("response_3.html")
+
+    by_status = zipfile.ZipFile(io.BytesIO(client.post("/export/archive", data={"status": "404"}).data))
+    assert "response_1.html" in by_status.namelist()
+    assert "response_2.html" not in by_status.namelist()
+
+
+def test_export_archive_requires_filter(client):
+    """Testa que o arquivo ZIP exige ids ou filtro válido."""
+    assert client.get("/export/archive").status_code == 400
+    assert client.get("/export/archive?ids=a,b").status_code == 400
+
+
+def test_delete_bulk_by_ids_in_chunks(client, temp_db):
+    """Testa remoção em lote por ids, com lotes menores que o total."""
+    for i in range(25):
+        save_response_sqlite(url=f"http://example.com/{i}", status=200, body="x", db_path=temp_db)
+    app.config['DELETE_CHUNK_SIZE'] = 4
+    try:
+        response = client.post("/delete/bulk", json={"ids": list(range(1, 21))})
+    finally:
+        app.config['DELETE_CHUNK_SIZE'] = 1000
+
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == 20
+    conn = sqlite3.connect(temp_db)
+    assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 5
+    conn.close()
+
+
+def test_delete_bulk_accepts_more_ids_than_sqlite_variables(client, temp_db):
+    """Testa que uma lista de ids acima do limite de variáveis do SQLite não gera erro."""
+    for i in range(3):
+        save_response_sqlite(url=f"http://example.com/{i}", status=200, body="x", db_path=temp_db)
+
+    response = client.post("/delete/bulk", json={"ids": list(range(1, 50_001))})
+    listing = client.get("/api/responses?ids=" + ",".join(str(i) for i in range(1, 40_001)))
+
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == 3
+    assert listing.status_code == 200 and listing.get_json()["items"] == []
+
+
+def test_delete_ids_binds_one_variable_per_statement(temp_db, monkeypatch):
+    """Testa que um lote de ids maior que o limite de variáveis do SQLite é apagado, com o store ligado."""
+    import body_store
+    from web_app import delete_ids
+    monkeypatch.setattr(body_store, "BODY_STORE", True)
+    conn = sqlite3.connect(temp_db)
+    with conn:
+        conn.executemany("INSERT INTO responses (url, status, timestamp, body) VALUES (?, 200, '2026-01-01', 'x')",
+                         [(f"http://example.com/{i}",) for i in range(2000)])
+    # Limite baixo, como o padrão (999) de builds antigos do SQLite
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    with conn:
+        delete_ids(conn, [r[0] for r in conn.execute("SELECT id FROM responses")])
+    assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+    conn.close()
+
+
+def test_delete_bulk_by_url_in_chunks_skips_other_rows(client, temp_db):
+    """Testa a remoção por filtro em lotes, com as linhas do filtro intercaladas com outras."""
+    for i in range(30):
+        save_response_sqlite(url=f"http://example.com/{i % 3}", status=200, body="x", db_path=temp_db)
+    app.config['DELETE_CHUNK_SIZE'] = 4
+    try:
+        response = client.post("/delete/bulk", data={"url": "http://example.com/1"})
+    finally:
+        app.config['DELETE_CHUNK_SIZE'] = 1000
+
+    assert response.get_json()["deleted"] == 10
+    conn = sqlite3.connect(temp_db)
+    assert conn.execute("SELECT COUNT(*) FROM responses WHERE url = 'http://example.com/1'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 20
+    conn.close()
+
+
+def test_delete_bulk_by_filters(client, temp_db):
+    """Testa remoção em lote por status e por idade."""
+    save_response_sqlite(url="http://example.com/a", status=500, body="x", db_path=temp_db)
+    save_response_sqlite(url="http://example.com/b", status=200, body="x", db_path=temp_db)
+    conn = sqlite3.connect(temp_db)
+    conn.execute("UPDATE responses SET timestamp = '2000-01-01T00:00:00' WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    assert client.post("/delete/bulk", data={"status": "500"}).get_json()["deleted"] == 1
+    assert client.post("/delete/bulk", data={"older_than": "30"}).get_json()["deleted"] == 1
+    assert client.post("/delete/bulk", data={}).status_code == 400
+
+
+def test_collect_enqueues_job_and_reports_status(client, temp_db):
+    """Testa que /collect responde na hora com um job e /jobs mostra o resultado."""
+    from unittest.mock import patch
+    import collect_jobs
+    app.config['COLLECT_WORKERS'] = 0
+    try:
+        response = client.post("/collect", data={"url": "http://example.com/api"})
+        assert response.status_code == 202
+        job_id = response.get_json()["job_id"]
+        assert client.get(f"/jobs/{job_id}").get_json()["state"] == "queued"
+
+        from web_app import run_collection
+        with patch("web_app.fetch_response", return_value=(200, b'{"ok": true}', "application/json", None)):
+            collect_jobs.process_next_job(temp_db, lambda u, n, p: run_collection(u, n, p, db_path=temp_db))
+
+        job = client.get(f"/jobs/{job_id}").get_json()
+        assert job["finished"] and job["success"]
+        assert client.get(f"/view/{job['record_id']}").status_code == 200
+    finally:
+        app.config['COLLECT_WORKERS'] = 2
+
+    assert client.get("/jobs/9999").status_code == 404
+
+
+def test_jobs_table_is_initialized_once_per_process(client, temp_db):
+    """Testa que o /collect e as consultas a /jobs/<id> não repetem o DDL da tabela de jobs."""
+    from unittest.mock import patch
+    import collect_jobs
+    app.config['COLLECT_WORKERS'] = 0
+    try:
+        with patch("collect_jobs.init_jobs_table", wraps=collect_jobs.init_jobs_table) as init:
+            job_id = client.post("/collect", data={"url": "http://example.com/api"}).get_json()["job_id"]
+            for _ in range(3):
+                assert client.get(f"/jobs/{job_id}").status_code == 200
+    finally:
+        app.config['COLLECT_WORKERS'] = 2
+
+    assert init.call_count == 1
+
+
+def test_collect_sync_mode_auth_required(client):
+    """Testa o modo síncrono pedindo credenciais em respostas 401."""
+    from unittest.mock import patch
+    app.config['COLLECT_ASYNC'] = False
+    try:
+        with patch("web_app.fetch_response", return_value=(401, b"Unauthorized", "text/plain", None)):
+            response = client.post("/collect", data={"url": "http://example.com/private"})
+    finally:
+        app.config['COLLECT_ASYNC'] = True
+
+    assert response.status_code == 401
+    assert response.get_json()["auth_required"] is True
+
+
+def test_collect_min_freshness_reuses_recent_record(client, temp_db):
+    """Testa que uma coleta recente da mesma URL é reutilizada sem novo fetch."""
+    from unittest.mock import patch
+    from web_app import run_collection
+    record_id = save_response_sqlite(url="http://example.com/fresh", status=200, body="x", db_path=temp_db)
+
+    with patch("web_app.fetch_response") as mock_fetch:
+        result = run_collection("http://example.com/fresh", db_path=temp_db, min_freshness=60)
+
+    mock_fetch.assert_not_called()
+    assert result["record_id"] == record_id
+    assert result["reused"] is True
+
+
+def test_fetch_hosts_reports_breaker_state(client):
+    """Testa que /fetch/hosts expõe o estado das políticas por host."""
+    from unittest.mock import patch, MagicMock
+    mock_response = MagicMock()
+    mock_response.status = 200
+    mock_response.headers = {}
+    mock_response.read.return_value = b"ok"
+    with patch("dns_cache.urlopen") as mock_urlopen:
+        mock_urlopen.return_value.__enter__.return_value = mock_response
+        from web_app import fetch_url
+        fetch_url("http://hosts.example.com/x")
+
+    data = client.get("/fetch/hosts").get_json()
+    assert data["hosts.example.com"]["state"] == "closed"
+    assert data["hosts.example.com"]["requests"] == 1
+
+
+def test_view_streams_large_json(client, temp_db, monkeypatch):
+    """Testa que JSON acima do limite é formatado em streaming no /view."""
+    import json_stream
+    import web_app
+
+    monkeypatch.setattr(json_stream, "STREAM_THRESHOLD", 10)
+    record_id = save_response_sqlite(url="http://example.com", status=200, body="{}",
+                                     json_obj={"items": [1, 2], "name": "<b>"}, db_path=temp_db)
+    web_app.clear_page_cache()
+
+    response = client.get(f"/view/{record_id}")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["ETag"]
+    assert "&#34;items&#34;: [\n    1,\n    2\n  ]" in response.get_data(as_text=True)
+    assert "&lt;b&gt;" in response.get_data(as_text=True)
+
+
+def test_api_stats_aggregates_recent_collections(client, temp_db):
+    """Testa que /api/stats agrega as coletas recentes a partir dos rollups."""
+    save_response_sqlite("http://example.com", 200, "ok", db_path=temp_db, elapsed_ms=20)
+    save_response_sqlite("http://example.com", 503, "erro", db_path=temp_db, elapsed_ms=40)
+
+    response = client.get("/api/stats?granularity=minute&hours=1")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["totals"]["count"] == 2
+    assert data["totals"]["error_rate"] == 0.5
+    assert data["totals"]["avg_elapsed_ms"] == 30.0
+    assert data["urls"][0]["url"] == "http://example.com"
+
+    assert client.get("/api/stats?granularity=week").status_code == 400
+    page = client.get("/stats")
+    assert page.status_code == 200
+    assert b"http://example.com" in page.data
+
+
+def test_rows_and_events_report_inserts_and_deletes(client, temp_db):
+    """Testa o JSON de linhas e o stream SSE de inserções e remoções."""
+    record_id = save_response_sqlite("http://example.com/a", 200, "ok", db_path=temp_db)
+
+    data = client.get("/rows?limit=10").get_json()
+    assert [r["id"] for r in data["rows"]] == [record_id]
+    assert data["last_event"] == 1
+
+    assert client.post(f"/delete/{record_id}").status_code == 200
+    response = client.get("/events?after=0", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    stream = iter(response.response)
+    text = ""
+    while "event: deleted" not in text:
+        chunk = next(stream)
+        text += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+    response.close()
+    assert "event: inserted" in text
+    assert f'"id": {record_id}' in text
+    assert "id: 2\n" in text
+
+
+def test_api_responses_projection_filters_and_cursor(client, temp_db):
+    """Testa projeção de campos, filtros, prévia do corpo e paginação por cursor."""
+    for i in range(5):
+        save_response_sqlite(f"http://example.com/{i}", 500 if i % 2 else 200, "corpo " + "x" * 500,
+                             json_obj={"n": i}, db_path=temp_db)
+
+    page = client.get("/api/responses?fields=id,url,json,body_preview&preview=8&limit=2").get_json()
+    assert [item["url"] for item in page["items"]] == ["http://example.com/4", "http://example.com/3"]
+    assert page["items"][0]["json"] == {"n": 4}
+    assert page["items"][0]["body_preview"] == "corpo xx"
+    assert set(page["items"][0]) == {"id", "url", "json", "body_preview"}
+
+    rest = client.get(f"/api/responses?limit=2&cursor={page['next_cursor']}").get_json()
+    assert [item["url"] for item in rest["items"]] == ["http://example.com/2", "http://example.com/1"]
+
+    errors = client.get("/api/responses?status=500&fields=url").get_json()
+    assert [item["url"] for item in errors["items"]] == ["http://example.com/3", "http://example.com/1"]
+    assert errors["next_cursor"] is None
+
+    assert client.get("/api/responses?fields=id,senha").status_code == 400
+
+
+def test_large_json_responses_are_gzipped(client, temp_db):
+    """Testa que respostas grandes saem com gzip só quando o cliente aceita."""
+    import gzip
+
+    for i in range(40):
+        save_response_sqlite(f"http://example.com/{i}", 200, "ok", db_path=temp_db)
+
+    plain = client.get("/api/responses")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    compressed = client.get("/api/responses", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data)
+
+
+def test_gzipped_view_gets_its_own_etag(client, temp_db):
+    """Testa que o /view comprimido tem ETag próprio e que ele também gera 304."""
+    record_id = save_response_sqlite("http://example.com/big", 200, "x" * 5000, db_path=temp_db)
+
+    plain = client.get(f"/view/{record_id}")
+    compressed = client.get(f"/view/{record_id}", headers={"Accept-Encoding": "gzip"})
+    plain_etag, gzip_etag = plain.headers["ETag"], compressed.headers["ETag"]
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip_etag == plain_etag[:-1] + '-gzip"'
+
+    revalidated = client.get(f"/view/{record_id}", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == gzip_etag
+    assert client.get(f"/view/{record_id}", headers={"If-None-Match": plain_etag}).status_code == 304
+
+
+def test_bodies_are_stored_as_bytes_and_decoded_lazily(client, temp_db):
+    """Testa corpos em bytes: texto decodificado pelo charset e binário intacto no /raw e no ZIP."""
+    import io
+    import json
+    import zipfile
+    png = b"\x89PNG\r\n\x1a\n\x00\xff\xfe"
+    image_id = save_response_sqlite(url="http://example.com/logo.png", status=200, body=png, db_path=temp_db,
+                                    content_type="image/png")
+    text_id = save_response_sqlite(url="http://example.com/pt", status=200, body="<p>café</p>".encode("latin-1"),
+                                   db_path=temp_db, content_type="text/html", charset="iso-8859-1")
+
+    conn = sqlite3.connect(temp_db)
+    stored = conn.execute("SELECT typeof(body), body FROM responses WHERE id = ?", (image_id,)).fetchone()
+    conn.close()
+    assert stored == ("blob", png)
+
+    assert "conteúdo binário, 11 bytes" in client.get(f"/view/{image_id}").data.decode()
+    assert "&lt;p&gt;café&lt;/p&gt;" in client.get(f"/view/{text_id}").data.decode()
+    raw = client.get(f"/raw/{image_id}")
+    assert (raw.data, raw.headers["Content-Type"]) == (png, "image/png")
+    assert client.get(f"/raw/{text_id}").headers["Content-Type"] == "text/html; charset=iso-8859-1"
+
+    items = client.get("/api/responses?fields=id,content_type,body_preview&preview=3").get_json()["items"]
+    assert items == [
+        {"id": text_id, "content_type": "text/html", "body_preview": "<p>"},
+        {"id": image_id, "content_type": "image/png", "body_preview": None},
+    ]
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get(f"/export/archive?ids={image_id},{text_id}").data))
+    manifest = [json.loads(line) for line in archive.read("manifest.ndjson").decode().splitlines()]
+    assert manifest[0]["raw_file"] == f"response_{image_id}.bin"
+    assert "raw_file" not in manifest[1]
+    assert archive.read(f"response_{image_id}.bin") == png
+
+
+def test_server_timing_slow_queries_and_admin_profile(client, temp_db, tmp_path, monkeypatch):
+    """Testa o Server-Timing por fase, o log de consultas lentas com plano e o cProfile restrito a admins."""
+    import pstats
+    import profiling
+
+    monkeypatch.setitem(app.config, "SERVER_TIMING", True)
+    monkeypatch.setitem(app.config, "SLOW_QUERY_MS", 1e-6)
+    monkeypatch.setitem(app.config, "ADMIN_TOKEN", "segredo")
+    monkeypatch.setitem(app.config, "PROFILE_DIR", str(tmp_path / "profiles"))
+    profiling.SLOW_QUERIES.clear()
+    record_id = save_response_sqlite(url="http://example.com", status=200, body="{}", json_obj={"a": 1},
+                                     db_path=temp_db)
+
+    view = client.get(f"/view/{record_id}")
+    phases = [part.split(";")[0] for part in view.headers["Server-Timing"].split(", ")]
+    assert phases == ["db", "json", "render", "total"]
+    assert 'desc="' in view.headers["Server-Timing"]
+
+    assert client.get("/admin/slow-queries").status_code == 403
+    assert client.get("/admin/slow-queries", headers={"X-Admin-Token": "errado"}).status_code == 403
+    slow = client.get("/admin/slow-queries", headers={"X-Admin-Token": "segredo"}).get_json()["queries"]
+    by_id = [q for q in slow if "FROM responses WHERE id = ?" in q["sql"]]
+    assert by_id and by_id[0]["expanded"].endswith(f"WHERE id = {record_id}")
+    assert any("PRIMARY KEY" in step for step in by_id[0]["plan"])
+
+    assert "X-Profile-Dump" not in client.get("/?profile=1").headers
+    profiled = client.get("/?profile=1", headers={"X-Admin-Token": "segredo"})
+    dump = tmp_path / "profiles" / profiled.headers["X-Profile-Dump"]
+    assert pstats.Stats(str(dump)).total_calls > 0
@@ -1,6 +1,4 @@
 import sqlite3
-# Biblioteca para manipular JSON (serializar / desserializar)
-import json
 # Biblioteca para tratar argumentos de linha de comando
 import argparse
 # Biblioteca para operações com caminhos e verificação de arquivos
@@ -8,6 +6,17 @@ import os
 # Biblioteca para exportar CSVs
 import csv
 
+# Armazenamento particionado por tempo (opcional)
+import partitions
+# Parser JSON incremental para documentos grandes
+import json_stream
+# Codec JSON (orjson quando disponível)
+import json_codec
+# Tipo de conteúdo e decodificação dos corpos gravados em bytes
+import content_types
+# Store de segmentos, onde ficam corpo e JSON com BODY_STORE=1
+import body_store
+
 # Caminho padrão do banco de dados: arquivo "responses.db" no mesmo diretório
 DEFAULT_DB = os.path.join(os.path.dirname(__file__), "responses.db")
 
@@ -18,10 +27,15 @@ def summarize_json(json_text: str) -> str:
     - Se for um dicionário, retorna as primeiras chaves.
     - Se for uma lista, retorna o tamanho.
     - Se não for JSON válido, retorna um marcador.
+
+    Textos a partir de `json_stream.STREAM_THRESHOLD` são resumidos pelo
+    parser incremental, sem montar o objeto inteiro.
     """
+    if len(json_text) >= json_stream.STREAM_THRESHOLD:
+        return summarize_json_stream(json_text)
     try:
         # Desserializa o texto JSON em um objeto Python
-        obj = json.loads(json_text)
+        obj = json_codec.loads(json_text)
         # Se for dict, mostra até 5 chaves como resumo
         if isinstance(obj, dict):
             keys = list(obj.keys())[:5]
@@ -36,6 +50,28 @@ def summarize_json(json_text: str) -> str:
         return "(invalid json)"
 
 
+def summarize_json_stream(json_text: str) -> str:
+    """Mesmo resumo de `summarize_json`, calculado em streaming."""
+    try:
+        summary = json_stream.summarize(json_stream.iter_events(json_stream.text_chunks(json_text)))
+    except json_stream.JSONStreamError:
+        return "(invalid json)"
+    if summary["type"] == "object":
+        return f"JSON keys: {summary['keys']}"
+    if summary["type"] == "array":
+        return f"JSON array, len={summary['length']}"
+    return str(type(summary["value"]))
+
+
+def extract_json_paths(json_text: str, paths: list[str]) -> dict:
+    """Extrai os valores de `paths` (ex.: "data.item.id") sem montar o JSON inteiro."""
+    try:
+        summary = json_stream.summarize(json_stream.iter_events(json_stream.text_chunks(json_text)), paths=paths)
+    except json_stream.JSONStreamError:
+        return {}
+    return summary["values"]
+
+
 def main():
     """Entrada principal do script: lista registros e opcionalmente exporta CSV."""
 
@@ -49,6 +85,12 @@ def main():
     p.add_argument("--export", help="Optional CSV path to export results")
     # Flag para imprimir o corpo das respostas (pode ser grande)
     p.add_argument("--show-body", action="store_true", help="Print body contents (may be large)")
+    # Caminhos de JSON a extrair de cada registro (pode repetir a opção)
+    p.add_argument("--json-path", action="append", default=[], metavar="PATH",
+                   help="Print the first value at this JSON path (e.g. data.item.id); repeatable")
+    # Modo de particionamento (padrão vem da variável PARTITION_MODE)
+    p.add_argument("--partition-mode", default=partitions.PARTITION_MODE, choices=["", "day", "month"],
+                   help="Also read time partitions next to --db")
     args = p.parse_args()
 
     # Verifica se o arquivo do DB existe antes de abrir
@@ -60,10 +102,19 @@ def main():
     conn = sqlite3.connect(args.db)
     cur = conn.cursor()
 
+    # Grupos de partições a consultar; sem particionamento, só o próprio banco
+    groups = [None]
+    if args.partition_mode:
+        groups = partitions.partition_groups(args.db, args.partition_mode, newest_first=True)
+
     # Obtém número total de registros da tabela (tratando erros)
     try:
-        cur.execute("SELECT count(*) FROM responses")
-        total = cur.fetchone()[0]
+        total = 0
+        for group in groups:
+            if group is not None:
+                partitions.scope(conn, group)
+            cur.execute("SELECT count(*) FROM responses")
+            total += cur.fetchone()[0]
     except sqlite3.Error as e:
         # Em caso de erro SQL, fecha conexão e termina
         print(f"DB error: {e}")
@@ -80,29 +131,62 @@ def main():
     print("Columns:", cols)
     print()
 
-    # Consulta as linhas mais recentes conforme o limite informado
-    cur.execute(
-        "SELECT id, url, status, timestamp, body, json FROM responses ORDER BY timestamp DESC LIMIT ?",
-        (args.limit,),
-    )
-
-    # Busca todos os resultados retornados pela query
-    rows = cur.fetchall()
+    # Bancos anteriores aos corpos em bytes não têm tipo de conteúdo, e os
+    # anteriores ao store de segmentos não têm a localização do corpo e do JSON
+    type_columns = "content_type, charset" if "content_type" in cols else "NULL, NULL"
+    body_location = "body_segment, body_offset, body_length" if "body_segment" in cols else "NULL, NULL, NULL"
+    json_location = "json_segment, json_offset, json_length" if "json_segment" in cols else "NULL, NULL, NULL"
+
+    # Consulta as linhas mais recentes conforme o limite informado, da
+    # partição mais nova para a mais antiga até completar o limite
+    rows = []
+    for group in groups:
+        if group is not None:
+            partitions.scope(conn, group)
+        cur.execute(
+            f"SELECT id, url, status, timestamp, body, json, {type_columns}, {body_location}, {json_location} "
+            f"FROM responses "
+            f"ORDER BY timestamp DESC LIMIT ?",
+            (args.limit - len(rows),),
+        )
+        # Busca todos os resultados retornados pela query
+        rows.extend(cur.fetchall())
+        if len(rows) >= args.limit:
+            break
 
     # Lista temporária com dicionários para exportação se pedido
     out_rows = []
     for r in rows:
         # Desempacota cada linha nas colunas conhecidas
-        id_, url, status, ts, body, json_text = r
+        id_, url, status, ts, raw, json_text, content_type, charset = r[:8]
+        body_segment, body_offset, body_length, json_segment, json_offset, json_length = r[8:]
+        # Corpo e JSON no store de segmentos: a linha só tem a localização
+        if json_segment is not None:
+            json_text = body_store.get_store(args.db).text(json_segment, json_offset, json_length)
+        body_size = body_length if body_segment is not None else len(raw or b'')
+        # Corpos textuais só são decodificados quando vão ser exibidos ou
+        # exportados; binários nunca
+        binary = not content_types.is_text(content_type)
+        body = None
+        if not binary and (args.show_body or args.export):
+            if body_segment is not None:
+                raw = body_store.get_store(args.db).view(body_segment, body_offset, body_length)
+            body = content_types.decode(raw, charset)
         # Formata uma linha compacta para visualização no console
         line = f"{id_:4d} | {ts} | {status or '-':3} | {url}"
         print(line)
         # Se houver JSON salvo, imprime um resumo do JSON
         if json_text:
             print("    ", summarize_json(json_text))
+            # Valores dos caminhos pedidos com --json-path
+            if args.json_path:
+                for path, value in extract_json_paths(json_text, args.json_path).items():
+                    print(f"     {path} = {json_codec.dumps(value)[:200]}")
         else:
             # Caso não haja JSON, opcionalmente mostra preview do body
-            if args.show_body and body:
+            if args.show_body and binary:
+                print(f"    body: {body_size} bytes ({content_type})")
+            elif args.show_body and body:
                 preview = body[:400].replace('\n', '\\n')
                 print("    body preview:", preview)
         # Acumula o registro para possível exportação em CSV
@@ -111,6 +195,7 @@ def main():
             "url": url,
             "status": status,
             "timestamp": ts,
+            "content_type": content_type,
             "body": body,
             "json": json_text,
         })
@@ -120,7 +205,7 @@ def main():
 
     # Se foi solicitado exportar, grava um CSV com os registros exibidos
     if args.export:
-        keys = ["id", "url", "status", "timestamp", "body", "json"]
+        keys = ["id", "url", "status", "timestamp", "content_type", "body", "json"]
         try:
             with open(args.export, "w", newline='', encoding="utf-8") as f:
                 writer = csv.DictWriter(f, fieldnames=keys)
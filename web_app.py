@@ -1,6 +1,6 @@
-from flask import Flask, render_template, g, request, Response, jsonify, current_app
+from flask import Flask, render_template, g, request, Response, jsonify, current_app, stream_with_context, stream_template
+from flask import before_render_template, template_rendered
 import sqlite3
-import json
 import base64
 import urllib.error
 import urllib.request
@@ -8,12 +8,87 @@ import datetime
 import os
 import io
 import csv
+import zipfile
+import gzip
+import hashlib
+import hmac
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+
+import collect_jobs
+import body_store
+import bulk_import
+import content_types
+import dns_cache
+import fetch_policy
+import json_codec
+import json_stream
+import live_events
+import partitions
+import profiling
+import rollups
+from colet_json_noautentic import json_text_for
 
 # Caminho para o arquivo SQLite que já existe no workspace
 DATABASE = os.path.join(os.path.dirname(__file__), 'responses.db')
 
 app = Flask(__name__)
 
+# Quantidade máxima de páginas renderizadas mantidas em memória (0 desativa)
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', 0))
+
+# Linhas removidas por transação no /delete/bulk; lotes pequenos liberam o
+# lock de escrita entre um lote e outro.
+app.config['DELETE_CHUNK_SIZE'] = int(os.environ.get('DELETE_CHUNK_SIZE', 1000))
+
+# Coletas assíncronas: o /collect só enfileira e os workers fazem o fetch.
+# COLLECT_WORKERS=0 desliga os workers internos (use `python collect_jobs.py`).
+app.config['COLLECT_ASYNC'] = os.environ.get('COLLECT_ASYNC', '1') != '0'
+app.config['COLLECT_WORKERS'] = int(os.environ.get('COLLECT_WORKERS', 2))
+
+# Se > 0, uma coleta reutiliza o último registro da mesma URL quando ele tem
+# menos de N segundos, sem ir ao site alvo.
+app.config['COLLECT_MIN_FRESHNESS'] = float(os.environ.get('COLLECT_MIN_FRESHNESS', 0))
+
+# Compressão gzip das respostas JSON/HTML não streamadas a partir de
+# GZIP_MIN_SIZE bytes (0 desliga)
+app.config['GZIP_MIN_SIZE'] = int(os.environ.get('GZIP_MIN_SIZE', 1024))
+app.config['GZIP_LEVEL'] = int(os.environ.get('GZIP_LEVEL', 6))
+
+# Intervalo, em segundos, dos keepalives enviados pelo /events quando não há
+# eventos
+app.config['LIVE_EVENTS_HEARTBEAT'] = float(os.environ.get('LIVE_EVENTS_HEARTBEAT', 15))
+
+# Instrumentação opcional (ver profiling.py): header Server-Timing com o tempo
+# de cada fase do request e log das consultas acima de SLOW_QUERY_MS com o
+# EXPLAIN QUERY PLAN (0 desliga). Com ADMIN_TOKEN definido, um request com
+# ?profile=1 e o header X-Admin-Token roda sob cProfile e grava o .pstats
+# em PROFILE_DIR.
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+
+# Registros nunca são alterados após o insert, então podem ser cacheados
+# indefinidamente por navegadores e proxies.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Cache LRU de páginas renderizadas: chave -> (corpo, etag, mimetype, headers).
+# É local a cada processo; com vários workers do gunicorn cada um tem o seu,
+# por isso cada acerto confere se o registro ainda existe no banco.
+_page_cache = OrderedDict()
+_page_cache_lock = threading.Lock()
+PAGE_CACHE_KINDS = ('view', 'export')
+
+# Colunas de um registro completo, incluindo a localização do corpo no store
+RECORD_COLUMNS = ('id, url, status, timestamp, body, json, body_segment, body_offset, body_length, '
+                  'json_segment, json_offset, json_length, content_type, charset')
+
+# Tamanho dos pedaços em que um corpo do store de segmentos é decodificado
+BODY_CHUNK_SIZE = 64 * 1024
+
 
 def init_sqlite(db_path: str = DATABASE) -> None:
     """Cria o arquivo de banco e a tabela necessária caso não existam."""
@@ -27,17 +102,46 @@ def init_sqlite(db_path: str = DATABASE) -> None:
             url TEXT NOT NULL,
             status INTEGER,
             timestamp TEXT NOT NULL,
-            body TEXT,
-            json TEXT
+            body BLOB,
+            json TEXT,
+            body_segment INTEGER,
+            body_offset INTEGER,
+            body_length INTEGER,
+            elapsed_ms REAL,
+            content_type TEXT,
+            charset TEXT,
+            json_segment INTEGER,
+            json_offset INTEGER,
+            json_length INTEGER
         );
         """
     )
+    # Bancos criados antes do store de segmentos, dos rollups e dos corpos em
+    # bytes não têm as colunas de localização do corpo e do JSON, de latência e de tipo
+    existing = {row[1] for row in cur.execute("PRAGMA table_info(responses)")}
+    for column, kind in (("body_segment", "INTEGER"), ("body_offset", "INTEGER"), ("body_length", "INTEGER"), ("elapsed_ms", "REAL"),
+                         ("content_type", "TEXT"), ("charset", "TEXT"),
+                         ("json_segment", "INTEGER"), ("json_offset", "INTEGER"), ("json_length", "INTEGER")):
+        if column not in existing:
+            cur.execute(f"ALTER TABLE responses ADD COLUMN {column} {kind}")
+    # Índice por timestamp: ordenação da listagem e filtros por idade
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_responses_timestamp ON responses (timestamp)")
+    # Rollups por URL/status/intervalo, mantidos por trigger a cada insert
+    rollups.init_rollups(cur)
+    # Feed de inserções/remoções lido pelo /events
+    live_events.init_events_table(cur)
     conn.commit()
     conn.close()
 
 
-def fetch_url(url: str, timeout: int = 10, username: str = None, password: str = None) -> tuple[int, str]:
-    """Busca uma URL via HTTP com autenticação básica opcional."""
+def fetch_response(url: str, timeout: float | None = None, username: str = None,
+                   password: str = None) -> tuple[int, bytes, str | None, str | None]:
+    """Busca uma URL via HTTP com autenticação básica opcional.
+
+    Retorna (status, corpo_bruto, content_type, charset) sem decodificar o
+    corpo. Passa pelas políticas por host de `fetch_policy` (limite de taxa,
+    circuit breaker e timeout adaptativo quando `timeout` é None).
+    """
     headers = {
         "User-Agent": "PythonAutomator/1.0",
         "Accept": "application/json, text/html;q=0.9, */*;q=0.8",
@@ -49,36 +153,72 @@ def fetch_url(url: str, timeout: int = 10, username: str = None, password: str =
         headers["Authorization"] = f"Basic {encoded_credentials}"
     
     request_obj = urllib.request.Request(url, headers=headers)
-    
-    try:
-        with urllib.request.urlopen(request_obj, timeout=timeout) as response:
-            status_code = response.status
-            body = response.read().decode("utf-8", errors="replace")
-            return status_code, body
-    except urllib.error.HTTPError as e:
-        # Captura erros HTTP (ex: 401, 404, 500) e retorna o status
-        status_code = e.code
-        body = e.read().decode("utf-8", errors="replace")
-        return status_code, body
-
-
-def save_response_sqlite(url: str, status: int, body: str, json_obj: dict | None = None, db_path: str = None) -> None:
-    """Insere resposta no banco de dados."""
+
+    def do_request(effective_timeout: float) -> tuple[int, bytes, str | None, str | None]:
+        try:
+            with dns_cache.urlopen(request_obj, timeout=effective_timeout) as response:
+                status_code = response.status
+                body = response.read()
+                response_headers = response.headers
+        except urllib.error.HTTPError as e:
+            # Captura erros HTTP (ex: 401, 404, 500) e retorna o status
+            status_code = e.code
+            body = e.read()
+            response_headers = e.headers
+        content_type, charset = content_types.parse_content_type(response_headers.get("Content-Type"))
+        return status_code, body, content_type, charset
+
+    return fetch_policy.DEFAULT_POLICY.call(url, do_request, timeout=timeout)
+
+
+def fetch_url(url: str, timeout: float | None = None, username: str = None, password: str = None) -> tuple[int, str]:
+    """Como `fetch_response`, mas retorna (status, corpo_texto) decodificado pelo charset."""
+    status, body, _, charset = fetch_response(url, timeout=timeout, username=username, password=password)
+    return status, content_types.decode(body, charset)
+
+
+def save_response_sqlite(url: str, status: int, body: str | bytes, json_obj: dict | None = None, db_path: str = None,
+                         json_text: str | None = None, elapsed_ms: float | None = None,
+                         content_type: str | None = None, charset: str | None = None) -> int:
+    """Insere resposta no banco de dados e retorna o id do novo registro.
+
+    `body` pode vir em bytes (gravado como BLOB, com `content_type` e
+    `charset` para decodificar na exibição) ou como texto. `json_text`
+    permite passar o JSON já serializado (ex.: por `json_stream.normalize`)
+    no lugar de `json_obj`. `elapsed_ms` é a duração da requisição, usada
+    nos rollups de latência.
+    """
     if db_path is None:
         db_path = DATABASE
     
-    json_text = None
     if json_obj is not None:
-        json_text = json.dumps(json_obj, ensure_ascii=False)
+        json_text = json_codec.dumps(json_obj)
     
+    timestamp = datetime.datetime.utcnow().isoformat()
+    if partitions.PARTITION_MODE:
+        return partitions.save_response(db_path, partitions.PARTITION_MODE, url, status, timestamp, body, json_text,
+                                        elapsed_ms=elapsed_ms, content_type=content_type, charset=charset)
+
+    body, segment, offset, length = body_store.prepare_body(db_path, body)
+    json_text, json_segment, json_offset, json_length = body_store.prepare_json(db_path, json_text)
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
     cur.execute(
-        "INSERT INTO responses (url, status, timestamp, body, json) VALUES (?, ?, ?, ?, ?)",
-        (url, status, datetime.datetime.utcnow().isoformat(), body, json_text),
+        "INSERT INTO responses (url, status, timestamp, body, json, body_segment, body_offset, body_length, elapsed_ms, "
+        "content_type, charset, json_segment, json_offset, json_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (url, status, timestamp, body, json_text, segment, offset, length, elapsed_ms, content_type, charset,
+         json_segment, json_offset, json_length),
     )
+    record_id = cur.lastrowid
+    live_events.publish(conn, live_events.INSERTED, [(record_id, url, status, timestamp)])
     conn.commit()
     conn.close()
+    live_events.notify(db_path)
+    return record_id
+
+
+# Bancos já inicializados por este processo
+_initialized_dbs = set()
 
 
 def get_db():
@@ -90,160 +230,1173 @@ def get_db():
     # Obtém o caminho do banco da config ou usa o padrão
     db_path = current_app.config.get('DATABASE', DATABASE)
     
-    # Garante que o banco de dados foi inicializado
-    if not os.path.exists(db_path):
+    # Garante que o banco de dados foi inicializado (e migrado) uma vez por processo
+    if db_path not in _initialized_dbs or not os.path.exists(db_path):
         init_sqlite(db_path)
+        _initialized_dbs.add(db_path)
     
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(db_path)
+        if g.get('_timings') is not None:
+            # Request instrumentado: conexão que mede cada consulta
+            db = g._database = sqlite3.connect(db_path, factory=profiling.ProfiledConnection)
+            db.slow_ms = current_app.config.get('SLOW_QUERY_MS', 0)
+        else:
+            db = g._database = sqlite3.connect(db_path)
         db.row_factory = sqlite3.Row
     return db
 
 
+def is_admin() -> bool:
+    """Se o request traz o `X-Admin-Token` configurado em ADMIN_TOKEN."""
+    token = current_app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+@contextlib.contextmanager
+def timed_phase(name: str):
+    """Soma a duração do bloco na fase `name` do Server-Timing (se o request for instrumentado)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - started)
+
+
+def add_phase(name: str, seconds: float) -> None:
+    timings = g.get('_timings')
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def record_etag(row) -> str:
+    """Gera um ETag forte a partir do id, do timestamp e dos tamanhos do corpo e do JSON.
+
+    Registros não mudam após o insert, então esses campos bastam para
+    identificar a versão sem ler o conteúdo. A localização no store de
+    segmentos fica de fora: a compactação move o corpo sem alterá-lo.
+    """
+    body_length = row['body_length'] if row['body_segment'] is not None else len(row['body'] or b'')
+    json_length = row['json_length'] if row['json_segment'] is not None else len(row['json'] or '')
+    digest = hashlib.sha256(f"{row['timestamp']}\0{body_length}\0{json_length}".encode('utf-8'))
+    return f"{row['id']}-{digest.hexdigest()[:16]}"
+
+
+def _page_cache_key(kind: str, record_id: int) -> tuple:
+    return (current_app.config.get('DATABASE', DATABASE), kind, record_id)
+
+
+def page_cache_get(kind: str, record_id: int):
+    """Retorna a página cacheada de um registro ou None.
+
+    O cache é local ao processo, então um /delete atendido por outro worker
+    não o invalida aqui. Antes de servir a página confere se o registro
+    ainda existe (ids nunca são reaproveitados, por causa do AUTOINCREMENT).
+    """
+    if current_app.config.get('PAGE_CACHE_SIZE', 0) <= 0:
+        return None
+    key = _page_cache_key(kind, record_id)
+    with _page_cache_lock:
+        entry = _page_cache.get(key)
+        if entry is not None:
+            _page_cache.move_to_end(key)
+    if entry is not None and fetch_record(record_id, 'id') is None:
+        page_cache_invalidate(record_id)
+        return None
+    return entry
+
+
+def page_cache_put(kind: str, record_id: int, entry: tuple) -> None:
+    """Guarda uma página renderizada, descartando as menos usadas."""
+    max_size = current_app.config.get('PAGE_CACHE_SIZE', 0)
+    if max_size <= 0:
+        return
+    key = _page_cache_key(kind, record_id)
+    with _page_cache_lock:
+        _page_cache[key] = entry
+        _page_cache.move_to_end(key)
+        while len(_page_cache) > max_size:
+            _page_cache.popitem(last=False)
+
+
+def page_cache_invalidate(record_id: int) -> None:
+    """Remove do cache todas as páginas de um registro (usado no /delete)."""
+    with _page_cache_lock:
+        for kind in PAGE_CACHE_KINDS:
+            _page_cache.pop(_page_cache_key(kind, record_id), None)
+
+
+def clear_page_cache() -> None:
+    """Esvazia o cache de páginas renderizadas."""
+    with _page_cache_lock:
+        _page_cache.clear()
+
+
+def matching_etag(etag: str) -> str | None:
+    """Devolve a variante do ETag (sem compressão ou gzip) citada no If-None-Match, ou None."""
+    for candidate in (etag, etag + GZIP_ETAG_SUFFIX):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def immutable_response(body, etag: str, mimetype: str, headers: dict | None = None) -> Response:
+    """Monta a resposta de um registro com ETag e Cache-Control imutável.
+
+    Responde 304 quando o cliente já possui a mesma versão (If-None-Match),
+    comprimida ou não.
+    """
+    matched = matching_etag(etag)
+    if matched:
+        return not_modified(matched)
+    if ';' in mimetype:
+        # Já traz parâmetros (charset): usa como está, sem o charset padrão do Flask
+        resp = Response(body, content_type=mimetype, headers=headers)
+    else:
+        resp = Response(body, mimetype=mimetype, headers=headers)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return resp.make_conditional(request)
+
+
+def not_modified(etag: str) -> Response:
+    """Resposta 304 sem corpo, usada antes de formatar JSON ou renderizar HTML."""
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return resp
+
+
+def scoped(db, since: str = None, until: str = None, ids=None, newest_first: bool = False):
+    """Itera sobre `db` apontando `responses` para cada grupo de partições relevante.
+
+    Sem particionamento, devolve a própria conexão uma única vez. Com
+    particionamento, anexa as partições que podem conter linhas no intervalo
+    [since, until) ou com os `ids` informados, em grupos que respeitam o
+    limite de ATTACH do SQLite.
+    """
+    if not partitions.PARTITION_MODE:
+        yield db
+        return
+    db_path = current_app.config.get('DATABASE', DATABASE)
+    for group in partitions.partition_groups(db_path, partitions.PARTITION_MODE, since=since, until=until,
+                                             ids=ids, newest_first=newest_first):
+        partitions.scope(db, group)
+        yield db
+
+
+def raw_body(row) -> memoryview:
+    """Bytes do corpo como foram recebidos, sem cópia (memoryview da linha ou do mmap).
+
+    Corpos antigos, gravados como texto, saem codificados em UTF-8.
+    """
+    if row['body_segment'] is not None:
+        return body_store.get_store(current_app.config.get('DATABASE', DATABASE)).view(
+            row['body_segment'], row['body_offset'], row['body_length'])
+    body = row['body'] or b''
+    return memoryview(body.encode('utf-8') if isinstance(body, str) else body)
+
+
+def record_json(row) -> str | None:
+    """Cópia normalizada do JSON de um registro, da linha ou do store de segmentos."""
+    if row['json_segment'] is not None:
+        return body_store.get_store(current_app.config.get('DATABASE', DATABASE)).text(
+            row['json_segment'], row['json_offset'], row['json_length'])
+    return row['json']
+
+
+def body_chunks(row, chunk_size: int = BODY_CHUNK_SIZE):
+    """Itera sobre o corpo textual de um registro em pedaços de texto.
+
+    Texto guardado na linha sai de uma vez; bytes (na linha ou no store de
+    segmentos) são decodificados aos poucos com o charset da resposta, sem
+    montar a string inteira em memória. Corpos binários não geram texto.
+    """
+    if not content_types.is_text(row['content_type']):
+        return
+    if row['body_segment'] is None and isinstance(row['body'], str):
+        if row['body']:
+            yield row['body']
+        return
+    view = raw_body(row)
+    decoder = content_types.incremental_decoder(row['charset'])
+    for start in range(0, len(view), chunk_size):
+        text = decoder.decode(view[start:start + chunk_size])
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def export_context(row, raw_file: str = None) -> dict:
+    """Variáveis do `export.html` para um registro (corpo em texto ou aviso de binário)."""
+    return {
+        'row': row,
+        'body_chunks': body_chunks(row),
+        'binary': not content_types.is_text(row['content_type']),
+        'body_size': len(raw_body(row)),
+        'raw_file': raw_file,
+    }
+
+
+def body_preview(row, limit: int = 1000) -> str | None:
+    """Primeiros `limit` caracteres do corpo, lendo do store só o necessário.
+
+    Retorna None para corpos binários.
+    """
+    if not content_types.is_text(row['content_type']):
+        return None
+    parts = []
+    size = 0
+    for chunk in body_chunks(row, chunk_size=limit * 4):
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            break
+    return ''.join(parts)[:limit]
+
+
+def fetch_record(record_id: int, columns: str = RECORD_COLUMNS):
+    """Busca um registro pelo id, consultando só a partição que pode contê-lo."""
+    for db in scoped(get_db(), ids=[record_id]):
+        row = db.execute(f'SELECT {columns} FROM responses WHERE id = ?', (record_id,)).fetchone()
+        if row is not None:
+            return row
+    return None
+
+
+@app.before_request
+def start_instrumentation():
+    """Liga a medição por fases e, para admins com ?profile=1, o cProfile do request."""
+    config = current_app.config
+    profile = request.args.get('profile') == '1' and is_admin()
+    if not (config.get('SERVER_TIMING') or config.get('SLOW_QUERY_MS', 0) > 0 or profile):
+        return
+    g._timings = {}
+    g._request_started = time.perf_counter()
+    if profile:
+        try:
+            g._profile = profiling.start_profile()
+        except ValueError:
+            # Outro request já está sob o profiler (só um por vez por processo)
+            pass
+
+
+def _template_started(sender, template, context, **extra):
+    if g.get('_timings') is not None:
+        g._render_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    started = g.pop('_render_started', None)
+    if started is not None:
+        add_phase('render', time.perf_counter() - started)
+
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+
+
+# Registrado antes do gzip_response, roda depois dele: o total inclui a compressão
+@app.after_request
+def finish_instrumentation(response):
+    """Adiciona o header Server-Timing e grava o .pstats do request perfilado.
+
+    Em respostas em stream os tempos cobrem só até o início do envio.
+    """
+    timings = g.get('_timings')
+    if timings is None:
+        return response
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        label = f"{request.endpoint or 'request'}-{request.path}"
+        response.headers['X-Profile-Dump'] = profiling.dump_profile(profile, current_app.config['PROFILE_DIR'], label)
+    if current_app.config.get('SERVER_TIMING'):
+        phases = {}
+        db = g.get('_database')
+        if isinstance(db, profiling.ProfiledConnection):
+            db.finish()
+            phases['db'] = (db.seconds, f'{db.queries} queries')
+        for name in sorted(timings):
+            phases[name] = (timings[name], None)
+        phases['total'] = (time.perf_counter() - g._request_started, None)
+        response.headers['Server-Timing'] = profiling.server_timing(phases)
+    return response
+
+
+# Tipos comprimidos pelo gzip_response; os demais (zip, imagens) já vêm comprimidos
+GZIP_MIMETYPES = ('application/json', 'text/html', 'text/csv', 'text/plain')
+
+# Sufixo do ETag forte de uma resposta comprimida: os bytes enviados são
+# outros, então a representação gzip não pode repetir o ETag da original.
+GZIP_ETAG_SUFFIX = '-gzip'
+
+
+@app.after_request
+def gzip_response(response):
+    """Comprime com gzip respostas grandes de JSON e HTML quando o cliente aceita.
+
+    Respostas em stream (SSE, exportações grandes, arquivo zip) passam
+    intactas: comprimi-las exigiria montar o corpo inteiro em memória.
+    """
+    min_size = current_app.config.get('GZIP_MIN_SIZE', 0)
+    if (min_size <= 0 or response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in GZIP_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=current_app.config.get('GZIP_LEVEL', 6), mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag + GZIP_ETAG_SUFFIX)
+    return response
+
+
 @app.teardown_appcontext
 def close_connection(exception):
     """Fecha a conexão SQLite no final do contexto da aplicação (request)."""
     db = getattr(g, '_database', None)
     if db is not None:
+        if isinstance(db, profiling.ProfiledConnection):
+            # Consultas ainda abertas entram no log de lentas antes de fechar
+            db.finish()
         db.close()
 
 
+def recent_rows(limit: int) -> list:
+    """Resumo (id, url, status, timestamp) dos `limit` registros mais recentes."""
+    rows = []
+    # As partições são percorridas da mais nova para a mais antiga até completar o limite
+    for db in scoped(get_db(), newest_first=True):
+        cur = db.execute('SELECT id, url, status, timestamp FROM responses ORDER BY timestamp DESC LIMIT ?', (limit - len(rows),))
+        rows.extend(cur.fetchall())
+        if len(rows) >= limit:
+            break
+    return rows
+
+
 @app.route('/')
 def index():
     """Página principal: lista registros recentes com link para detalhes."""
     limit = int(request.args.get('limit', 50))
-    cur = get_db().execute('SELECT id, url, status, timestamp FROM responses ORDER BY timestamp DESC LIMIT ?', (limit,))
-    rows = cur.fetchall()
-    return render_template('index.html', rows=rows)
+    # O número do último evento é lido antes das linhas: o que mudar entre as
+    # duas leituras chega de novo pelo /events e é aplicado sem duplicar
+    last_event = live_events.last_seq(get_db())
+    return render_template('index.html', rows=recent_rows(limit), limit=limit, last_event=last_event)
+
+
+@app.route('/rows')
+def rows_json():
+    """As mesmas linhas do índice em JSON, para atualizar a tabela sem recarregar."""
+    limit = int(request.args.get('limit', 50))
+    last_event = live_events.last_seq(get_db())
+    return jsonify({'rows': [dict(r) for r in recent_rows(limit)], 'last_event': last_event})
+
+
+@app.route('/events')
+def events():
+    """Stream SSE com os resumos dos registros inseridos e apagados.
+
+    Retoma a partir do `Last-Event-ID` (reconexão automática do navegador)
+    ou de `?after=`; sem nenhum dos dois, envia só os eventos novos.
+    """
+    db_path = current_app.config.get('DATABASE', DATABASE)
+    get_db()
+    after = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Last-Event-ID inválido'}), 400
+    hub = live_events.get_hub(db_path)
+    sub = hub.subscribe(after)
+    heartbeat = current_app.config.get('LIVE_EVENTS_HEARTBEAT', 15)
+
+    def generate():
+        try:
+            yield f'retry: 3000\nid: {sub.after}\n\n'
+            while True:
+                batch = sub.get(heartbeat)
+                if not batch:
+                    # Comentário SSE: mantém a conexão viva em proxies
+                    yield ': keepalive\n\n'
+                    continue
+                yield ''.join(
+                    f"id: {event['seq']}\nevent: {event['kind']}\ndata: {json_codec.dumps(event)}\n\n"
+                    for event in batch
+                )
+        finally:
+            hub.unsubscribe(sub)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/view/<int:record_id>')
 def view(record_id):
     """Mostra detalhes de um registro, incluindo JSON formatado quando presente."""
-    cur = get_db().execute('SELECT * FROM responses WHERE id = ?', (record_id,))
-    row = cur.fetchone()
+    cached = page_cache_get('view', record_id)
+    if cached is not None:
+        return immutable_response(*cached)
+
+    row = fetch_record(record_id)
     if not row:
         return 'Registro não encontrado', 404
 
+    etag = record_etag(row)
+    matched = matching_etag(etag)
+    if matched:
+        return not_modified(matched)
+
+    json_text = record_json(row)
+    if json_text and len(json_text) >= json_stream.STREAM_THRESHOLD:
+        # JSON grande: formata e envia em pedaços, sem passar pelo cache de páginas
+        html = stream_template('view.html', row=row, pretty_json=pretty_json_chunks(json_text),
+                               body_preview=body_preview(row), body_size=len(raw_body(row)))
+        return immutable_response(html, etag, 'text/html')
+
     pretty_json = None
-    if row['json']:
-        try:
-            obj = json.loads(row['json'])
-            pretty_json = json.dumps(obj, indent=2, ensure_ascii=False)
-        except Exception:
-            pretty_json = '(JSON inválido)'
+    if json_text:
+        with timed_phase('json'):
+            try:
+                obj = json_codec.loads(json_text)
+                pretty_json = [json_codec.dumps(obj, indent=2)]
+            except Exception:
+                pretty_json = ['(JSON inválido)']
+
+    entry = (render_template('view.html', row=row, pretty_json=pretty_json, body_preview=body_preview(row),
+                             body_size=len(raw_body(row))),
+             etag, 'text/html', None)
+    page_cache_put('view', record_id, entry)
+    return immutable_response(*entry)
+
+
+def pretty_json_chunks(json_text: str):
+    """Formata um JSON grande com indent=2 em pedaços, via parser incremental."""
+    try:
+        yield from json_stream.dump_chunks(json_stream.iter_events(json_stream.text_chunks(json_text)), indent=2)
+    except json_stream.JSONStreamError:
+        # Parte do documento pode já ter sido enviada; o aviso vai ao final
+        yield '\n(JSON inválido)'
+
+
+def get_export_template():
+    """Retorna o template de exportação já compilado (o Jinja mantém em cache)."""
+    return current_app.jinja_env.get_template('export.html')
+
+
+def parse_record_filter(params, required: bool = True) -> tuple[str, list]:
+    """Converte parâmetros da requisição em uma cláusula WHERE e seus valores.
+
+    Aceita `ids` (lista separada por vírgulas), `url`, `status`, `since` e
+    `until` (timestamps ISO) e `older_than` (idade mínima em dias). Lança
+    ValueError para valores inválidos ou, com `required`, quando nenhum
+    critério foi informado (sem `required`, o filtro vazio vira `1`).
+    Os ids vão como um único parâmetro JSON (`json_each`), então a lista
+    não esbarra no limite de variáveis do SQLite.
+    """
+    clauses, values = [], []
+    ids = params.get('ids', '').strip()
+    if ids:
+        id_list = [int(i) for i in ids.split(',') if i.strip()]
+        if not id_list:
+            raise ValueError('lista de ids vazia')
+        clauses.append('id IN (SELECT value FROM json_each(?))')
+        values.append(json_codec.dumps(id_list))
+    if params.get('url'):
+        clauses.append('url = ?')
+        values.append(params['url'])
+    if params.get('status'):
+        clauses.append('status = ?')
+        values.append(int(params['status']))
+    if params.get('since'):
+        clauses.append('timestamp >= ?')
+        values.append(datetime.datetime.fromisoformat(params['since']).isoformat())
+    if params.get('until'):
+        clauses.append('timestamp < ?')
+        values.append(datetime.datetime.fromisoformat(params['until']).isoformat())
+    if params.get('older_than'):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=float(params['older_than']))
+        clauses.append('timestamp < ?')
+        values.append(cutoff.isoformat())
+    if not clauses:
+        if not required:
+            return '1', []
+        raise ValueError('Informe ids ou ao menos um filtro (url, status, since, until, older_than)')
+    return ' AND '.join(clauses), values
+
+
+def filter_scope(params) -> dict:
+    """Extrai de um filtro já validado o intervalo de tempo e os ids, para podar partições."""
+    scope = {}
+    ids = params.get('ids', '').strip()
+    if ids:
+        scope['ids'] = [int(i) for i in ids.split(',') if i.strip()]
+    if params.get('since'):
+        scope['since'] = datetime.datetime.fromisoformat(params['since']).isoformat()
+    until = []
+    if params.get('until'):
+        until.append(datetime.datetime.fromisoformat(params['until']).isoformat())
+    if params.get('older_than'):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=float(params['older_than']))
+        until.append(cutoff.isoformat())
+    if until:
+        scope['until'] = min(until)
+    return scope
+
+
+class _ZipStream:
+    """Destino de escrita não pesquisável para o `zipfile`.
+
+    Acumula os bytes escritos até que o gerador os retire com `drain()`,
+    o que mantém o uso de memória limitado a um registro por vez.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
 
-    return render_template('view.html', row=row, pretty_json=pretty_json)
+def raw_file_name(row) -> str | None:
+    """Nome do arquivo com o corpo original no ZIP (só para corpos binários)."""
+    if content_types.is_text(row['content_type']):
+        return None
+    return f"response_{row['id']}.bin"
+
+
+def generate_archive(where: str, values: list, scope: dict = None, batch_size: int = 200):
+    """Gera os bytes de um ZIP com um HTML por registro e um manifesto NDJSON.
+
+    O manifesto é escrito primeiro, a partir de uma consulta só com os
+    metadados; depois os registros são lidos em lotes e cada HTML é
+    comprimido e enviado antes de ler o próximo. Corpos binários vão também
+    intactos, como `response_<id>.bin`.
+    """
+    scope = scope or {}
+    template = get_export_template()
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('manifest.ndjson', 'w', force_zip64=True) as manifest:
+            for db in scoped(get_db(), **scope):
+                cur = db.execute(f'SELECT id, url, status, timestamp, content_type FROM responses WHERE {where} ORDER BY id',
+                                 values)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        entry = {
+                            'id': row['id'],
+                            'url': row['url'],
+                            'status': row['status'],
+                            'timestamp': row['timestamp'],
+                            'content_type': row['content_type'],
+                            'file': f"response_{row['id']}.html",
+                        }
+                        if raw_file_name(row):
+                            entry['raw_file'] = raw_file_name(row)
+                        manifest.write((json_codec.dumps(entry) + '\n').encode('utf-8'))
+                    yield sink.drain()
+
+        for db in scoped(get_db(), **scope):
+            cur = db.execute(f'SELECT {RECORD_COLUMNS} FROM responses WHERE {where} ORDER BY id', values)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    # O HTML é gerado em pedaços, então corpos grandes do store
+                    # nunca ficam inteiros em memória
+                    with archive.open(f"response_{row['id']}.html", 'w', force_zip64=True) as entry:
+                        for piece in template.generate(**export_context(row, raw_file_name(row))):
+                            entry.write(piece.encode('utf-8'))
+                    yield sink.drain()
+                    if raw_file_name(row):
+                        view = raw_body(row)
+                        with archive.open(raw_file_name(row), 'w', force_zip64=True) as entry:
+                            for start in range(0, len(view), BODY_CHUNK_SIZE):
+                                entry.write(view[start:start + BODY_CHUNK_SIZE])
+                                yield sink.drain()
+    yield sink.drain()
+
+
+@app.route('/export/archive', methods=['GET', 'POST'])
+def export_archive():
+    """Exporta vários registros como um ZIP transmitido em streaming."""
+    try:
+        where, values = parse_record_filter(request.values)
+    except ValueError as exc:
+        return jsonify({'success': False, 'message': f'Filtro inválido: {exc}'}), 400
+
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    return Response(
+        stream_with_context(generate_archive(where, values, filter_scope(request.values))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=responses_{stamp}.zip'},
+    )
 
 
 @app.route('/export/<int:record_id>')
 def export(record_id):
     """Exporta um registro individual como HTML e retorna como download."""
-    cur = get_db().execute('SELECT id, url, status, timestamp, body, json FROM responses WHERE id = ?', (record_id,))
-    row = cur.fetchone()
+    cached = page_cache_get('export', record_id)
+    if cached is not None:
+        return immutable_response(*cached)
+
+    row = fetch_record(record_id)
     
     if not row:
         return 'Registro não encontrado', 404
 
-    html = """<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>Registro """ + str(row['id']) + """ - Responses</title>
-  <style>
-    body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
-    h1 { color: #333; }
-    .container { background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-    .info { margin: 15px 0; }
-    .label { font-weight: bold; color: #555; }
-    .status-200 { color: #22863a; font-weight: bold; }
-    .status-error { color: #cb2431; font-weight: bold; }
-    .body-content { background: #f6f8fa; padding: 15px; border-radius: 4px; overflow-x: auto; white-space: pre-wrap; word-wrap: break-word; font-family: monospace; font-size: 0.85em; margin-top: 10px; }
-    a { color: #2563eb; text-decoration: none; }
-    a:hover { text-decoration: underline; }
-  </style>
-</head>
-<body>
-  <div class="container">
-    <h1>Registro #""" + str(row['id']) + """</h1>
-    
-    <div class="info">
-      <span class="label">Timestamp:</span> """ + str(row['timestamp']) + """
-    </div>
-    
-    <div class="info">
-      <span class="label">Status:</span> 
-      <span class=\"""" + ('status-200' if row['status'] == 200 else 'status-error') + """\">""" + str(row['status']) + """</span>
-    </div>
-    
-    <div class="info">
-      <span class="label">URL:</span> 
-      <a href=\"""" + str(row['url']) + """\" target="_blank">""" + str(row['url']) + """</a>
-    </div>
-    
-    <div class="info">
-      <span class="label">Body:</span>
-      <div class="body-content">""" + (row['body'].replace('<', '&lt;').replace('>', '&gt;') if row['body'] else '(vazio)') + """</div>
-    </div>
-  </div>
-</body>
-</html>"""
+    etag = record_etag(row)
+    matched = matching_etag(etag)
+    if matched:
+        return not_modified(matched)
+
+    headers = {'Content-Disposition': f'attachment; filename=response_{record_id}.html'}
+    template = get_export_template()
+    if row['body_segment'] is not None:
+        # Corpo no store de segmentos: transmite o HTML sem passar pelo cache de páginas
+        html = stream_with_context(template.generate(**export_context(row)))
+        return immutable_response(html, etag, 'text/html; charset=utf-8', headers)
+
+    html = template.render(**export_context(row))
     
-    return Response(html, mimetype='text/html; charset=utf-8', headers={'Content-Disposition': f'attachment; filename=response_{record_id}.html'})
+    entry = (html, etag, 'text/html; charset=utf-8', headers)
+    page_cache_put('export', record_id, entry)
+    return immutable_response(*entry)
+
+
+@app.route('/raw/<int:record_id>')
+def raw(record_id):
+    """Devolve o corpo exatamente como foi recebido, com o Content-Type original.
+
+    Nada é decodificado: corpos na linha saem como vieram do SQLite e
+    corpos do store de segmentos são transmitidos em pedaços do mmap.
+    """
+    row = fetch_record(record_id)
+    if not row:
+        return 'Registro não encontrado', 404
+
+    etag = record_etag(row)
+    matched = matching_etag(etag)
+    if matched:
+        return not_modified(matched)
+
+    mimetype = content_types.media_type(row['content_type'], row['charset'])
+    if row['content_type'] is None and isinstance(row['body'], str):
+        # Registro antigo, gravado como texto
+        mimetype = 'text/plain; charset=utf-8'
+    headers = {'Content-Disposition': f'attachment; filename=response_{record_id}.bin'}
+    if row['body_segment'] is None:
+        body = row['body'] or b''
+        return immutable_response(body.encode('utf-8') if isinstance(body, str) else body, etag, mimetype, headers)
+
+    # O gerador só usa o memoryview do mmap, não precisa do contexto do request
+    view = raw_body(row)
+    chunks = (bytes(view[start:start + BODY_CHUNK_SIZE]) for start in range(0, len(view), BODY_CHUNK_SIZE))
+    headers['Content-Length'] = str(len(view))
+    return immutable_response(chunks, etag, mimetype, headers)
 
 
 @app.route('/delete/<int:record_id>', methods=['POST'])
 def delete(record_id):
     """Deleta um registro do banco de dados."""
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM responses WHERE id = ?', (record_id,))
-        conn.commit()
+        for conn in scoped(get_db(), ids=[record_id]):
+            delete_ids(conn, [record_id])
+            conn.commit()
+        page_cache_invalidate(record_id)
+        live_events.notify(current_app.config.get('DATABASE', DATABASE))
+        if body_store.BODY_STORE:
+            body_store.schedule_compaction(current_app.config.get('DATABASE', DATABASE))
         return jsonify({'success': True, 'message': f'Registro {record_id} deletado com sucesso'}), 200
     except Exception as exc:
         return jsonify({'success': False, 'message': f'Erro ao deletar: {str(exc)}'}), 500
 
 
+def delete_ids(conn, ids: list[int]) -> None:
+    """Apaga os registros com os ids dados (em todas as partições do escopo atual).
+
+    Os resumos dos registros apagados vão para o feed do /events na mesma
+    transação.
+    """
+    # Um único parâmetro (array JSON) em vez de um por id: lotes de qualquer
+    # tamanho ficam abaixo do limite de variáveis do SQLite
+    id_list = json_codec.dumps(list(ids))
+    live_events.publish(conn, live_events.DELETED,
+                        conn.execute('SELECT id, url, status, timestamp FROM responses '
+                                     'WHERE id IN (SELECT value FROM json_each(?))', (id_list,)))
+    if body_store.BODY_STORE:
+        body_store.record_deleted(conn, ids)
+    if partitions.PARTITION_MODE:
+        partitions.delete_ids(conn, ids)
+    else:
+        conn.execute("DELETE FROM responses WHERE id IN (SELECT value FROM json_each(?))", (id_list,))
+
+
+def delete_in_chunks(conn, where: str, values: list, chunk_size: int) -> int:
+    """Apaga as linhas que satisfazem `where` em transações de até `chunk_size`.
+
+    Cada lote é selecionado, apagado e confirmado separadamente, de modo
+    que o lock de escrita nunca fica preso durante a varredura inteira. A
+    busca de cada lote continua do último id apagado, sem revarrer o começo
+    da tabela. Retorna o total de linhas removidas.
+    """
+    total = 0
+    last_id = -1
+    while True:
+        ids = [r[0] for r in conn.execute(f'SELECT id FROM responses WHERE ({where}) AND id > ? ORDER BY id LIMIT ?',
+                                          (*values, last_id, chunk_size))]
+        if not ids:
+            break
+        last_id = ids[-1]
+        with conn:
+            delete_ids(conn, ids)
+        for record_id in ids:
+            page_cache_invalidate(record_id)
+        total += len(ids)
+    return total
+
+
+@app.route('/delete/bulk', methods=['POST'])
+def delete_bulk():
+    """Deleta vários registros por lista de ids ou por filtros."""
+    params = dict(request.values)
+    params.update(request.get_json(silent=True) or {})
+    if isinstance(params.get('ids'), list):
+        params['ids'] = ','.join(str(i) for i in params['ids'])
+    for key, value in list(params.items()):
+        if value is not None and not isinstance(value, str):
+            params[key] = str(value)
+
+    try:
+        where, values = parse_record_filter(params)
+    except ValueError as exc:
+        return jsonify({'success': False, 'message': f'Filtro inválido: {exc}'}), 400
+
+    try:
+        chunk_size = current_app.config.get('DELETE_CHUNK_SIZE', 1000)
+        deleted = 0
+        for conn in scoped(get_db(), **filter_scope(params)):
+            deleted += delete_in_chunks(conn, where, values, chunk_size)
+        live_events.notify(current_app.config.get('DATABASE', DATABASE))
+        if body_store.BODY_STORE and deleted:
+            body_store.schedule_compaction(current_app.config.get('DATABASE', DATABASE))
+        return jsonify({'success': True, 'deleted': deleted, 'message': f'{deleted} registro(s) deletado(s) com sucesso'}), 200
+    except Exception as exc:
+        return jsonify({'success': False, 'message': f'Erro ao deletar: {str(exc)}'}), 500
+
+
+# Coletas em andamento neste processo, agrupadas por banco, URL e credenciais
+_collect_flight = collect_jobs.SingleFlight()
+
+
+def find_fresh_record(db_path: str, url: str, max_age: float) -> int | None:
+    """Retorna o id do registro mais recente da URL se tiver menos de `max_age` segundos."""
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)).isoformat()
+    conn = sqlite3.connect(db_path)
+    groups = [None]
+    if partitions.PARTITION_MODE:
+        groups = partitions.partition_groups(db_path, partitions.PARTITION_MODE, since=cutoff, newest_first=True)
+    try:
+        for group in groups:
+            if group is not None:
+                partitions.scope(conn, group)
+            row = conn.execute(
+                "SELECT id FROM responses WHERE url = ? AND timestamp >= ? AND status != 401 "
+                "ORDER BY timestamp DESC LIMIT 1",
+                (url, cutoff),
+            ).fetchone()
+            if row:
+                return row[0]
+        return None
+    finally:
+        conn.close()
+
+
+def run_collection(url: str, username: str = None, password: str = None, db_path: str = None,
+                   min_freshness: float = 0) -> dict:
+    """Busca a URL, salva a resposta e descreve o resultado.
+
+    Usada tanto pelo /collect síncrono quanto pelos workers da fila. Chamadas
+    simultâneas para a mesma URL e credenciais compartilham um único fetch e
+    um único registro; com `min_freshness` um registro recente é reutilizado.
+    Retorna um dict com `state` (ver `collect_jobs`), `http_status`,
+    `record_id` e `message`.
+    """
+    if db_path is None:
+        db_path = DATABASE
+
+    if min_freshness > 0:
+        record_id = find_fresh_record(db_path, url, min_freshness)
+        if record_id is not None:
+            return {'state': collect_jobs.DONE, 'record_id': record_id, 'reused': True,
+                    'message': f'Registro recente reutilizado (id {record_id})'}
+
+    key = (db_path, url, collect_jobs.credentials_key(username, password))
+    result, shared = _collect_flight.do(key, lambda: _collect_once(url, username, password, db_path))
+    return dict(result, coalesced=True) if shared else result
+
+
+def _collect_once(url: str, username: str, password: str, db_path: str) -> dict:
+    """Executa de fato uma coleta, sem coalescência (ver `run_collection`)."""
+    try:
+        # Primeira tentativa: sem autenticação
+        started = time.perf_counter()
+        status, body, content_type, charset = fetch_response(url)
+
+        # Se retornar 401, pede credenciais
+        if status == 401:
+            if not username or not password:
+                return {'state': collect_jobs.AUTH_REQUIRED, 'http_status': status,
+                        'message': 'Este site requer autenticação. Por favor, forneça login e senha.'}
+            # Se forneceu credenciais, tenta novamente com autenticação
+            started = time.perf_counter()
+            status, body, content_type, charset = fetch_response(url, username=username, password=password)
+        # Duração da requisição que gerou a resposta salva (rollups de latência)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        # Cópia do JSON quando o corpo é JSON; tipos binários nem são olhados
+        # e corpos grandes são validados em streaming
+        json_text = json_text_for(body, content_type, charset)
+
+        # Salva no banco os bytes como chegaram, com o tipo da resposta
+        record_id = save_response_sqlite(url, status, body, db_path=db_path, json_text=json_text, elapsed_ms=elapsed_ms,
+                                         content_type=content_type, charset=charset)
+        return {'state': collect_jobs.DONE, 'http_status': status, 'record_id': record_id,
+                'message': f'Coletado com sucesso! Status: {status}'}
+
+    except urllib.error.URLError as exc:
+        return {'state': collect_jobs.FAILED, 'network_error': True, 'message': f'Erro de rede: {exc.reason}'}
+    except Exception as exc:
+        return {'state': collect_jobs.FAILED, 'message': f'Erro: {str(exc)}'}
+
+
+# Pools de workers já iniciados neste processo, um por arquivo de banco
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+# Bancos cuja tabela de jobs já foi criada/migrada neste processo
+_jobs_tables = set()
+_jobs_tables_lock = threading.Lock()
+
+
+def get_jobs_db() -> str:
+    """Retorna o caminho do banco garantindo que a tabela de jobs exista.
+
+    O DDL roda uma vez por processo e banco, não a cada /collect ou a cada
+    consulta de /jobs/<id> (a página consulta uma vez por segundo).
+    """
+    get_db()
+    db_path = current_app.config.get('DATABASE', DATABASE)
+    if db_path not in _jobs_tables:
+        with _jobs_tables_lock:
+            if db_path not in _jobs_tables:
+                collect_jobs.init_jobs_table(db_path)
+                _jobs_tables.add(db_path)
+    return db_path
+
+
+def ensure_worker_pool(db_path: str):
+    """Inicia (uma vez por processo) os workers internos para `db_path`."""
+    workers = current_app.config.get('COLLECT_WORKERS', 0)
+    if workers <= 0:
+        return None
+    with _worker_pools_lock:
+        pool = _worker_pools.get(db_path)
+        if pool is None:
+            min_freshness = current_app.config.get('COLLECT_MIN_FRESHNESS', 0)
+            pool = collect_jobs.JobWorkerPool(
+                db_path,
+                lambda url, user, pwd: run_collection(url, user, pwd, db_path=db_path, min_freshness=min_freshness),
+                workers=workers,
+            )
+            pool.start()
+            _worker_pools[db_path] = pool
+    return pool
+
+
 @app.route('/collect', methods=['POST'])
 def collect():
-    """Coleta dados de uma URL e salva no banco de dados."""
+    """Coleta dados de uma URL e salva no banco de dados.
+
+    No modo assíncrono (padrão) apenas enfileira um job e responde 202 com
+    seu id; o andamento é consultado em /jobs/<id>.
+    """
     url = request.form.get('url', '').strip()
     username = request.form.get('username', '').strip()
     password = request.form.get('password', '').strip()
     
     if not url:
         return jsonify({'success': False, 'message': 'URL vazia'}), 400
-    
+
+    if current_app.config.get('COLLECT_ASYNC', True):
+        db_path = get_jobs_db()
+        pool = ensure_worker_pool(db_path)
+        # Com workers internos as credenciais ficam só na memória deste processo
+        job_id = collect_jobs.enqueue_job(db_path, url, username, password, coalesce=True,
+                                          in_memory=pool is not None)
+        if pool is not None:
+            pool.notify()
+        return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}',
+                        'message': f'Coleta enfileirada (job {job_id})'}), 202
+
+    result = run_collection(url, username, password, db_path=current_app.config.get('DATABASE', DATABASE),
+                            min_freshness=current_app.config.get('COLLECT_MIN_FRESHNESS', 0))
+    if result['state'] == collect_jobs.DONE:
+        return jsonify({'success': True, 'message': result['message']}), 200
+    if result['state'] == collect_jobs.AUTH_REQUIRED:
+        return jsonify({'success': False, 'auth_required': True, 'message': result['message']}), 401
+    return jsonify({'success': False, 'message': result['message']}), 400 if result.get('network_error') else 500
+
+
+# Campos que o /api/responses pode devolver (`body_preview` vem do corpo)
+API_FIELDS = ('id', 'url', 'status', 'timestamp', 'elapsed_ms', 'content_type', 'json', 'body_preview')
+API_DEFAULT_FIELDS = ('id', 'url', 'status', 'timestamp')
+API_MAX_LIMIT = 1000
+
+
+def parse_api_fields(value: str | None) -> list[str]:
+    """Valida a projeção `fields=a,b,c` do /api/responses."""
+    if not value:
+        return list(API_DEFAULT_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'campos desconhecidos: {", ".join(unknown) or "(nenhum)"}; use {", ".join(API_FIELDS)}')
+    return list(dict.fromkeys(fields))
+
+
+def api_select_columns(fields: list[str]) -> str:
+    """Colunas do SELECT para a projeção pedida (o id sempre vem, para o cursor).
+
+    Do corpo guardado na linha só o começo é lido (`substr`); corpos no store
+    de segmentos são lidos do mmap apenas até o tamanho da prévia.
+    """
+    columns = ['id'] + [f for f in fields if f not in ('id', 'body_preview')]
+    if 'json' in fields:
+        columns += ['json_segment', 'json_offset', 'json_length']
+    if 'body_preview' in fields:
+        columns += ['substr(body, 1, ?) AS body', 'body_segment', 'body_offset', 'body_length', 'charset']
+        if 'content_type' not in fields:
+            columns.append('content_type')
+    return ', '.join(columns)
+
+
+@app.route('/api/responses')
+def api_responses():
+    """Lista registros em JSON com projeção de campos, filtros e cursor keyset.
+
+    Parâmetros: `fields` (de API_FIELDS), os filtros do /delete/bulk (`ids`,
+    `url`, `status`, `since`, `until`, `older_than`), `limit` e `cursor`
+    (o `next_cursor` da página anterior). Os registros vêm do id mais alto
+    para o mais baixo; `preview` define o tamanho de `body_preview`.
+    """
     try:
-        # Primeira tentativa: sem autenticação
-        status, body = fetch_url(url)
-        
-        # Se retornar 401, pede credenciais
-        if status == 401:
-            if not username or not password:
-                return jsonify({'success': False, 'auth_required': True, 'message': 'Este site requer autenticação. Por favor, forneça login e senha.'}), 401
-            # Se forneceu credenciais, tenta novamente com autenticação
-            status, body = fetch_url(url, username=username, password=password)
-        
-        # Tenta parsear como JSON
-        json_obj = None
-        try:
-            json_obj = json.loads(body)
-        except json.JSONDecodeError:
-            pass
-        
-        # Salva no banco
-        save_response_sqlite(url, status, body, json_obj)
-        
-        return jsonify({'success': True, 'message': f'Coletado com sucesso! Status: {status}'}), 200
-    
-    except urllib.error.URLError as exc:
-        return jsonify({'success': False, 'message': f'Erro de rede: {exc.reason}'}), 400
-    except Exception as exc:
-        return jsonify({'success': False, 'message': f'Erro: {str(exc)}'}), 500
+        fields = parse_api_fields(request.args.get('fields'))
+        where, values = parse_record_filter(request.args, required=False)
+        limit = min(int(request.args.get('limit', 100)), API_MAX_LIMIT)
+        preview = int(request.args.get('preview', 200))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+        if limit <= 0 or preview <= 0:
+            raise ValueError('limit e preview devem ser positivos')
+    except ValueError as exc:
+        return jsonify({'success': False, 'message': f'Parâmetro inválido: {exc}'}), 400
+
+    if cursor is not None:
+        where += ' AND id < ?'
+        values.append(cursor)
+    # Em BLOBs o `substr` conta bytes: lê até 4 por caractere da prévia
+    head = [preview * 4] if 'body_preview' in fields else []
+    sql = f'SELECT {api_select_columns(fields)} FROM responses WHERE {where} ORDER BY id DESC LIMIT ?'
+    items = []
+    last_id = None
+    # Ids são globais e crescem com o tempo: das partições mais novas para as
+    # mais antigas, a concatenação já sai em ordem decrescente de id
+    for db in scoped(get_db(), newest_first=True, **filter_scope(request.args)):
+        for row in db.execute(sql, (*head, *values, limit - len(items))):
+            item = {f: row[f] for f in fields if f not in ('body_preview', 'json')}
+            if 'json' in fields:
+                json_text = record_json(row)
+                item['json'] = json_codec.loads(json_text) if json_text else None
+            if 'body_preview' in fields:
+                item['body_preview'] = body_preview(row, limit=preview)
+            items.append(item)
+            last_id = row['id']
+        if len(items) >= limit:
+            break
+    return jsonify({
+        'fields': fields,
+        'items': items,
+        'next_cursor': str(last_id) if len(items) >= limit else None,
+    })
+
+
+# Importações rodando em threads deste processo (ids da tabela imports)
+_running_imports = set()
+_running_imports_lock = threading.Lock()
+
+
+def _run_import_thread(db_path: str, path: str, import_id: int) -> None:
+    try:
+        # Banco em uso por coletas e listagens: índice e trigger continuam ligados
+        info = bulk_import.run_import(db_path, path, defer_indexes=False)
+        if info['state'] == bulk_import.DONE:
+            # Concluída: o arquivo só era guardado para poder retomar
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+    except Exception:
+        # O erro fica registrado na tabela imports (state=failed) e o arquivo
+        # continua em disco para a retomada
+        pass
+    finally:
+        with _running_imports_lock:
+            _running_imports.discard(import_id)
+
+
+@app.route('/import', methods=['POST'])
+def import_upload():
+    """Recebe um arquivo HAR/NDJSON e importa em segundo plano.
+
+    Responde 202 com o id da importação; o andamento é consultado em
+    /import/<id>. Reenviar o mesmo arquivo retoma uma importação interrompida.
+    """
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'message': 'Envie o arquivo no campo "file"'}), 400
+    try:
+        fmt = bulk_import.detect_format(upload.filename, request.form.get('format') or None)
+    except bulk_import.ImportFormatError as exc:
+        return jsonify({'success': False, 'message': str(exc)}), 400
+
+    get_db()
+    db_path = current_app.config.get('DATABASE', DATABASE)
+    folder = bulk_import.upload_dir(db_path)
+    os.makedirs(folder, exist_ok=True)
+    partial = os.path.join(folder, f'upload-{os.getpid()}-{threading.get_ident()}.part')
+    key = bulk_import.save_with_fingerprint(upload.stream, partial)
+    # O arquivo fica guardado pela impressão digital até a importação
+    # terminar, para uma retomada achá-lo
+    path = os.path.join(folder, f'{key}.{fmt}')
+    os.replace(partial, path)
+    import_id = bulk_import.register_import(db_path, path, fmt, source=upload.filename, key=key)
+
+    with _running_imports_lock:
+        if import_id not in _running_imports:
+            _running_imports.add(import_id)
+            threading.Thread(target=_run_import_thread, args=(db_path, path, import_id),
+                             name=f'import-{import_id}', daemon=True).start()
+    return jsonify({'success': True, 'import_id': import_id, 'status_url': f'/import/{import_id}',
+                    'message': f'Importação {import_id} iniciada'}), 202
+
+
+@app.route('/import/<int:import_id>')
+def import_status(import_id):
+    """Andamento de uma importação: registros, linhas puladas e percentual lido."""
+    info = bulk_import.get_import(current_app.config.get('DATABASE', DATABASE), import_id)
+    if info is None:
+        return jsonify({'success': False, 'message': 'Importação não encontrada'}), 404
+    info['finished'] = info['state'] in (bulk_import.DONE, bulk_import.FAILED)
+    info['success'] = info['state'] == bulk_import.DONE
+    return jsonify(info), 200
+
+
+def parse_stats_params(params) -> dict:
+    """Lê granularidade, janela (em horas), URL e top do /stats; levanta ValueError."""
+    granularity = params.get('granularity') or 'hour'
+    if granularity not in rollups.GRANULARITIES:
+        raise ValueError(f'granularidade deve ser uma de {", ".join(rollups.GRANULARITIES)}')
+    hours = float(params.get('hours') or 24)
+    top = int(params.get('top') or 20)
+    if hours <= 0 or top <= 0:
+        raise ValueError('hours e top devem ser positivos')
+    return {'granularity': granularity, 'hours': hours, 'url': params.get('url') or None, 'top': top}
+
+
+def collect_stats(options: dict) -> dict:
+    """Agrega os rollups da janela pedida, só nas partições que a cobrem."""
+    start = datetime.datetime.utcnow() - datetime.timedelta(hours=options['hours'])
+    since, _ = rollups.bucket_bounds(options['granularity'], start)
+    result = rollups.stats(scoped(get_db(), since=start.isoformat()), options['granularity'], since,
+                           url=options['url'], top=options['top'])
+    result['hours'] = options['hours']
+    return result
+
+
+@app.route('/api/stats')
+def api_stats():
+    """Contagens, taxas de erro, tamanho de corpo e latência por intervalo, em JSON."""
+    try:
+        options = parse_stats_params(request.args)
+    except ValueError as exc:
+        return jsonify({'success': False, 'message': f'Parâmetro inválido: {exc}'}), 400
+    return jsonify(collect_stats(options))
+
+
+@app.route('/stats')
+def stats_page():
+    """Painel com as tendências calculadas a partir dos rollups."""
+    try:
+        options = parse_stats_params(request.args)
+    except ValueError as exc:
+        return f'Parâmetro inválido: {exc}', 400
+    return render_template('stats.html', stats=collect_stats(options), options=options,
+                           granularities=list(rollups.GRANULARITIES))
+
+
+@app.route('/fetch/hosts')
+def fetch_hosts():
+    """Estado das políticas por host (circuit breaker, timeout, tokens)."""
+    return jsonify(fetch_policy.DEFAULT_POLICY.snapshot()), 200
+
+
+@app.route('/admin/slow-queries')
+def admin_slow_queries():
+    """Consultas lentas mais recentes deste processo, com o plano (só para admins)."""
+    if not is_admin():
+        return jsonify({'success': False, 'message': 'Acesso restrito'}), 403
+    return jsonify({
+        'threshold_ms': current_app.config.get('SLOW_QUERY_MS', 0),
+        'queries': profiling.SLOW_QUERIES.entries(),
+    }), 200
+
+
+@app.route('/fetch/dns')
+def fetch_dns():
+    """Estatísticas do cache de DNS (acertos, faltas, renovações)."""
+    return jsonify(dns_cache.DEFAULT_DNS_CACHE.stats()), 200
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """Retorna o estado de um job de coleta."""
+    job = collect_jobs.get_job(get_jobs_db(), job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job não encontrado'}), 404
+    job['finished'] = job['state'] in collect_jobs.FINAL_STATES
+    job['success'] = job['state'] == collect_jobs.DONE
+    job['auth_required'] = job['state'] == collect_jobs.AUTH_REQUIRED
+    return jsonify(job), 200
 
 
 if __name__ == '__main__':